@@ -1,10 +1,11 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 import os
 import json
 import sqlite3
+import sys
 from pathlib import Path
 from typing import Optional
 
@@ -13,6 +14,15 @@ from cryptography.fernet import Fernet, InvalidToken
 
 from pricing_engine import compute_pricing
 
+# Shared helpers live in the repo's py/ package
+sys.path.append(str(Path(__file__).resolve().parents[1] / "py"))
+try:
+    from py.config_cache import CONFIG_CACHE, file_stamp, write_json
+    from py.http_cache import apply_validators, cache_validators, check_not_modified
+except ImportError:
+    from config_cache import CONFIG_CACHE, file_stamp, write_json
+    from http_cache import apply_validators, cache_validators, check_not_modified
+
 app = FastAPI()
 
 # ============================================================
@@ -83,16 +93,23 @@ def decrypt_text(s: str) -> str:
 # ============================================================
 # Pricing config
 # ============================================================
-def load_pricing_config() -> dict:
+# Parsed once per (mtime, size) of the file via CONFIG_CACHE. Callers mutate
+# what they get, so they always receive a copy.
+def _read_pricing_config(path) -> dict:
     try:
-        if CONFIG_PATH.exists():
-            return json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8-sig") as f:
+                return json.load(f)
     except Exception:
         pass
     return {"version": 1, "suppliers": {}}
 
+def load_pricing_config() -> dict:
+    return CONFIG_CACHE.load(str(CONFIG_PATH), _read_pricing_config, copy=True)
+
 def save_pricing_config(cfg: dict) -> None:
-    CONFIG_PATH.write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+    # Write-through: the next load is a hit instead of a re-parse
+    CONFIG_CACHE.write_through(str(CONFIG_PATH), cfg, write_json, _read_pricing_config)
 
 # ============================================================
 # Health + Dashboard (single source of truth)
@@ -148,7 +165,14 @@ def supplier_detail(supplier_id: str):
 # Pricing endpoints (clean, unified)
 # ============================================================
 @app.get("/api/pricing/config")
-def get_pricing_config(supplier_key: str = ""):
+def get_pricing_config(request: Request, response: Response, supplier_key: str = ""):
+    # ETag from the config file's (mtime, size) and the requested view
+    stamp = file_stamp(str(CONFIG_PATH))
+    validators = cache_validators(("api/pricing/config", stamp, supplier_key), stamp[0] / 1e9 if stamp else None)
+    not_modified = check_not_modified(request, validators)
+    if not_modified:
+        return not_modified
+    apply_validators(response, validators)
     cfg = load_pricing_config()
     if supplier_key:
         sup = (cfg.get("suppliers") or {}).get(supplier_key)
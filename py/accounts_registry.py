@@ -10,6 +10,11 @@ import json
 from pathlib import Path
 from typing import Any, Dict
 
+try:
+    from py.config_cache import CONFIG_CACHE
+except ImportError:
+    from config_cache import CONFIG_CACHE
+
 # This file lives in <root>/py, so root is its parent directory
 BASE_DIR = Path(__file__).resolve().parent.parent
 ACCOUNTS_JSON = BASE_DIR / "config" / "accounts.json"
@@ -20,13 +25,18 @@ def load_accounts_registry() -> Dict[str, Any]:
     Load accounts.json and return a nested dict of services/accounts.
 
     If the file does not exist or is invalid, returns {}.
+    The parsed file is cached until its mtime/size changes.
     """
     if not ACCOUNTS_JSON.is_file():
         print(f"⚠ accounts.json not found at: {ACCOUNTS_JSON}")
         return {}
 
+    return CONFIG_CACHE.load(ACCOUNTS_JSON, _read_accounts, copy=True)
+
+
+def _read_accounts(path: Path) -> Dict[str, Any]:
     try:
-        with open(ACCOUNTS_JSON, "r", encoding="utf-8-sig") as f:
+        with open(path, "r", encoding="utf-8-sig") as f:
             data = json.load(f)
     except Exception as exc:
         print(f"⚠ Error reading accounts.json: {exc!r}")
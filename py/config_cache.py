@@ -0,0 +1,119 @@
+# config_cache.py
+# Process-wide cache of parsed config files.
+#
+# Each entry is keyed by (absolute path, loader) and remembers the file's
+# (mtime_ns, size) when it was parsed. A lookup costs one os.stat(); the file
+# is only re-read and re-parsed when the stamp changed (or the file appeared
+# or disappeared). Savers write through: the new value is stored with the
+# stamp of the file they just wrote, so the next read is a hit. Missing files
+# are not cached (parse runs on every call): their paths often come from
+# request input, and the cache never evicts.
+#
+#   value = CONFIG_CACHE.load(path, parse)            # parse(path) on a miss
+#   CONFIG_CACHE.write_through(path, value, write)    # write(path, value), then cache
+#
+# Values are shared between callers; pass copy=True when the caller may
+# mutate what it gets back.
+
+from __future__ import annotations
+
+import copy as _copy
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+Stamp = Optional[Tuple[int, int]]
+
+
+def file_stamp(path: str) -> Stamp:
+    """(mtime_ns, size) of a file, None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """JSON file contents (a UTF-8 BOM is accepted), or default if missing/invalid."""
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path: str, value: Any) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ConfigCache:
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, str], Tuple[Stamp, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def _key(path: str, parse: Callable[..., Any], key: Optional[str]) -> Tuple[str, str]:
+        return os.path.abspath(path), key or getattr(parse, "__qualname__", repr(parse))
+
+    def load(self, path: str, parse: Callable[[str], Any], key: Optional[str] = None, copy: bool = False) -> Any:
+        """parse(path), reused until the file's mtime or size changes."""
+        k = self._key(path, parse, key)
+        stamp = file_stamp(k[0])
+        with self._lock:
+            entry = self._entries.get(k)
+            hit = entry is not None and entry[0] == stamp
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if stamp is None:
+                    self._entries.pop(k, None)
+        if hit:
+            value = entry[1]
+        elif stamp is None:
+            value = parse(path)
+        else:
+            # Parsed outside the lock: a slow file must not block other configs
+            value = parse(path)
+            with self._lock:
+                self._entries[k] = (stamp, value)
+        return _copy.deepcopy(value) if copy else value
+
+    def write_through(
+        self,
+        path: str,
+        value: Any,
+        write: Callable[[str, Any], None],
+        parse: Callable[[str], Any],
+        key: Optional[str] = None
+    ) -> None:
+        """write(path, value) and cache value as what parse(path) would return."""
+        write(path, value)
+        k = self._key(path, parse, key)
+        with self._lock:
+            self._entries[k] = (file_stamp(k[0]), _copy.deepcopy(value))
+            self.writes += 1
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            p = os.path.abspath(path)
+            for k in [k for k in self._entries if k[0] == p]:
+                del self._entries[k]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+CONFIG_CACHE = ConfigCache()
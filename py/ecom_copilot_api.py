@@ -8,11 +8,27 @@ from __future__ import annotations
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import json
 
+try:
+    from py.config_cache import CONFIG_CACHE, file_stamp, read_json
+    from py.fast_response import dumps_json, json_body_response, json_response
+    from py.http_cache import apply_validators, cache_validators, check_not_modified
+    from py.kmc_preview import KmcPriceTable
+    from py.supplier_import import decode_import, detect_import_format, parse_supplier_import
+    from py.supplier_store import SupplierStore
+except ImportError:
+    from config_cache import CONFIG_CACHE, file_stamp, read_json
+    from fast_response import dumps_json, json_body_response, json_response
+    from http_cache import apply_validators, cache_validators, check_not_modified
+    from kmc_preview import KmcPriceTable
+    from supplier_import import decode_import, detect_import_format, parse_supplier_import
+    from supplier_store import SupplierStore
+
 
 # ---------------------------------------------------------
 # Paths & helpers
@@ -20,43 +36,28 @@ import json
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
-SUPPLIERS_FILE = DATA_DIR / "suppliers.json"
 
 DATA_DIR.mkdir(exist_ok=True)
 
+# data/suppliers.sqlite; imports data/suppliers.json once on first start
+_SUPPLIERS = SupplierStore()
 
-def _load_suppliers() -> List[dict]:
-    if not SUPPLIERS_FILE.exists():
-        return []
-    try:
-        with SUPPLIERS_FILE.open("r", encoding="utf-8") as f:
-            payload = json.load(f)
-        suppliers = payload.get("suppliers", [])
-        if not isinstance(suppliers, list):
-            return []
-        return suppliers
-    except Exception:
-        return []
-
-
-def _save_suppliers(suppliers: List[dict]) -> None:
-    SUPPLIERS_FILE.write_text(
-        json.dumps({"suppliers": suppliers}, indent=2),
-        encoding="utf-8",
-    )
 
+def _get_supplier_by_code(code: str) -> Optional[dict]:
+    return _SUPPLIERS.get(code)
 
-def _next_id(suppliers: List[dict]) -> int:
-    existing = [s.get("id", 0) for s in suppliers if isinstance(s.get("id", 0), int)]
-    return (max(existing) if existing else 0) + 1
 
+def _query_suppliers(active, marketplace, sort, offset, limit):
+    try:
+        return _SUPPLIERS.query(active=active, marketplace=marketplace, sort=sort, offset=offset, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-def _get_supplier_by_code(code: str) -> Optional[dict]:
-    suppliers = _load_suppliers()
-    for s in suppliers:
-        if str(s.get("code", "")).lower() == code.lower():
-            return s
-    return None
+
+def _supplier_validators(endpoint: str, *query) -> dict:
+    # Strong ETag: store write counter + the query that shaped the body
+    version, modified_at = _SUPPLIERS.version()
+    return cache_validators((endpoint, version, query), modified_at)
 
 
 # ---------------------------------------------------------
@@ -121,9 +122,11 @@ class KmcPricingItem(BaseModel):
     cost: float
     msrp: Optional[float] = None
     margin_used: float
-    price_amazon: float
-    price_shopify: float
-    price_walmart: float
+    # One price_<marketplace> per marketplace in kmc_pricing_config.json;
+    # None when fee + margin leave no room for a price
+    price_amazon: Optional[float] = None
+    price_shopify: Optional[float] = None
+    price_walmart: Optional[float] = None
 
 
 # ---------------------------------------------------------
@@ -273,10 +276,20 @@ def settings_api_status():
 
 
 @app.get("/suppliers/summary", response_model=List[SupplierSummary])
-def suppliers_summary():
-    suppliers = _load_suppliers()
-
-    if not suppliers:
+def suppliers_summary(
+    request: Request,
+    active: Optional[bool] = None,
+    marketplace: Optional[str] = None,
+    sort: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    """
+    Supplier list for the dashboard. Optional filters (active, marketplace),
+    sort ("name", "-products", ...) and offset/limit paging; the total match
+    count is in X-Total-Count. Conditional GETs get 304 while nothing changed.
+    """
+    if _SUPPLIERS.count() == 0:
         suppliers = [
             {
                 "id": 1,
@@ -315,54 +328,99 @@ def suppliers_summary():
                 "max_gross_margin": 0.45,
             },
         ]
-        _save_suppliers(suppliers)
-
-    summaries: List[SupplierSummary] = []
-    for s in suppliers:
-        summaries.append(
-            SupplierSummary(
-                id=int(s.get("id", 0) or 0),
-                name=str(s.get("name", "")),
-                code=str(s.get("code", "")),
-                products=int(s.get("products", 0) or 0),
-                last_import=s.get("last_import"),
-                primary_marketplaces=list(s.get("primary_marketplaces") or []),
-                active=bool(s.get("active", True)),
-            )
-        )
-    return summaries
+        _SUPPLIERS.upsert_many(suppliers)
+
+    validators = _supplier_validators("suppliers/summary", active, marketplace, sort, offset, limit)
+    not_modified = check_not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    total, suppliers = _query_suppliers(active, marketplace, sort, offset, limit)
+
+    # Built in the SupplierSummary shape and serialized directly (fast_response);
+    # response_model stays for the OpenAPI schema
+    summaries = [
+        {
+            "id": int(s.get("id", 0) or 0),
+            "name": str(s.get("name", "")),
+            "code": str(s.get("code", "")),
+            "products": int(s.get("products", 0) or 0),
+            "last_import": s.get("last_import"),
+            "primary_marketplaces": list(s.get("primary_marketplaces") or []),
+            "active": bool(s.get("active", True)),
+        }
+        for s in suppliers
+    ]
+    return json_response(request, summaries, headers={**validators, "X-Total-Count": str(total)})
 
 
 @app.get("/suppliers/{code}", response_model=Supplier)
 def get_supplier(code: str):
-    suppliers = _load_suppliers()
-    for s in suppliers:
-        if s.get("code", "").lower() == code.lower():
-            return Supplier(**s)
-    raise HTTPException(status_code=404, detail="Supplier not found")
+    s = _SUPPLIERS.get(code)
+    if s is None:
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    return Supplier(**s)
 
 
 @app.post("/suppliers", response_model=Supplier)
 def upsert_supplier(supplier: Supplier):
-    suppliers = _load_suppliers()
+    # Single-row upsert keyed by code (case-insensitive); the store assigns
+    # the id (keeping the existing one when a supplier is replaced)
+    return Supplier(**_SUPPLIERS.upsert(supplier.dict()))
 
-    if supplier.id is None:
-        supplier.id = _next_id(suppliers)
 
-    replaced = False
-    new_list = []
-    for s in suppliers:
-        if s.get("code", "").lower() == supplier.code.lower():
-            new_list.append(supplier.dict())
-            replaced = True
-        else:
-            new_list.append(s)
+def _validate_supplier(record: dict) -> dict:
+    try:
+        return Supplier(**record).dict()
+    except ValidationError as exc:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(p) for p in e.get('loc', ()))}: {e.get('msg')}" for e in exc.errors()
+        ))
 
-    if not replaced:
-        new_list.append(supplier.dict())
 
-    _save_suppliers(new_list)
-    return supplier
+def _import_suppliers(data: bytes, fmt: Optional[str], content_type: str, all_or_nothing: bool) -> dict:
+    text = decode_import(data)
+    fmt = (fmt or detect_import_format(text, content_type)).lower()
+    try:
+        rows = parse_supplier_import(text, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    parse_errors = [{"line": line, "code": "", "status": "error", "error": err} for line, rec, err in rows if err]
+    records = [(line, rec) for line, rec, err in rows if not err]
+    if parse_errors and all_or_nothing:
+        results = [{"line": line, "code": rec.get("code", ""), "status": "skipped"} for line, rec in records]
+    else:
+        results = _SUPPLIERS.merge_many(records, validate=_validate_supplier, all_or_nothing=all_or_nothing)
+    results = sorted(parse_errors + results, key=lambda r: r["line"])
+
+    counts = {k: 0 for k in ("created", "updated", "error", "skipped")}
+    for r in results:
+        counts[r["status"]] += 1
+    return {"ok": counts["error"] == 0, "format": fmt, "total": len(results), **counts, "results": results}
+
+
+@app.post("/suppliers/bulk")
+async def bulk_import_suppliers(request: Request, format: Optional[str] = None, all_or_nothing: bool = False):
+    """
+    Bulk create/update suppliers from JSON lines or a CSV in the
+    config/suppliers.csv format (raw body, or a multipart "file" field).
+    Fields present in a record are merged onto the existing supplier with
+    that code. Everything valid is written in one transaction; with
+    all_or_nothing=true a single invalid record writes nothing.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(status_code=400, detail='Expected a "file" field')
+        data = await upload.read()
+        content_type = getattr(upload, "content_type", "") or ""
+        if not format and (upload.filename or "").lower().endswith(".csv"):
+            format = "csv"
+    else:
+        data = await request.body()
+    return await run_in_threadpool(_import_suppliers, data, format, content_type, all_or_nothing)
 
 
 # ---------------------------------------------------------
@@ -401,66 +459,43 @@ KMC_FEED = [
 ]
 
 
-def _price_from_margin(cost: float, margin: float) -> float:
-    """
-    margin = (price - cost) / price
-    price = cost / (1 - margin)
-    """
-    margin = max(0.0, min(margin, 0.95))
-    if margin >= 0.95:
-        margin = 0.95
-    if margin <= 0.0:
-        return round(cost, 2)
-    price = cost / (1.0 - margin)
-    return round(price, 2)
+# Used by the preview until the KMC feed (kmc_pricing_config.json:
+# csv.input_file) exists
+_KMC_PRICES = KmcPriceTable(sample=KMC_FEED)
+
+
+def _kmc_margin() -> Optional[float]:
+    # KMC supplier's min_gross_margin; None -> the KMC config's
+    supplier = _get_supplier_by_code("KMC")
+    mgm = supplier.get("min_gross_margin") if supplier else None
+    return float(mgm) if isinstance(mgm, (int, float)) else None
 
 
 @app.get("/pricing/kmc/preview", response_model=List[KmcPricingItem])
-def pricing_kmc_preview():
+def pricing_kmc_preview(request: Request, offset: int = 0, limit: int = 100):
     """
-    Simple KMC pricing preview:
-    - Uses KMC supplier's min_gross_margin if defined, else 0.25
-    - Applies a small tweak per marketplace just to show differences.
+    KMC pricing preview over the KMC feed, one page at a time.
+
+    Prices come from a precomputed per-channel table (kmc_preview) that is
+    rebuilt only when the feed, the KMC config or the KMC supplier's
+    min_gross_margin changes. X-Total-Count has the catalog size and
+    X-Kmc-Source says whether the feed or the built-in sample was used.
     """
-    supplier = _get_supplier_by_code("KMC")
-    base_margin = 0.25
-    if supplier is not None:
-        try:
-            mgm = supplier.get("min_gross_margin")
-            if isinstance(mgm, (int, float)):
-                base_margin = float(mgm)
-        except Exception:
-            pass
-
-    items: List[KmcPricingItem] = []
-    for row in KMC_FEED:
-        cost = float(row["cost"])
-        msrp = float(row.get("msrp") or 0.0) or None
-
-        # simple per-channel tweaks
-        margin_amz = base_margin
-        margin_shp = base_margin + 0.03
-        margin_wmt = base_margin + 0.01
-
-        price_amz = _price_from_margin(cost, margin_amz)
-        price_shp = _price_from_margin(cost, margin_shp)
-        price_wmt = _price_from_margin(cost, margin_wmt)
-
-        items.append(
-            KmcPricingItem(
-                sku=row["sku"],
-                product=row["product"],
-                brand=row["brand"],
-                supplier_code="KMC",
-                cost=cost,
-                msrp=msrp,
-                margin_used=base_margin,
-                price_amazon=price_amz,
-                price_shopify=price_shp,
-                price_walmart=price_wmt,
-            )
-        )
-    return items
+    margin = _kmc_margin()
+    try:
+        page = _KMC_PRICES.page(margin=margin, offset=offset, limit=limit)
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=500, detail=f"KMC feed/config unreadable: {exc}")
+
+    validators = cache_validators(("pricing/kmc/preview", page["version"], offset, limit), page["modified_at"])
+    not_modified = check_not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    return json_response(
+        request,
+        page["items"],
+        headers={**validators, "X-Total-Count": str(page["total"]), "X-Kmc-Source": page["source"]},
+    )
 
 
 # ---------------------------------------------------------
@@ -481,74 +516,304 @@ if __name__ == "__main__":
 # Auto-added endpoints for Pricing + Mapping wizard
 # Safe to re-run patch; marker prevents duplication.
 
-from fastapi import UploadFile, File, Body
-from fastapi.responses import FileResponse
+from fastapi import UploadFile, File, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
+import gzip
 import os
 import json
+import threading
+import time
+import uuid
+from datetime import datetime
 
 try:
     from py.pricing_mapping_engine import (
-        save_upload_bytes, preview_upload, load_mapping, save_mapping,
-        price_preview_rows, run_full_pricing, CONFIG_DIR
+        preview_upload, load_mapping, save_mapping, mapping_path_for,
+        price_preview_rows, run_full_pricing, run_multi_marketplace_pricing, CONFIG_DIR, DEFAULT_PRICING_WORKERS,
+        normalize_preview_rows, price_preview_normalized, iter_upload_priced_chunks, OUTPUT_COLUMNS
     )
+    from py.feed_index import FeedIngest, build_row_index, index_path_for, read_upload_page
+    from py.preview_cache import ByteLRUCache, approx_rows_size, cache_key
+    from py.incremental_pricing import run_incremental_pricing
+    from py.pricing_jobs import JobManager
+    from py.storage_catalog import StorageCatalog
+    from py.output_writers import MEDIA_TYPES, format_of_path, iter_csv_bytes
+    from py.upload_store import UploadTooLarge, resolve_upload
 except Exception:
     # fallback if running with different working dir
     from pricing_mapping_engine import (
-        save_upload_bytes, preview_upload, load_mapping, save_mapping,
-        price_preview_rows, run_full_pricing, CONFIG_DIR
+        preview_upload, load_mapping, save_mapping, mapping_path_for,
+        price_preview_rows, run_full_pricing, run_multi_marketplace_pricing, CONFIG_DIR, DEFAULT_PRICING_WORKERS,
+        normalize_preview_rows, price_preview_normalized, iter_upload_priced_chunks, OUTPUT_COLUMNS
     )
-
-# In-memory index of generated outputs (simple + fast for local dev)
-_OUTPUT_INDEX = {}
+    from feed_index import FeedIngest, build_row_index, index_path_for, read_upload_page
+    from preview_cache import ByteLRUCache, approx_rows_size, cache_key
+    from incremental_pricing import run_incremental_pricing
+    from pricing_jobs import JobManager
+    from storage_catalog import StorageCatalog
+    from output_writers import MEDIA_TYPES, format_of_path, iter_csv_bytes
+    from upload_store import UploadTooLarge, resolve_upload
+
+# Persistent catalog of outputs and uploads (data/catalog.sqlite): download
+# links survive restarts; old files are compressed / evicted per
+# ECOM_STORAGE_BUDGET_MB, ECOM_RETENTION_DAYS and ECOM_COMPRESS_AFTER_HOURS
+_CATALOG = StorageCatalog()
+_CATALOG.maintain_soon()
+
+# Pricing preview caches (byte budget split between normalized and priced rows)
+_PREVIEW_CACHE_BYTES = int(float(os.environ.get("ECOM_PREVIEW_CACHE_MB", "64")) * 1024 * 1024)
+_NORMALIZED_CACHE = ByteLRUCache(_PREVIEW_CACHE_BYTES // 2)
+_PRICED_CACHE = ByteLRUCache(_PREVIEW_CACHE_BYTES // 2)
+
+def _register_output(path):
+    # Returns the out_id used in /api/pricing/download/{out_id}
+    return _CATALOG.register_output(path)
+
+def _parse_fee_table(path):
+    table = read_json(path, {})
+    return table if isinstance(table, dict) else {}
 
 def _read_fee_table():
-    path = os.path.join(CONFIG_DIR, "marketplace_fees.json")
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return CONFIG_CACHE.load(os.path.join(CONFIG_DIR, "marketplace_fees.json"), _parse_fee_table)
 
 @app.get("/api/suppliers")
-def api_suppliers():
-    # Best-effort: read data/suppliers.json first; else config/suppliers.csv
-    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    data_json = os.path.join(root, "data", "suppliers.json")
-    cfg_csv = os.path.join(root, "config", "suppliers.csv")
+def api_suppliers(
+    request: Request,
+    active: Optional[bool] = None,
+    marketplace: Optional[str] = None,
+    sort: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    # Supplier store first; else config/suppliers.csv (unfiltered)
+    if _SUPPLIERS.count() == 0:
+        cfg_csv = os.path.join(CONFIG_DIR, "suppliers.csv")
+        stamp = file_stamp(cfg_csv)
+        validators = cache_validators(("api/suppliers", "csv", stamp), stamp[0] / 1e9 if stamp else None)
+        not_modified = check_not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        suppliers = []
+        if stamp:
+            import csv
+            with open(cfg_csv, "r", encoding="utf-8-sig") as f:
+                r = csv.DictReader(f)
+                for row in r:
+                    suppliers.append(row)
+        return json_response(
+            request, {"suppliers": suppliers, "total": len(suppliers), "offset": 0, "limit": None}, headers=validators
+        )
 
-    if os.path.exists(data_json):
-        try:
-            with open(data_json, "r", encoding="utf-8") as f:
-                return {"suppliers": json.load(f)}
-        except Exception:
-            pass
-
-    suppliers = []
-    if os.path.exists(cfg_csv):
-        import csv
-        with open(cfg_csv, "r", encoding="utf-8-sig") as f:
-            r = csv.DictReader(f)
-            for row in r:
-                suppliers.append(row)
-    return {"suppliers": suppliers}
+    validators = _supplier_validators("api/suppliers", active, marketplace, sort, offset, limit)
+    not_modified = check_not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    total, suppliers = _query_suppliers(active, marketplace, sort, offset, limit)
+    return json_response(
+        request,
+        {"suppliers": suppliers, "total": total, "offset": offset, "limit": limit},
+        headers={**validators, "X-Total-Count": str(total)},
+    )
 
-@app.post("/api/feeds/preview")
-async def api_feeds_preview(file: UploadFile = File(...), max_rows: int = 25):
-    content = await file.read()
-    upload_id, path = save_upload_bytes(content)
-    headers, rows = preview_upload(path, max_rows=max_rows)
+def _upload_path(upload_id: str):
+    # upload_id is an alias of a content-addressed blob (or a legacy .csv)
+    path = resolve_upload(upload_id)
+    if path:
+        _CATALOG.touch_upload(path)
+    return path
+
+def _read_page(upload_path: str, offset: int, limit: int):
+    # Older uploads predate the row index; build it on first paged read
+    if not os.path.exists(index_path_for(upload_path)):
+        build_row_index(upload_path)
+    return read_upload_page(upload_path, offset=offset, limit=limit)
+
+# Uploads are streamed to the store in chunks of this size; bodies above
+# ECOM_MAX_UPLOAD_MB are rejected with 413
+UPLOAD_CHUNK_BYTES = 1 << 20
+MAX_UPLOAD_BYTES = int(float(os.environ.get("ECOM_MAX_UPLOAD_MB", "1024")) * 1024 * 1024)
+
+def _too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes / (1024 * 1024):g} MB limit")
+
+def _ingest_result(ingest: FeedIngest, upload_id: str, total: int, offset: int):
+    headers, rows = ingest.preview
     return {
         "upload_id": upload_id,
-        "filename": file.filename,
+        "filename": ingest.filename,
         "headers": headers,
-        "preview_rows": rows
+        "preview_rows": rows,
+        "offset": offset,
+        "total_rows": total
     }
 
+@app.post("/api/feeds/preview")
+async def api_feeds_preview(file: UploadFile = File(...), max_rows: int = 25, offset: int = 0):
+    # Stream the (spooled) upload into the store; it is never held in memory whole.
+    # Storing, row indexing and the preview page happen in the same pass.
+    ingest = FeedIngest(file.filename or "", preview_rows=max_rows, preview_offset=offset,
+                        max_bytes=MAX_UPLOAD_BYTES)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            await run_in_threadpool(ingest.write, chunk)
+        upload_id, path, total = await run_in_threadpool(ingest.finish)
+    except UploadTooLarge:
+        ingest.abort()
+        raise _too_large(MAX_UPLOAD_BYTES)
+    except BaseException:
+        ingest.abort()
+        raise
+    _CATALOG.register_upload(upload_id, path)
+    return _ingest_result(ingest, upload_id, total, offset)
+
+# --- Chunked uploads --------------------------------------------------------
+# Multipart bodies are only handed to the endpoint once fully received, so
+# for large feeds the UI can instead send the file in parts:
+#
+#   POST   /api/feeds/uploads?filename=&max_rows=&offset=   -> session_id
+#   PUT    /api/feeds/uploads/{session_id}?offset=<bytes>   raw body = next part;
+#                                                           returns the preview as
+#                                                           soon as its rows arrived
+#   POST   /api/feeds/uploads/{session_id}/complete         same shape as /api/feeds/preview
+#   DELETE /api/feeds/uploads/{session_id}
+#
+# Sessions live in this process and are dropped after UPLOAD_SESSION_TTL
+# seconds without a part.
+UPLOAD_SESSION_TTL = 15 * 60
+_UPLOAD_SESSIONS = {}
+_UPLOAD_SESSIONS_LOCK = threading.Lock()
+
+def _expire_upload_sessions():
+    now = time.monotonic()
+    with _UPLOAD_SESSIONS_LOCK:
+        stale = [sid for sid, sess in _UPLOAD_SESSIONS.items() if now - sess["touched"] > UPLOAD_SESSION_TTL]
+        expired = [_UPLOAD_SESSIONS.pop(sid) for sid in stale]
+    for sess in expired:
+        sess["ingest"].abort()
+
+def _get_upload_session(session_id: str):
+    with _UPLOAD_SESSIONS_LOCK:
+        sess = _UPLOAD_SESSIONS.get(session_id)
+    if sess is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    sess["touched"] = time.monotonic()
+    return sess
+
+def _drop_upload_session(session_id: str):
+    with _UPLOAD_SESSIONS_LOCK:
+        return _UPLOAD_SESSIONS.pop(session_id, None)
+
+@app.post("/api/feeds/uploads")
+def api_feed_upload_start(filename: str = "", max_rows: int = 25, offset: int = 0):
+    _expire_upload_sessions()
+    session_id = uuid.uuid4().hex
+    ingest = FeedIngest(filename, preview_rows=max_rows, preview_offset=offset, max_bytes=MAX_UPLOAD_BYTES)
+    with _UPLOAD_SESSIONS_LOCK:
+        _UPLOAD_SESSIONS[session_id] = {
+            "ingest": ingest,
+            "offset": offset,
+            "lock": threading.Lock(),
+            "touched": time.monotonic()
+        }
+    return {"ok": True, "session_id": session_id, "max_bytes": MAX_UPLOAD_BYTES, "chunk_bytes": UPLOAD_CHUNK_BYTES}
+
+@app.put("/api/feeds/uploads/{session_id}")
+async def api_feed_upload_part(session_id: str, request: Request, offset: int = 0):
+    sess = _get_upload_session(session_id)
+    ingest = sess["ingest"]
+    if not sess["lock"].acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Another part is still being received")
+    try:
+        if offset != ingest.received_bytes:
+            # Parts must arrive in order; the client resumes from received_bytes
+            raise HTTPException(
+                status_code=409,
+                detail={"error": "Unexpected part offset", "received_bytes": ingest.received_bytes}
+            )
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await run_in_threadpool(ingest.write, chunk)
+        except UploadTooLarge:
+            _drop_upload_session(session_id)
+            ingest.abort()
+            raise _too_large(MAX_UPLOAD_BYTES)
+    finally:
+        sess["lock"].release()
+
+    preview = ingest.preview
+    return {
+        "ok": True,
+        "session_id": session_id,
+        "received_bytes": ingest.received_bytes,
+        "headers": preview[0] if preview else None,
+        "preview_rows": preview[1] if preview else None,
+        "offset": sess["offset"]
+    }
+
+@app.post("/api/feeds/uploads/{session_id}/complete")
+def api_feed_upload_complete(session_id: str):
+    sess = _get_upload_session(session_id)
+    with sess["lock"]:
+        if _drop_upload_session(session_id) is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        ingest = sess["ingest"]
+        try:
+            upload_id, path, total = ingest.finish()
+        except BaseException:
+            ingest.abort()
+            raise
+    _CATALOG.register_upload(upload_id, path)
+    return _ingest_result(ingest, upload_id, total, sess["offset"])
+
+@app.delete("/api/feeds/uploads/{session_id}")
+def api_feed_upload_abort(session_id: str):
+    sess = _drop_upload_session(session_id)
+    if sess is not None:
+        with sess["lock"]:
+            sess["ingest"].abort()
+    return {"ok": True}
+
+@app.get("/api/feeds/{upload_id}/rows")
+def api_feed_rows(request: Request, upload_id: str, offset: int = 0, limit: int = 25):
+    upload_path = _upload_path(upload_id)
+    if not upload_path:
+        return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
+    headers, rows, total = _read_page(upload_path, offset, limit)
+    return json_response(request, {
+        "ok": True,
+        "upload_id": upload_id,
+        "headers": headers,
+        "rows": rows,
+        "offset": offset,
+        "limit": limit,
+        "total_rows": total
+    })
+
 @app.get("/api/mappings/{supplier_code}")
-def api_get_mapping(supplier_code: str):
+def api_get_mapping(supplier_code: str, request: Request, response: Response):
+    # ETag follows the mapping file's (mtime, size); a missing file has its own tag
+    stamp = file_stamp(mapping_path_for(supplier_code))
+    validators = cache_validators(("api/mappings", supplier_code, stamp), stamp[0] / 1e9 if stamp else None)
+    not_modified = check_not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
     m = load_mapping(supplier_code)
+    apply_validators(response, validators)
     return {"mapping": None if not m else m}
 
+def _saved_mapping(supplier_code: str):
+    # Saved files wrap the mapping: {"supplier_code", "saved_at_utc", "mapping"}
+    m = load_mapping(supplier_code) if supplier_code else None
+    if isinstance(m, dict) and isinstance(m.get("mapping"), dict):
+        return m["mapping"]
+    return m
+
 @app.post("/api/mappings/{supplier_code}")
 def api_save_mapping(supplier_code: str, payload: dict = Body(...)):
     mapping = payload.get("mapping") or payload
@@ -556,7 +821,7 @@ def api_save_mapping(supplier_code: str, payload: dict = Body(...)):
     return {"ok": True, "path": path}
 
 @app.post("/api/pricing/preview")
-def api_pricing_preview(payload: dict = Body(...)):
+def api_pricing_preview(request: Request, payload: dict = Body(...)):
     upload_id = payload.get("upload_id")
     supplier_code = payload.get("supplier_code", "")
     mapping = payload.get("mapping") or {}
@@ -566,21 +831,41 @@ def api_pricing_preview(payload: dict = Body(...)):
     dropship_fee = float(payload.get("dropship_fee", 0.0))
     rounding_mode = (payload.get("rounding_mode") or "ends_in_99")
 
+    offset = int(payload.get("offset", 0))
+    limit = int(payload.get("limit", payload.get("max_rows", 25)))
+
     if not upload_id:
         return {"ok": False, "error": "Missing upload_id"}
 
-    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    upload_path = os.path.join(root, "data", "uploads", f"{upload_id}.csv")
-    if not os.path.exists(upload_path):
+    upload_path = _upload_path(upload_id)
+    if not upload_path:
         return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
 
-    # Get preview rows again (stable)
-    _, preview_rows = preview_upload(upload_path, max_rows=int(payload.get("max_rows", 25)))
+    # Parameter-only changes (margins, rounding, ...) hit the normalized
+    # cache and skip parsing; repeated requests hit the priced cache.
+    # Keyed by blob (content digest), so re-uploads of the same file hit the cache
+    norm_key = cache_key("normalized", os.path.basename(upload_path), file_stamp(upload_path), mapping, offset, limit)
+    price_key = cache_key(
+        "priced", norm_key, marketplace, min_margin, max_margin, dropship_fee, rounding_mode,
+        file_stamp(os.path.join(CONFIG_DIR, "marketplace_fees.json"))
+    )
+    # The priced cache holds the serialized response body: a hit is a
+    # byte copy (no re-pricing, no re-serialization)
+    cached = _PRICED_CACHE.get(price_key)
+    if cached is not None:
+        return json_body_response(request, cached)
+
+    entry = _NORMALIZED_CACHE.get(norm_key)
+    if entry is None:
+        # Page of rows straight from the row index (O(page size))
+        _, preview_rows, total = _read_page(upload_path, offset, limit)
+        entry = (normalize_preview_rows(preview_rows, mapping), total)
+        _NORMALIZED_CACHE.put(norm_key, entry, size=approx_rows_size(entry[0]))
+    normalized, total = entry
 
     fee_table = _read_fee_table()
-    computed = price_preview_rows(
-        preview_rows=preview_rows,
-        mapping=mapping,
+    computed = price_preview_normalized(
+        normalized,
         marketplace=marketplace,
         min_margin=min_margin,
         max_margin=max_margin,
@@ -588,12 +873,185 @@ def api_pricing_preview(payload: dict = Body(...)):
         fee_table=fee_table,
         rounding_mode=rounding_mode
     )
-    return {"ok": True, "rows": computed}
+    body = dumps_json({"ok": True, "rows": computed, "offset": offset, "limit": limit, "total_rows": total})
+    _PRICED_CACHE.put(price_key, body, size=len(body))
+    return json_body_response(request, body)
+
+def _run_pricing(payload: dict, progress=None):
+    # Shared by /api/pricing/run and pricing jobs (which pass a progress callback)
+    upload_id = payload.get("upload_id")
+    if not upload_id:
+        return {"ok": False, "error": "Missing upload_id"}
+
+    upload_path = _upload_path(upload_id)
+    if not upload_path:
+        return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
+
+    # Storage maintenance must not delete the upload while it is being priced
+    with _CATALOG.pin_upload(upload_path):
+        return _price_upload(payload, upload_path, progress)
+
+def _price_upload(payload: dict, upload_path: str, progress=None):
+    mapping = payload.get("mapping") or {}
+    marketplace = payload.get("marketplace", "amazon")
+    min_margin = float(payload.get("min_margin", 0.18))
+    max_margin = float(payload.get("max_margin", 0.35))
+    dropship_fee = float(payload.get("dropship_fee", 0.0))
+    rounding_mode = (payload.get("rounding_mode") or "ends_in_99")
+    # None -> ECOM_PRICING_WORKERS (default 1); >1 prices large uploads in a process pool
+    workers = payload.get("workers")
+    workers = int(workers) if workers else None
+    # csv (default), csv.gz, parquet or arrow
+    output_format = payload.get("output_format")
+    # Checkpointed by default when the run is sequential: re-posting the same
+    # run after a restart resumes it. Parallel runs can't be checkpointed.
+    checkpoint = payload.get("checkpoint")
+    if checkpoint is None:
+        checkpoint = (workers or DEFAULT_PRICING_WORKERS) <= 1
+    checkpoint = bool(checkpoint)
+
+    fee_table = _read_fee_table()
+
+    # "marketplaces": [..] or "all" -> one pass, one output per marketplace
+    # (or a single wide output with "layout": "wide")
+    marketplaces = payload.get("marketplaces")
+    if marketplaces and marketplaces != "all" and not (
+        isinstance(marketplaces, list) and all(isinstance(mp, str) for mp in marketplaces)
+    ):
+        return {"ok": False, "error": 'marketplaces must be "all" or a list of marketplace names'}
+    if marketplaces:
+        try:
+            paths = run_multi_marketplace_pricing(
+                upload_path=upload_path,
+                mapping=mapping,
+                marketplaces=None if marketplaces == "all" else list(marketplaces),
+                min_margin=min_margin,
+                max_margin=max_margin,
+                dropship_fee=dropship_fee,
+                fee_table=fee_table,
+                rounding_mode=rounding_mode,
+                layout=payload.get("layout") or "per_marketplace",
+                output_format=output_format,
+                progress=progress
+            )
+        except ValueError as e:
+            return {"ok": False, "error": str(e)}
+        outputs = []
+        for key, path in paths.items():
+            out_id = _register_output(path)
+            outputs.append({"marketplace": key, "out_id": out_id, "download_url": f"/api/pricing/download/{out_id}", "out_path": path})
+        return {"ok": True, "outputs": outputs}
+
+    try:
+        out_path = run_full_pricing(
+            upload_path=upload_path,
+            mapping=mapping,
+            marketplace=marketplace,
+            min_margin=min_margin,
+            max_margin=max_margin,
+            dropship_fee=dropship_fee,
+            fee_table=fee_table,
+            rounding_mode=rounding_mode,
+            workers=workers,
+            output_format=output_format,
+            checkpoint=checkpoint,
+            progress=progress
+        )
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
+    out_id = _register_output(out_path)
+    return {"ok": True, "marketplace": marketplace, "out_id": out_id, "download_url": f"/api/pricing/download/{out_id}", "out_path": out_path}
 
 @app.post("/api/pricing/run")
 def api_pricing_run(payload: dict = Body(...)):
+    return _run_pricing(payload)
+
+# --- Pricing jobs -------------------------------------------------------------
+# Same payload as /api/pricing/run, but returns a job_id at once; poll
+# /api/pricing/jobs/{job_id} for state, rows, rows_per_sec, eta_seconds and
+# downloads (one entry per output; download_url when there is exactly one).
+# Job metadata is kept in data/jobs/ across restarts.
+_JOBS = JobManager()
+
+@app.post("/api/pricing/jobs")
+def api_pricing_job_submit(payload: dict = Body(...)):
     upload_id = payload.get("upload_id")
-    mapping = payload.get("mapping") or {}
+    if not upload_id:
+        return {"ok": False, "error": "Missing upload_id"}
+    if not _upload_path(upload_id):
+        return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
+    job = _JOBS.submit("pricing_run", payload, lambda progress: _run_pricing(payload, progress))
+    return {"ok": True, "job_id": job["job_id"], "status_url": f"/api/pricing/jobs/{job['job_id']}", "job": job}
+
+@app.get("/api/pricing/jobs")
+def api_pricing_jobs(limit: int = 50):
+    return {"ok": True, "jobs": _JOBS.list(limit)}
+
+@app.get("/api/pricing/jobs/{job_id}")
+def api_pricing_job_status(job_id: str):
+    job = _JOBS.status(job_id)
+    if job is None:
+        return {"ok": False, "error": "Job not found"}
+    return {"ok": True, "job": job}
+
+# Server-Sent Events for a job: "progress" events (rows, rows_priced,
+# warnings, rows_per_sec, eta_seconds, ...) while it runs, then one "summary"
+# event with the full job status. The pricing thread only updates counters
+# once per chunk; this stream samples them at most every `interval` seconds,
+# so subscribers add no work to the pricing loop.
+JOB_EVENT_INTERVAL = 0.5
+JOB_EVENT_MIN_INTERVAL = 0.1
+JOB_EVENT_HEARTBEAT = 15.0
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/api/pricing/jobs/{job_id}/events")
+async def api_pricing_job_events(job_id: str, interval: float = JOB_EVENT_INTERVAL):
+    if _JOBS.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    interval = min(10.0, max(JOB_EVENT_MIN_INTERVAL, float(interval)))
+
+    async def events():
+        last = None
+        quiet = 0.0
+        while True:
+            event = _JOBS.progress_event(job_id)
+            if event is None:
+                return
+            if event["state"] in ("succeeded", "failed", "cancelled"):
+                yield _sse("summary", _JOBS.status(job_id))
+                return
+            key = (event["state"], event["rows"], event["bytes_done"])
+            if key != last:
+                last, quiet = key, 0.0
+                yield _sse("progress", event)
+            elif quiet >= JOB_EVENT_HEARTBEAT:
+                quiet = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(interval)
+            quiet += interval
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/pricing/jobs/{job_id}/cancel")
+def api_pricing_job_cancel(job_id: str):
+    job = _JOBS.cancel(job_id)
+    if job is None:
+        return {"ok": False, "error": "Job not found"}
+    return {"ok": True, "job": job}
+
+@app.post("/api/pricing/incremental")
+def api_pricing_incremental(payload: dict = Body(...)):
+    # Daily full feeds: reprice only rows that changed since the supplier's last run
+    upload_id = payload.get("upload_id")
+    supplier_code = (payload.get("supplier_code") or "").strip()
+    mapping = payload.get("mapping") or _saved_mapping(supplier_code) or {}
     marketplace = payload.get("marketplace", "amazon")
     min_margin = float(payload.get("min_margin", 0.18))
     max_margin = float(payload.get("max_margin", 0.35))
@@ -602,31 +1060,142 @@ def api_pricing_run(payload: dict = Body(...)):
 
     if not upload_id:
         return {"ok": False, "error": "Missing upload_id"}
+    if not supplier_code:
+        return {"ok": False, "error": "Missing supplier_code"}
 
-    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    upload_path = os.path.join(root, "data", "uploads", f"{upload_id}.csv")
-    if not os.path.exists(upload_path):
+    upload_path = _upload_path(upload_id)
+    if not upload_path:
         return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
 
-    fee_table = _read_fee_table()
-    out_path = run_full_pricing(
-        upload_path=upload_path,
-        mapping=mapping,
+    with _CATALOG.pin_upload(upload_path):
+        result = run_incremental_pricing(
+            upload_path=upload_path,
+            supplier_code=supplier_code,
+            mapping=mapping,
+            marketplace=marketplace,
+            min_margin=min_margin,
+            max_margin=max_margin,
+            dropship_fee=dropship_fee,
+            fee_table=_read_fee_table(),
+            rounding_mode=rounding_mode
+        )
+
+    out_id = _register_output(result["out_path"])
+    changes_id = _register_output(result["changes_path"])
+    return {
+        "ok": True,
+        **result,
+        "out_id": out_id,
+        "download_url": f"/api/pricing/download/{out_id}",
+        "changes_url": f"/api/pricing/download/{changes_id}"
+    }
+
+# --- Streaming export ---------------------------------------------------------
+# Prices the upload while the response is being sent: CSV (or gzip CSV with
+# "gzip": true) is produced a chunk at a time and nothing is written to disk.
+# Same bytes as the file /api/pricing/run writes. POST takes the run payload;
+# the GET form (mapping saved for supplier_code) suits plain download links.
+def _pinned_stream(upload_path, body):
+    # The upload is read while the response streams, after the handler has
+    # returned, so the pin lives in the generator
+    with _CATALOG.pin_upload(upload_path):
+        yield from body
+
+def _export_response(upload_id, mapping, marketplace, min_margin, max_margin, dropship_fee, rounding_mode, compress):
+    upload_path = _upload_path(upload_id) if upload_id else None
+    if not upload_path:
+        return {"ok": False, "error": "Upload not found. Re-upload the CSV."}
+    chunks = iter_upload_priced_chunks(
+        upload_path,
+        mapping,
         marketplace=marketplace,
-        min_margin=min_margin,
-        max_margin=max_margin,
-        dropship_fee=dropship_fee,
-        fee_table=fee_table,
-        rounding_mode=rounding_mode
+        min_margin=float(min_margin),
+        max_margin=float(max_margin),
+        dropship_fee=float(dropship_fee),
+        fee_table=_read_fee_table(),
+        rounding_mode=rounding_mode or "ends_in_99"
+    )
+    fmt = "csv.gz" if compress else "csv"
+    ext = ".csv.gz" if compress else ".csv"
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    return StreamingResponse(
+        _pinned_stream(upload_path, iter_csv_bytes(chunks, OUTPUT_COLUMNS, compress=compress)),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="pricing_{marketplace}_{ts}{ext}"'}
+    )
+
+@app.post("/api/pricing/export")
+def api_pricing_export(payload: dict = Body(...)):
+    return _export_response(
+        payload.get("upload_id"),
+        payload.get("mapping") or {},
+        payload.get("marketplace", "amazon"),
+        payload.get("min_margin", 0.18),
+        payload.get("max_margin", 0.35),
+        payload.get("dropship_fee", 0.0),
+        payload.get("rounding_mode"),
+        bool(payload.get("gzip", False))
     )
 
-    out_id = os.path.basename(out_path).replace(".csv","")
-    _OUTPUT_INDEX[out_id] = out_path
-    return {"ok": True, "out_id": out_id, "download_url": f"/api/pricing/download/{out_id}", "out_path": out_path}
+@app.get("/api/pricing/export/{upload_id}")
+def api_pricing_export_get(
+    upload_id: str,
+    supplier_code: str = "",
+    marketplace: str = "amazon",
+    min_margin: float = 0.18,
+    max_margin: float = 0.35,
+    dropship_fee: float = 0.0,
+    rounding_mode: str = "ends_in_99",
+    gzip: bool = False
+):
+    mapping = _saved_mapping(supplier_code)
+    if not mapping:
+        return {"ok": False, "error": "No saved mapping for supplier_code"}
+    return _export_response(upload_id, mapping, marketplace, min_margin, max_margin, dropship_fee, rounding_mode, gzip)
 
 @app.get("/api/pricing/download/{out_id}")
-def api_pricing_download(out_id: str):
-    path = _OUTPUT_INDEX.get(out_id)
-    if not path or not os.path.exists(path):
-        return {"ok": False, "error": "Output not found (restart may have cleared index). Re-run pricing."}
-    return FileResponse(path, media_type="text/csv", filename=os.path.basename(path))
+def api_pricing_download(out_id: str, request: Request):
+    found = _CATALOG.resolve_output(out_id)
+    if found is None:
+        return {"ok": False, "error": "Output not found (it may have expired). Re-run pricing."}
+    path, compressed = found
+    if not compressed:
+        return FileResponse(path, media_type=MEDIA_TYPES[format_of_path(path)], filename=os.path.basename(path))
+
+    # CSV gzipped in place by retention: still downloads as the original .csv
+    filename = os.path.basename(path)[: -len(".gz")]
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(path, media_type=MEDIA_TYPES["csv"], filename=filename, headers={"Content-Encoding": "gzip"})
+
+    def decompressed():
+        with gzip.open(path, "rb") as f:
+            while True:
+                block = f.read(1 << 20)
+                if not block:
+                    break
+                yield block
+
+    return StreamingResponse(
+        decompressed(),
+        media_type=MEDIA_TYPES["csv"],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/storage")
+def api_storage():
+    return {"ok": True, **_CATALOG.stats()}
+
+@app.post("/api/storage/maintenance")
+def api_storage_maintenance():
+    # Apply the compression / age / disk-budget policies now
+    return {"ok": True, **_CATALOG.maintain(), **_CATALOG.stats()}
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    return {
+        "ok": True,
+        "config": CONFIG_CACHE.stats(),
+        "preview_normalized": _NORMALIZED_CACHE.stats(),
+        "preview_priced": _PRICED_CACHE.stats(),
+        "kmc_prices": _KMC_PRICES.stats(),
+    }
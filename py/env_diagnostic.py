@@ -14,6 +14,11 @@ from __future__ import annotations
 import os
 from typing import Callable, Dict, Iterable, List
 
+try:
+    from py.config_cache import CONFIG_CACHE
+except ImportError:
+    from config_cache import CONFIG_CACHE
+
 
 def parse_dotenv(path: str) -> Dict[str, str]:
     """
@@ -24,7 +29,13 @@ def parse_dotenv(path: str) -> Dict[str, str]:
     - splits on first '='
     - strips quotes around values
     - supports UTF-8 + BOM
+
+    The parsed result is cached until the file's mtime/size changes.
     """
+    return CONFIG_CACHE.load(path, _read_dotenv, copy=True)
+
+
+def _read_dotenv(path: str) -> Dict[str, str]:
     env: Dict[str, str] = {}
     with open(path, "r", encoding="utf-8-sig") as f:
         for raw in f:
@@ -0,0 +1,140 @@
+# fast_response.py
+# JSON responses for the large read endpoints (pricing preview, feed pages,
+# supplier lists), without FastAPI's jsonable_encoder / response_model pass.
+#
+#   return json_response(request, {"ok": True, "rows": rows}, headers=...)
+#   return json_body_response(request, cached_bytes)   # pre-serialized body
+#
+# The body is serialized once, with orjson when it is installed (stdlib json
+# otherwise). Bodies of at least COMPRESS_MIN_BYTES are compressed with the
+# best encoding the client accepts: br (needs the brotli package), then gzip.
+# A compressed body gets its own ETag (http_cache.etag_for_encoding).
+# Only pass data the server built itself; nothing is re-validated.
+#
+# orjson and brotli are optional speedups, like numpy in pricing_batch.
+
+from __future__ import annotations
+
+import gzip
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    from py.http_cache import etag_for_encoding
+except ImportError:
+    from http_cache import etag_for_encoding
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None  # type: ignore[assignment]
+
+COMPRESS_MIN_BYTES = int(os.environ.get("ECOM_COMPRESS_MIN_BYTES", "2048"))
+
+# Favour speed: these payloads are built per request
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+SUPPORTED_ENCODINGS = (("br",) if brotli is not None else ()) + ("gzip",)
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # numpy scalars, Decimals, datetimes, ...
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _finite(value: Any) -> Any:
+    # stdlib json writes NaN/Infinity, which is not JSON; orjson writes null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        _finite(content), default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported content-coding for an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    q: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            q[name] = weight
+    candidates: List[str] = [
+        enc for enc in SUPPORTED_ENCODINGS if q.get(enc, q.get("*", 0.0)) > 0
+    ]
+    # Highest q wins; ties go to the SUPPORTED_ENCODINGS order (br first)
+    candidates.sort(key=lambda enc: -q.get(enc, q.get("*", 0.0)))
+    return candidates[0] if candidates else None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def json_response(
+    request: Optional[Request],
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    return json_body_response(request, dumps_json(content), status_code, headers)
+
+
+def json_body_response(
+    request: Optional[Request],
+    body: bytes,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """json_response() for a body already serialized with dumps_json (e.g. cached)."""
+    out_headers = dict(headers or {})
+    out_headers["Vary"] = "Accept-Encoding"
+    if request is not None and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding:
+            body = compress_body(body, encoding)
+            out_headers["Content-Encoding"] = encoding
+            if "ETag" in out_headers:
+                out_headers["ETag"] = etag_for_encoding(out_headers["ETag"], encoding)
+    return Response(content=body, status_code=status_code, headers=out_headers, media_type="application/json")
@@ -0,0 +1,279 @@
+# fee_schedule.py
+# Marketplace fee schedules (config/marketplace_fees.json entries), compiled
+# into breakpoint arrays and solved for price in closed form.
+#
+# Entry formats:
+#   {"type": "percent_of_price", "percent": 0.15, "per_item": 0.30}
+#   {"type": "tiered",
+#    "tier_mode": "whole",            # "whole": the tier's rate applies to the whole price
+#                                     # "marginal": each rate applies to the slice of price in its tier
+#    "tiers": [{"up_to": 15.00, "percent": 0.08}, {"up_to": null, "percent": 0.15}],
+#    "per_item": 0.00,
+#    "min_fee": 0.30,                 # minimum referral fee (per_item is added on top)
+#    "categories": {"jewelry": {"tier_mode": "marginal",
+#                               "tiers": [{"up_to": 250, "percent": 0.20}, {"up_to": null, "percent": 0.05}]}},
+#    "solve": "exact"}
+#
+# Category overrides are merged over the base entry and picked by the row's
+# (case-insensitive) category.
+#
+# "solve" controls how the price-dependent fee enters the price:
+#   "approx": price = p0 + fee(p0) with p0 = total_cost / (1 - margin)
+#             (the original one-pass model; default for percent_of_price so
+#             existing outputs do not move)
+#   "exact":  price p with (p - fee(p) - total_cost) / p == margin
+#             (default for tiered schedules)
+#
+# Within one tier the fee is max(min_fee, offset + rate * p) + per_item, so the
+# margin condition holds from a closed-form point on per tier: the larger of
+# the linear root, the minimum-fee root and the tier start. The lowest such
+# point that lies inside its tier is the price. With "whole" tiers the fee can
+# jump at a breakpoint and leave no exact root; the price is then just above
+# the breakpoint, the cheapest price that meets the margin.
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - array solving needs numpy, scalar does not
+    np = None  # type: ignore[assignment]
+
+FEE_TYPES = ("percent_of_price", "tiered")
+TIER_MODES = ("whole", "marginal")
+SOLVE_MODES = ("approx", "exact")
+
+# Margins at or above this can't be solved (price -> infinity); the old model
+# priced them at 0 before fees, which we keep
+MAX_MARGIN = 0.999
+
+# 1 - margin - rate within this of zero is float noise (0.85 + 0.15 leaves
+# ~3e-17), not a real denominator; such tiers have no solution
+DENOM_EPSILON = 1e-9
+
+_ZERO_FEE = {"type": "percent_of_price", "percent": 0.0, "per_item": 0.0}
+
+
+@dataclass(frozen=True)
+class FeeSchedule:
+    uppers: Tuple[float, ...]    # inclusive upper bound per tier (last is inf)
+    rates: Tuple[float, ...]
+    offsets: Tuple[float, ...]   # fee on tier k = offsets[k] + rates[k] * price
+    per_item: float
+    min_fee: Optional[float]
+    solve: str
+
+    @property
+    def lowers(self) -> Tuple[float, ...]:
+        return (-math.inf,) + self.uppers[:-1]
+
+    def tier_of(self, price: float) -> int:
+        for k, upper in enumerate(self.uppers):
+            if price <= upper:
+                return k
+        return len(self.uppers) - 1
+
+    def fee(self, price: float) -> float:
+        k = self.tier_of(price)
+        g = price * self.rates[k] if self.offsets[k] == 0.0 else self.offsets[k] + self.rates[k] * price
+        if self.min_fee is not None and g < self.min_fee:
+            g = self.min_fee
+        return g + self.per_item
+
+    def price_for_margin(self, total_cost: float, margin: float) -> Tuple[float, bool]:
+        """
+        Price that yields `margin` after fees. Returns (price, solved); when an
+        exact solution does not exist the approximation is returned with
+        solved=False.
+        """
+        margin = float(margin)
+        p0 = 0.0 if margin >= MAX_MARGIN else total_cost / (1.0 - margin)
+        approx = p0 + self.fee(p0)
+        if self.solve == "approx" or margin >= MAX_MARGIN:
+            return approx, True
+
+        base = total_cost + self.per_item
+        floor = (base + self.min_fee) / (1.0 - margin) if self.min_fee is not None else -math.inf
+        best = math.inf
+        for lower, upper, rate, offset in zip(self.lowers, self.uppers, self.rates, self.offsets):
+            start = max(floor, math.nextafter(lower, math.inf))
+            denom = 1.0 - margin - rate
+            if abs(denom) <= DENOM_EPSILON:
+                denom = 0.0
+            if denom > 0:
+                p = max(start, (base + offset) / denom)
+            elif math.isinf(lower) or start * denom < base + offset:
+                continue  # margin falls as price rises in this tier
+            else:
+                p = start
+            if p <= upper:
+                best = min(best, p)
+        if math.isinf(best):
+            return approx, False
+        return best, True
+
+    # --- array versions (numpy) -------------------------------------------
+
+    def fee_array(self, price: "np.ndarray") -> "np.ndarray":
+        uppers = np.asarray(self.uppers)
+        k = np.minimum(np.searchsorted(uppers, price, side="left"), len(uppers) - 1)
+        rates = np.asarray(self.rates)[k]
+        if any(self.offsets):
+            g = np.asarray(self.offsets)[k] + rates * price
+        else:
+            g = price * rates
+        if self.min_fee is not None:
+            g = np.maximum(g, self.min_fee)
+        return g + self.per_item
+
+    def price_for_margin_array(self, total_cost: "np.ndarray", margin: float) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Vectorized price_for_margin: (prices, solved mask)."""
+        margin = float(margin)
+        n = total_cost.shape[0]
+        p0 = np.zeros(n) if margin >= MAX_MARGIN else total_cost / (1.0 - margin)
+        approx = p0 + self.fee_array(p0)
+        if self.solve == "approx" or margin >= MAX_MARGIN:
+            return approx, np.ones(n, dtype=bool)
+
+        base = total_cost + self.per_item
+        if self.min_fee is not None:
+            floor = (base + self.min_fee) / (1.0 - margin)
+        else:
+            floor = np.full(n, -np.inf)
+        best = np.full(n, np.inf)
+        for lower, upper, rate, offset in zip(self.lowers, self.uppers, self.rates, self.offsets):
+            start = np.maximum(floor, np.nextafter(lower, np.inf))
+            denom = 1.0 - margin - rate
+            if abs(denom) <= DENOM_EPSILON:
+                denom = 0.0
+            if denom > 0:
+                p = np.maximum(start, (base + offset) / denom)
+                ok = p <= upper
+            elif math.isinf(lower):
+                continue
+            else:
+                p = start
+                ok = (p <= upper) & (start * denom >= base + offset)
+            best = np.where(ok & (p < best), p, best)
+        solved = np.isfinite(best)
+        return np.where(solved, best, approx), solved
+
+
+def compile_fee_schedule(cfg: Dict[str, Any]) -> FeeSchedule:
+    """Compile one fee-table entry (without its category overrides)."""
+    typ = cfg.get("type", "percent_of_price")
+    per_item = float(cfg.get("per_item", 0.0) or 0.0)
+    min_fee = cfg.get("min_fee")
+    min_fee = float(min_fee) if min_fee not in (None, "") and float(min_fee) > 0 else None
+
+    if typ == "percent_of_price":
+        uppers, rates, offsets = (math.inf,), (float(cfg.get("percent", 0.0)),), (0.0,)
+        default_solve = "approx"
+    elif typ == "tiered":
+        mode = cfg.get("tier_mode", "whole")
+        if mode not in TIER_MODES:
+            raise ValueError(f"Unknown tier_mode {mode!r} (expected one of {', '.join(TIER_MODES)})")
+        tiers = cfg.get("tiers") or [{"up_to": None, "percent": 0.0}]
+        bounds: List[float] = []
+        for t in tiers:
+            up = t.get("up_to")
+            bounds.append(math.inf if up in (None, "") else float(up))
+        if bounds != sorted(bounds) or len(set(bounds)) != len(bounds):
+            raise ValueError("Fee tiers must have strictly increasing up_to values")
+        if bounds[-1] != math.inf:
+            # Prices above the last bound stay in the last tier
+            bounds[-1] = math.inf
+        tier_rates = [float(t.get("percent", 0.0)) for t in tiers]
+
+        tier_offsets: List[float] = []
+        if mode == "marginal":
+            # offset_k = fee accumulated below the tier - rate_k * tier start
+            acc, start = 0.0, 0.0
+            for k, (up, rate) in enumerate(zip(bounds, tier_rates)):
+                tier_offsets.append(0.0 if k == 0 else acc - rate * start)
+                if not math.isinf(up):
+                    acc += rate * (up - start)
+                    start = up
+        else:
+            tier_offsets = [0.0] * len(tiers)
+        uppers, rates, offsets = tuple(bounds), tuple(tier_rates), tuple(tier_offsets)
+        default_solve = "exact"
+    else:
+        # Unknown fee models charge nothing (as before)
+        uppers, rates, offsets = (math.inf,), (0.0,), (0.0,)
+        per_item, min_fee = 0.0, None
+        default_solve = "approx"
+
+    solve = cfg.get("solve") or default_solve
+    if solve not in SOLVE_MODES:
+        raise ValueError(f"Unknown fee solve mode {solve!r} (expected one of {', '.join(SOLVE_MODES)})")
+    return FeeSchedule(uppers=uppers, rates=rates, offsets=offsets, per_item=per_item, min_fee=min_fee, solve=solve)
+
+
+@dataclass(frozen=True)
+class MarketplaceFees:
+    default: FeeSchedule
+    categories: Dict[str, FeeSchedule]
+
+    def for_category(self, category: Any) -> FeeSchedule:
+        if not self.categories or not category:
+            return self.default
+        return self.categories.get(str(category).strip().lower(), self.default)
+
+
+# Compiled entries keyed by their JSON text; fee tables are tiny and reused
+# for every chunk, so compile each distinct entry once per process.
+_compiled: Dict[str, MarketplaceFees] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_marketplace_fees(cfg: Optional[Dict[str, Any]]) -> MarketplaceFees:
+    cfg = cfg or _ZERO_FEE
+    key = json.dumps(cfg, sort_keys=True, default=str)
+    with _compiled_lock:
+        hit = _compiled.get(key)
+    if hit is not None:
+        return hit
+
+    base = {k: v for k, v in cfg.items() if k != "categories"}
+    categories = {
+        str(name).strip().lower(): compile_fee_schedule({**base, **(override or {})})
+        for name, override in (cfg.get("categories") or {}).items()
+    }
+    fees = MarketplaceFees(default=compile_fee_schedule(base), categories=categories)
+    with _compiled_lock:
+        _compiled[key] = fees
+    return fees
+
+
+def fees_for(fee_table: Dict[str, Any], marketplace: str) -> MarketplaceFees:
+    return compile_marketplace_fees(fee_table.get(marketplace, _ZERO_FEE))
+
+
+def price_for_margin_batch(
+    fees: MarketplaceFees,
+    total_cost: "np.ndarray",
+    margin: float,
+    categories: Optional[Sequence[Any]] = None
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Solve a whole column, grouping rows by category override."""
+    if categories is None or not fees.categories:
+        return fees.default.price_for_margin_array(total_cost, margin)
+
+    keys = [str(c).strip().lower() if c else "" for c in categories]
+    groups: Dict[str, List[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key if key in fees.categories else "", []).append(i)
+
+    prices = np.empty(total_cost.shape[0])
+    solved = np.empty(total_cost.shape[0], dtype=bool)
+    for key, rows in groups.items():
+        idx = np.asarray(rows, dtype=np.int64)
+        schedule = fees.categories[key] if key else fees.default
+        prices[idx], solved[idx] = schedule.price_for_margin_array(total_cost[idx], margin)
+    return prices, solved
@@ -0,0 +1,317 @@
+# feed_index.py
+# Row-offset sidecar index for uploaded feeds.
+#
+#   <upload>.rows.idx = uint64 array [start_0, start_1, ..., start_{n-1}, end]
+#
+# start_i is the byte offset of data row i (header and blank lines excluded,
+# matching csv.DictReader row numbering); end is the file size. The index is
+# memory-mapped when read, so any page of rows N..M costs O(page size).
+
+from __future__ import annotations
+
+import csv
+import io
+import mmap
+import os
+from array import array
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy only speeds up indexing
+    np = None  # type: ignore[assignment]
+
+try:
+    from py.pricing_mapping_engine import (
+        ENCODING_SNIFF_BYTES, RECORD_END_RE, STREAM_CHUNK_BYTES, iter_decoded_text, iter_text_lines,
+        open_upload_lines, sniff_encoding, ByteRangeReader
+    )
+    from py.upload_store import CODEC_EXTENSIONS, UploadWriter, codec_of, open_upload
+except ImportError:
+    from pricing_mapping_engine import (
+        ENCODING_SNIFF_BYTES, RECORD_END_RE, STREAM_CHUNK_BYTES, iter_decoded_text, iter_text_lines,
+        open_upload_lines, sniff_encoding, ByteRangeReader
+    )
+    from upload_store import CODEC_EXTENSIONS, UploadWriter, codec_of, open_upload
+
+INDEX_SUFFIX = ".rows.idx"
+
+# FeedIngest keeps at most this much of the upload's head for the early preview
+PREVIEW_PREFIX_BYTES = 8 << 20
+_NL, _CR, _QUOTE = 10, 13, 34
+
+
+def index_path_for(upload_path: str) -> str:
+    codec = codec_of(upload_path)
+    if codec is not None:
+        # <digest>.csv.zst -> <digest>.rows.idx, shared by every alias of the blob
+        return upload_path[: -len(CODEC_EXTENSIONS[codec])] + INDEX_SUFFIX
+    return os.path.splitext(upload_path)[0] + INDEX_SUFFIX
+
+
+# Both scanners end a record at \r\n, a bare \r or \n outside quotes. A \r
+# that is the last byte of buf counts as bare: RowOffsetScanner.feed() only
+# passes one on once it knows the next byte is not \n.
+
+def _record_starts_numpy(buf: bytes, parity: int) -> Tuple[List[int], int]:
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    quotes = np.cumsum(arr == _QUOTE, dtype=np.int64)
+    nl = arr == _NL
+    cr = arr == _CR
+    cr[:-1] &= ~nl[1:]  # the \r of a \r\n is not a record end by itself
+    ends = np.flatnonzero(nl | cr)
+    starts = ends[((quotes[ends] + parity) & 1) == 0] + 1
+    return starts.tolist(), (parity + int(quotes[-1])) & 1 if len(arr) else parity
+
+
+def _record_starts_python(buf: bytes, parity: int) -> Tuple[List[int], int]:
+    starts: List[int] = []
+    q_pos = 0
+    for m in RECORD_END_RE.finditer(buf):
+        j = m.start()
+        parity = (parity + buf.count(b'"', q_pos, j)) & 1
+        q_pos = j
+        if parity == 0:
+            starts.append(m.end())
+    return starts, (parity + buf.count(b'"', q_pos)) & 1
+
+
+class RowOffsetScanner:
+    """
+    Incremental version of scan_row_offsets: feed() blocks of the upload in
+    order, then finish() returns the offsets. Lets uploads be indexed while
+    they are being received.
+    """
+
+    def __init__(self) -> None:
+        self._scan = _record_starts_numpy if np is not None else _record_starts_python
+        self.offsets = array("Q")
+        self._base = 0         # absolute offset of the next buf[0]
+        self._carry = b""      # bytes after the last record end seen so far
+        self._parity = 0       # quote parity at the start of the carry
+        self._pending = False  # a record starts exactly at self._base
+        self._done = False
+
+    @property
+    def scanned_to(self) -> int:
+        """Every record starting before this offset is in self.offsets."""
+        return self._base
+
+    def feed(self, block: bytes) -> None:
+        if not block:
+            return
+        buf = self._carry + block
+        # A trailing \r stays in the carry: it may be the first half of a \r\n
+        cut = max(buf.rfind(b"\n"), buf.rfind(b"\r", 0, len(buf) - 1)) + 1
+        if cut == 0:
+            self._carry = buf
+            return
+        self._carry = buf[cut:]
+        self._process(buf[:cut])
+
+    def _process(self, buf: bytes) -> None:
+        starts, next_parity = self._scan(buf, self._parity)
+        if self._pending:
+            starts.insert(0, 0)
+        self._pending = False
+        if starts and starts[-1] == len(buf):
+            self._pending = True
+            starts.pop()
+
+        # The header is [0, first start), so every start begins a data row
+        for s in starts:
+            if buf[s] in (_NL, _CR):
+                continue  # blank line
+            self.offsets.append(self._base + s)
+
+        self._base += len(buf)
+        self._parity = next_parity
+
+    def finish(self) -> array:
+        if not self._done:
+            if self._carry:
+                self._process(self._carry)
+                self._carry = b""
+            self.offsets.append(self._base)
+            self._done = True
+        return self.offsets
+
+
+def scan_row_offsets(f: BinaryIO) -> array:
+    """
+    Byte offsets of every data row start, plus the end-of-file sentinel.
+
+    Records end at a \\r\\n, \\r or \\n outside quotes (even number of '"'
+    bytes before it), as they do for csv.
+    Blank lines are skipped, as csv.DictReader does.
+    """
+    scanner = RowOffsetScanner()
+    f.seek(0)
+    while True:
+        block = f.read(STREAM_CHUNK_BYTES)
+        if not block:
+            break
+        scanner.feed(block)
+    return scanner.finish()
+
+
+def write_row_index(upload_path: str, offsets: array) -> str:
+    idx_path = index_path_for(upload_path)
+    tmp = idx_path + ".tmp"
+    with open(tmp, "wb") as out:
+        offsets.tofile(out)
+    os.replace(tmp, idx_path)
+    return idx_path
+
+
+def build_row_index(upload_path: str) -> str:
+    with open_upload(upload_path) as f:
+        offsets = scan_row_offsets(f)
+    return write_row_index(upload_path, offsets)
+
+
+@contextmanager
+def open_row_index(upload_path: str) -> Iterator[Optional[Sequence[int]]]:
+    """Memory-mapped row offsets, or None when no index exists."""
+    idx_path = index_path_for(upload_path)
+    if not os.path.exists(idx_path) or os.path.getsize(idx_path) < 8:
+        yield None
+        return
+    with open(idx_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm).cast("Q")
+        try:
+            yield view
+        finally:
+            view.release()
+
+
+def read_header(f: BinaryIO) -> List[str]:
+    f.seek(0)
+    return next(csv.reader(open_upload_lines(f, chunk_size=ENCODING_SNIFF_BYTES)), [])
+
+
+def read_upload_page(
+    upload_path: str,
+    offset: int = 0,
+    limit: int = 25
+) -> Tuple[List[str], List[Dict[str, str]], Optional[int]]:
+    """
+    Rows offset..offset+limit as header-keyed dicts (same shape as
+    preview_upload), plus the total row count. Uses the sidecar index when
+    present; otherwise scans sequentially and the total is None.
+    """
+    offset = max(0, int(offset))
+    limit = max(0, int(limit))
+    with open_upload(upload_path) as f:
+        headers = read_header(f)
+        with open_row_index(upload_path) as index:
+            if index is None:
+                total = None
+                f.seek(0)
+                reader = csv.reader(open_upload_lines(f, chunk_size=ENCODING_SNIFF_BYTES))
+                next(reader, None)
+                records = (r for r in reader if r)
+                for _ in range(offset):
+                    if next(records, None) is None:
+                        break
+                page = [r for _, r in zip(range(limit), records)]
+            else:
+                total = len(index) - 1
+                start_row = min(offset, total)
+                end_row = min(offset + limit, total)
+                page = []
+                if end_row > start_row:
+                    f.seek(0)
+                    encoding = sniff_encoding(f.read(ENCODING_SNIFF_BYTES))
+                    if encoding == "utf-8-sig":
+                        encoding = "utf-8"  # BOM only at offset 0
+                    f.seek(index[start_row])
+                    chunks = iter_decoded_text(ByteRangeReader(f, index[end_row]), encoding, ENCODING_SNIFF_BYTES)
+                    page = [r for r in csv.reader(iter_text_lines(chunks)) if r]
+
+    rows = [{h: (r[i] if i < len(r) else "") for i, h in enumerate(headers)} for r in page]
+    return headers, rows, total
+
+
+def _parse_page(data: bytes, offset: int, limit: int) -> Tuple[List[str], List[Dict[str, str]]]:
+    reader = csv.reader(open_upload_lines(io.BytesIO(data), chunk_size=ENCODING_SNIFF_BYTES))
+    headers = next(reader, [])
+    records = (r for r in reader if r)
+    for _ in range(offset):
+        if next(records, None) is None:
+            break
+    page = [r for _, r in zip(range(limit), records)]
+    rows = [{h: (r[i] if i < len(r) else "") for i, h in enumerate(headers)} for r in page]
+    return headers, rows
+
+
+class FeedIngest:
+    """
+    Receives an upload chunk by chunk: stores it (UploadWriter), builds the
+    row index and, as soon as rows preview_offset..+preview_rows are complete,
+    the preview page, all in one pass without re-reading the upload.
+
+        ingest = FeedIngest("feed.csv", preview_rows=25)
+        for chunk in chunks:
+            ingest.write(chunk)
+            if ingest.preview is not None: ...   # (headers, rows)
+        upload_id, path, total_rows = ingest.finish()
+    """
+
+    def __init__(
+        self,
+        filename: str = "",
+        preview_rows: int = 25,
+        preview_offset: int = 0,
+        max_bytes: Optional[int] = None
+    ):
+        self.filename = filename
+        self.preview_rows = max(0, int(preview_rows))
+        self.preview_offset = max(0, int(preview_offset))
+        self.preview: Optional[Tuple[List[str], List[Dict[str, str]]]] = None
+        self._writer = UploadWriter(filename, max_bytes=max_bytes)
+        self._scanner = RowOffsetScanner()
+        self._prefix: Optional[bytearray] = bytearray()
+
+    @property
+    def received_bytes(self) -> int:
+        return self._writer.size
+
+    @property
+    def rows_seen(self) -> int:
+        return len(self._scanner.offsets)
+
+    def write(self, chunk: bytes) -> None:
+        self._writer.write(chunk)
+        self._scanner.feed(chunk)
+        if self._prefix is None:
+            return
+        self._prefix += chunk
+        # Row k is complete once row k + 1 starts; keep enough bytes for the
+        # encoding sniff to see what a full read would
+        offsets = self._scanner.offsets
+        want = self.preview_offset + self.preview_rows
+        if len(offsets) > want and len(self._prefix) >= ENCODING_SNIFF_BYTES:
+            end = offsets[want]
+            self.preview = _parse_page(bytes(self._prefix[:end]), self.preview_offset, self.preview_rows)
+            self._prefix = None
+        elif len(self._prefix) > PREVIEW_PREFIX_BYTES:
+            self._prefix = None  # page lies further in; read it back after finish()
+
+    def finish(self) -> Tuple[str, str, int]:
+        """Store the upload; returns (upload_id, blob path, total_rows)."""
+        upload_id, path = self._writer.finish()
+        offsets = self._scanner.finish()
+        # Rewritten even when the blob already had one: the offsets are fresh,
+        # and an index from an older scanner may be wrong (e.g. CR-only feeds)
+        write_row_index(path, offsets)
+        if self.preview is None:
+            headers, rows, _ = read_upload_page(path, self.preview_offset, self.preview_rows)
+            self.preview = (headers, rows)
+        self._prefix = None
+        return upload_id, path, len(offsets) - 1
+
+    def abort(self) -> None:
+        self._writer.abort()
+        self._prefix = None
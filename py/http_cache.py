@@ -0,0 +1,97 @@
+# http_cache.py
+# Conditional GET support: strong ETags and Last-Modified for read endpoints.
+#
+#   validators = cache_validators(("suppliers", version, query), modified_at)
+#   not_modified = check_not_modified(request, validators)
+#   if not_modified: return not_modified          # 304, no body
+#   apply_validators(response, validators)        # on the 200
+#
+# The ETag hashes whatever identifies the representation (store version or
+# file stamp plus the query that shaped the body), so equal tags mean equal
+# bytes. If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+#
+# A compressed body is a different representation, so fast_response sends it
+# with the content-coding appended to the tag ("<tag>-gzip", "<tag>-br").
+# If-None-Match accepts either form; a 304 echoes the tag the client holds.
+
+from __future__ import annotations
+
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+# Clients may keep the body but must revalidate before reusing it
+CACHE_CONTROL = "no-cache"
+
+# Content-codings fast_response may append to an ETag
+ETAG_CODINGS: Tuple[str, ...] = ("gzip", "br")
+
+
+def make_etag(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def cache_validators(parts: Any, modified_at: Optional[float]) -> Dict[str, str]:
+    headers = {"ETag": make_etag(parts), "Cache-Control": CACHE_CONTROL}
+    if modified_at:
+        headers["Last-Modified"] = formatdate(modified_at, usegmt=True)
+    return headers
+
+
+def etag_for_encoding(etag: str, encoding: str) -> str:
+    """The ETag of the body compressed with `encoding`: '"x"' -> '"x-gzip"'."""
+    return etag[:-1] + f"-{encoding}" + '"' if etag.endswith('"') else etag
+
+
+def _base_etag(tag: str) -> str:
+    # Weak comparison (W/"x" matches "x"), ignoring a content-coding suffix
+    tag = tag[2:] if tag.startswith("W/") else tag
+    for coding in ETAG_CODINGS:
+        suffix = f'-{coding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def _matching_etag(header: str, etag: str) -> Optional[str]:
+    # The client's tag that matches etag (any coding of it), or None
+    if header.strip() == "*":
+        return etag
+    for tag in (t.strip() for t in header.split(",")):
+        if _base_etag(tag) == etag:
+            return tag[2:] if tag.startswith("W/") else tag
+    return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return _matching_etag(header, etag) is not None
+
+
+def check_not_modified(request: Request, validators: Dict[str, str]) -> Optional[Response]:
+    """A 304 response if the client's copy is current, else None."""
+    headers = validators
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        matched = _matching_etag(inm, validators["ETag"])
+        fresh = matched is not None
+        if fresh and matched != validators["ETag"]:
+            headers = {**validators, "ETag": matched}
+    else:
+        ims = request.headers.get("if-modified-since")
+        last_modified = validators.get("Last-Modified")
+        if not (ims and last_modified):
+            return None
+        try:
+            fresh = parsedate_to_datetime(last_modified) <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return None
+    return Response(status_code=304, headers=headers) if fresh else None
+
+
+def apply_validators(response: Response, validators: Dict[str, str]) -> None:
+    for name, value in validators.items():
+        response.headers[name] = value
@@ -0,0 +1,313 @@
+# incremental_pricing.py
+# Incremental repricing of daily full supplier feeds.
+#
+# Per supplier we keep a state DB (data/pricing_state/<supplier>.sqlite):
+#
+#   priced(marketplace, sku) -> digest of the mapped raw values, output CSV line
+#   meta(marketplace)        -> key of the pricing parameters the lines were made with
+#
+# A new feed is hashed row by row; only rows whose digest changed (or that are
+# new) are normalized and priced, every other row reuses its stored output
+# line. The output file is identical to run_full_pricing on the same feed.
+# SKUs that disappeared from the feed are reported and dropped from the state.
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from py.pricing_mapping_engine import (
+        DATA_DIR, OUTPUT_COLUMNS, OUTPUT_DIR, PRICING_CHUNK_ROWS, STREAM_CHUNK_BYTES,
+        _ensure_dirs, compile_mapping, open_upload_lines, price_chunk
+    )
+    from py.preview_cache import cache_key
+    from py.upload_store import open_upload
+except ImportError:
+    from pricing_mapping_engine import (
+        DATA_DIR, OUTPUT_COLUMNS, OUTPUT_DIR, PRICING_CHUNK_ROWS, STREAM_CHUNK_BYTES,
+        _ensure_dirs, compile_mapping, open_upload_lines, price_chunk
+    )
+    from preview_cache import cache_key
+    from upload_store import open_upload
+
+STATE_DIR = os.path.join(DATA_DIR, "pricing_state")
+
+# SQLite's default limit on bound parameters is 999
+_LOOKUP_BATCH = 900
+
+# SKUs listed per change type in the returned summary (the report file has all)
+SUMMARY_SKU_LIMIT = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS priced (
+    marketplace TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (marketplace, sku)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    marketplace TEXT PRIMARY KEY,
+    params_key TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+def state_path_for(supplier_code: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", supplier_code.strip()) or "_default"
+    return os.path.join(STATE_DIR, f"{safe}.sqlite")
+
+
+def open_state(supplier_code: str) -> sqlite3.Connection:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(state_path_for(supplier_code))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def row_digest(values: Tuple[str, ...]) -> bytes:
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).digest()
+
+
+class _LineFormatter:
+    """Formats priced rows exactly as write_pricing_csv would write them."""
+
+    def __init__(self) -> None:
+        self._buf = io.StringIO()
+        self._writer = csv.DictWriter(self._buf, fieldnames=OUTPUT_COLUMNS, extrasaction="ignore")
+
+    def header(self) -> str:
+        self._writer.writeheader()
+        return self._take()
+
+    def __call__(self, row: Dict[str, Any]) -> str:
+        self._writer.writerow(row)
+        return self._take()
+
+    def _take(self) -> str:
+        line = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return line
+
+
+def _chunks(reader: Iterator[List[str]], size: int) -> Iterator[List[List[str]]]:
+    chunk: List[List[str]] = []
+    for row in reader:
+        if not row:
+            continue  # blank line, skipped like csv.DictReader
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _lookup(conn: sqlite3.Connection, marketplace: str, skus: List[str]) -> Dict[str, Tuple[bytes, str]]:
+    found: Dict[str, Tuple[bytes, str]] = {}
+    unique = list(dict.fromkeys(s for s in skus if s))
+    for i in range(0, len(unique), _LOOKUP_BATCH):
+        batch = unique[i:i + _LOOKUP_BATCH]
+        marks = ",".join("?" * len(batch))
+        for sku, digest, line in conn.execute(
+            f"SELECT sku, digest, line FROM priced WHERE marketplace = ? AND sku IN ({marks})",
+            [marketplace, *batch]
+        ):
+            found[sku] = (digest, line)
+    return found
+
+
+def run_incremental_pricing(
+    upload_path: str,
+    supplier_code: str,
+    mapping: Dict[str, str],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99"
+) -> Dict[str, Any]:
+    """
+    Price a full feed, repricing only rows that changed since the supplier's
+    previous run for this marketplace.
+
+    Returns a summary with the output path, a per-SKU change report path
+    (supplier_sku,change with change = added|changed|removed), counts, and
+    up to SUMMARY_SKU_LIMIT SKUs per change type. Changing the mapping,
+    margins, fees or rounding reprices every row; the change report is still
+    based on row content only. Rows without a SKU are always repriced.
+    """
+    _ensure_dirs()
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    out_path = os.path.join(OUTPUT_DIR, f"pricing_{marketplace}_{ts}.csv")
+    changes_path = os.path.join(OUTPUT_DIR, f"pricing_{marketplace}_{ts}.changes.csv")
+
+    pricing = dict(
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+    params_key = cache_key(
+        mapping, marketplace, min_margin, max_margin, dropship_fee,
+        fee_table.get(marketplace), rounding_mode, OUTPUT_COLUMNS
+    )
+
+    counts = {"rows": 0, "repriced": 0, "reused": 0, "added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    samples: Dict[str, List[str]] = {"added": [], "changed": [], "removed": []}
+    fmt = _LineFormatter()
+
+    conn = open_state(supplier_code)
+    try:
+        prev = conn.execute("SELECT params_key FROM meta WHERE marketplace = ?", (marketplace,)).fetchone()
+        reuse = prev is not None and prev[0] == params_key
+        # SKUs of this feed in order of first appearance: the digest the
+        # previous run stored and the digest of the SKU's last row in this feed
+        conn.execute("CREATE TEMP TABLE seen (sku TEXT PRIMARY KEY, old_digest BLOB, new_digest BLOB NOT NULL)")
+
+        tmp_out = out_path + ".tmp"
+        with conn, open_upload(upload_path) as f, \
+                open(tmp_out, "w", newline="", encoding="utf-8") as out, \
+                open(changes_path, "w", newline="", encoding="utf-8") as changes_f:
+            changes = csv.writer(changes_f)
+            changes.writerow(["supplier_sku", "change"])
+
+            def note(kind: str, sku: str) -> None:
+                counts[kind] += 1
+                if len(samples[kind]) < SUMMARY_SKU_LIMIT:
+                    samples[kind].append(sku)
+                changes.writerow([sku, kind])
+
+            reader = csv.reader(open_upload_lines(f, chunk_size=STREAM_CHUNK_BYTES))
+            headers = next(reader, [])
+            extractor = compile_mapping(mapping, headers)
+            sku_pos = extractor.fields.index("supplier_sku") if "supplier_sku" in extractor.fields else None
+            out.write(fmt.header())
+
+            for rows in _chunks(reader, PRICING_CHUNK_ROWS):
+                projected = [extractor.project(r) for r in rows]
+                skus = [p[sku_pos].strip() for p in projected] if sku_pos is not None else [""] * len(rows)
+                digests = [row_digest(p) for p in projected]
+                known = _lookup(conn, marketplace, skus)
+                chunk_skus = [s for s in dict.fromkeys(skus) if s]
+                already = set()
+                for i in range(0, len(chunk_skus), _LOOKUP_BATCH):
+                    batch = chunk_skus[i:i + _LOOKUP_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    already.update(s for (s,) in conn.execute(f"SELECT sku FROM seen WHERE sku IN ({marks})", batch))
+
+                lines: List[Optional[str]] = [None] * len(rows)
+                todo: List[int] = []
+                for i, (sku, digest) in enumerate(zip(skus, digests)):
+                    old = known.get(sku) if sku else None
+                    if old is not None and old[0] == digest and reuse:
+                        lines[i] = old[1]
+                    else:
+                        todo.append(i)
+
+                if todo:
+                    priced = price_chunk(extractor.normalize_chunk([rows[i] for i in todo]), **pricing)
+                    for i, row in zip(todo, priced):
+                        lines[i] = fmt(row)
+
+                # A SKU's stored row is its last row in the feed: repriced rows
+                # are written, and so is every repeat of a SKU, in feed order
+                todo_set = set(todo)
+                repeated = set(already)
+                upserts = []
+                for i, sku in enumerate(skus):
+                    if sku and (i in todo_set or sku in repeated):
+                        upserts.append((marketplace, sku, digests[i], lines[i]))
+                    repeated.add(sku)
+                conn.executemany("INSERT OR REPLACE INTO priced VALUES (?, ?, ?, ?)", upserts)
+
+                last_digest = {sku: digest for sku, digest in zip(skus, digests) if sku}
+                conn.executemany(
+                    "INSERT INTO seen VALUES (?, ?, ?)",
+                    [(s, known[s][0] if s in known else None, last_digest[s]) for s in chunk_skus if s not in already]
+                )
+                conn.executemany(
+                    "UPDATE seen SET new_digest = ? WHERE sku = ?",
+                    [(last_digest[s], s) for s in chunk_skus if s in already]
+                )
+
+                out.writelines(lines)  # type: ignore[arg-type]
+                counts["rows"] += len(rows)
+                counts["repriced"] += len(todo)
+                counts["reused"] += len(rows) - len(todo)
+
+            # Classify each SKU once, by its last row (the one stored)
+            for sku, old_digest, new_digest in conn.execute(
+                "SELECT sku, old_digest, new_digest FROM seen ORDER BY rowid"
+            ).fetchall():
+                if old_digest is None:
+                    note("added", sku)
+                elif old_digest != new_digest:
+                    note("changed", sku)
+                else:
+                    counts["unchanged"] += 1
+
+            removed = conn.execute(
+                "SELECT sku FROM priced WHERE marketplace = ? AND sku NOT IN (SELECT sku FROM seen) ORDER BY sku",
+                (marketplace,)
+            )
+            for (sku,) in removed.fetchall():
+                note("removed", sku)
+            conn.execute(
+                "DELETE FROM priced WHERE marketplace = ? AND sku NOT IN (SELECT sku FROM seen)",
+                (marketplace,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?, ?)",
+                (marketplace, params_key, datetime.utcnow().isoformat() + "Z")
+            )
+        os.replace(tmp_out, out_path)
+    except Exception:
+        for path in (out_path + ".tmp", changes_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "out_path": out_path,
+        "changes_path": changes_path,
+        "full_reprice": not reuse,
+        **counts,
+        "added_skus": samples["added"],
+        "changed_skus": samples["changed"],
+        "removed_skus": samples["removed"],
+    }
+
+
+def reset_state(supplier_code: str, marketplace: Optional[str] = None) -> None:
+    """Forget stored prices (all marketplaces when marketplace is None)."""
+    path = state_path_for(supplier_code)
+    if not os.path.exists(path):
+        return
+    conn = open_state(supplier_code)
+    try:
+        with conn:
+            if marketplace is None:
+                conn.execute("DELETE FROM priced")
+                conn.execute("DELETE FROM meta")
+            else:
+                conn.execute("DELETE FROM priced WHERE marketplace = ?", (marketplace,))
+                conn.execute("DELETE FROM meta WHERE marketplace = ?", (marketplace,))
+    finally:
+        conn.close()
@@ -0,0 +1,158 @@
+# kmc_preview.py
+# Precomputed per-channel KMC prices for the /pricing/kmc/preview endpoint.
+#
+# The KMC input feed (kmc_pricing_engine config: csv.input_file) is parsed
+# once into (sku, name, brand, cost, msrp, base_cost) tuples; prices for each
+# configured marketplace are then computed for the whole catalog at the
+# requested margin. Pages are slices of that table.
+#
+#   parsed feed   rebuilt when the feed file or the KMC config changes
+#   price table   rebuilt when the parsed feed or the margin changes
+#
+# Both are checked with a stat() of the two files per request, so a page of a
+# 200k-SKU catalog costs a slice plus building `limit` dicts.
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from py.config_cache import file_stamp
+    from py.kmc_pricing_engine import (
+        CONFIG_PATH, KmcConfig, estimate_shipping, iter_source_rows, load_config
+    )
+    from py.numeric_parse import parse_number
+    from py.pricing_batch import BATCH_AVAILABLE, np, round2
+except ImportError:
+    from config_cache import file_stamp
+    from kmc_pricing_engine import (
+        CONFIG_PATH, KmcConfig, estimate_shipping, iter_source_rows, load_config
+    )
+    from numeric_parse import parse_number
+    from pricing_batch import BATCH_AVAILABLE, np, round2
+
+# (sku, name, brand, cost, msrp, base_cost)
+FeedItem = Tuple[str, str, str, float, Optional[float], float]
+
+
+def _sample_items(cfg: KmcConfig, sample: Sequence[Dict[str, Any]]) -> List[FeedItem]:
+    # Demo rows (sku, product, brand, cost, msrp) used when there is no feed yet
+    shipping = estimate_shipping(0.0, 0.0, 0.0, 0.0, cfg.shipping_rules)
+    fees = cfg.dropship_fee + cfg.handling_fee + cfg.misc_fee
+    items = []
+    for row in sample:
+        cost = float(row["cost"])
+        msrp = float(row.get("msrp") or 0.0) or None
+        items.append((row["sku"], row["product"], row["brand"], cost, msrp, cost + fees + shipping))
+    return items
+
+
+def _feed_items(cfg: KmcConfig) -> List[FeedItem]:
+    return [
+        (r["sku"], r["name"], r["brand"], r["cost"], r["msrp"], r["base_cost"])
+        for r in iter_source_rows(cfg)
+    ]
+
+
+class KmcPriceTable:
+    def __init__(self, sample: Sequence[Dict[str, Any]] = ()):
+        self.sample = list(sample)
+        self._lock = threading.Lock()
+        self._feed_key: Any = None
+        self._items: List[FeedItem] = []
+        self._price_key: Any = None
+        self._channels: List[str] = []
+        # One tuple of rounded channel prices (None = impossible) per item
+        self._prices: List[Tuple[Optional[float], ...]] = []
+        self.feed_builds = 0
+        self.price_builds = 0
+
+    def _refresh(self, cfg: KmcConfig, margin: float) -> Any:
+        feed_stamp = file_stamp(str(cfg.input_file))
+        feed_key = (str(cfg.input_file), feed_stamp, file_stamp(str(CONFIG_PATH)))
+        price_key = (feed_key, margin)
+        if price_key == self._price_key:
+            return price_key
+
+        if feed_key != self._feed_key:
+            self._items = _feed_items(cfg) if feed_stamp else _sample_items(cfg, self.sample)
+            self._feed_key = feed_key
+            self.feed_builds += 1
+
+        channels = []
+        rates = []
+        for mp in cfg.marketplaces:
+            channels.append(str(mp.get("name", "")).strip() or "unknown")
+            rates.append(parse_number(mp.get("fee_percent", 0.0)) or 0.0)
+        # Column at a time: the denominator (kmc_pricing_engine.channel_price)
+        # is the same for every SKU of a channel
+        bases = [item[5] for item in self._items]
+        base_arr = np.asarray(bases, dtype=float) if BATCH_AVAILABLE else None
+        columns = []
+        for rate in rates:
+            denom = 1.0 - rate - margin
+            if denom <= 0:
+                columns.append([None] * len(bases))
+            elif BATCH_AVAILABLE:
+                columns.append(round2(base_arr / denom).tolist())
+            else:
+                columns.append([round(b / denom, 2) for b in bases])
+        prices = list(zip(*columns)) if columns else [()] * len(bases)
+
+        self._channels = channels
+        self._prices = prices
+        self._price_key = price_key
+        self.price_builds += 1
+        return price_key
+
+    def page(self, margin: Optional[float] = None, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """
+        One page of the priced catalog:
+          {"total", "items", "source": "feed"|"sample", "version", "modified_at"}
+        margin defaults to the config's min_gross_margin; version changes
+        whenever the table is rebuilt (use it for ETags).
+        """
+        cfg = load_config()
+        margin = cfg.min_gross_margin if margin is None else float(margin)
+        offset = max(0, int(offset))
+        limit = max(0, int(limit))
+        with self._lock:
+            version = self._refresh(cfg, margin)
+            items = self._items[offset:offset + limit]
+            prices = self._prices[offset:offset + limit]
+            channels = self._channels
+            total = len(self._items)
+
+        page = []
+        for (sku, name, brand, cost, msrp, _), row in zip(items, prices):
+            entry = {
+                "sku": sku,
+                "product": name,
+                "brand": brand,
+                "supplier_code": cfg.supplier_code,
+                "cost": round(cost, 4),
+                "msrp": msrp,
+                "margin_used": margin,
+            }
+            for channel, price in zip(channels, row):
+                entry[f"price_{channel}"] = price
+            page.append(entry)
+
+        feed_stamp = version[0][1]
+        return {
+            "total": total,
+            "items": page,
+            "source": "feed" if feed_stamp else "sample",
+            "version": version,
+            "modified_at": feed_stamp[0] / 1e9 if feed_stamp else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "skus": len(self._items),
+                "channels": list(self._channels),
+                "feed_builds": self.feed_builds,
+                "price_builds": self.price_builds,
+            }
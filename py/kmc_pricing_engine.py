@@ -8,13 +8,23 @@ Generated by Ecom Copilot scaffolding.
 
 from __future__ import annotations
 
+import argparse
 import csv
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional
 from datetime import datetime
 
+try:
+    from py.config_cache import CONFIG_CACHE
+    from py.numeric_parse import parse_number
+    from py.output_writers import OUTPUT_FORMATS, open_output_writer, output_path_for, write_rows_chunked
+except ImportError:
+    from config_cache import CONFIG_CACHE
+    from numeric_parse import parse_number
+    from output_writers import OUTPUT_FORMATS, open_output_writer, output_path_for, write_rows_chunked
+
 ROOT = Path(__file__).resolve().parents[1]
 CONFIG_PATH = ROOT / "config" / "kmc_pricing_config.json"
 
@@ -32,26 +42,24 @@ class KmcConfig:
     input_file: Path
     output_file: Path
     columns: Dict[str, str]
+    output_format: str = "csv"
 
 
 def _to_float(val: Any, default: float = 0.0) -> float:
-    if val is None:
-        return default
-    if isinstance(val, (int, float)):
-        return float(val)
-    s = str(val).strip().replace("$", "").replace(",", "")
-    if not s:
-        return default
-    try:
-        return float(s)
-    except ValueError:
-        return default
+    v = parse_number(val)
+    return default if v is None else v
 
 
 def load_config() -> KmcConfig:
     if not CONFIG_PATH.exists():
         raise FileNotFoundError(f"Config not found: {CONFIG_PATH}")
-    data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    # Re-parsed only when the file's mtime/size changes
+    return CONFIG_CACHE.load(CONFIG_PATH, _parse_config, copy=True)
+
+
+def _parse_config(path: Path) -> KmcConfig:
+    # utf-8-sig: the config files in config/ are saved with a BOM
+    data = json.loads(Path(path).read_text(encoding="utf-8-sig"))
 
     csv_cfg = data.get("csv", {})
     cols = csv_cfg.get("columns", {})
@@ -79,7 +87,9 @@ def load_config() -> KmcConfig:
             "width": cols.get("width", "Width"),
             "height": cols.get("height", "Height"),
             "weight": cols.get("weight", "Weight"),
+            "msrp": cols.get("msrp", "MSRP"),
         },
+        output_format=csv_cfg.get("output_format", "csv"),
     )
 
 
@@ -102,7 +112,53 @@ def estimate_shipping(weight: float, length: float, width: float, height: float,
     return base + per_lb * weight
 
 
-def compute_prices() -> None:
+def iter_source_rows(cfg: KmcConfig) -> Iterator[Dict[str, Any]]:
+    """
+    Parsed rows of the KMC input CSV, with shipping and base cost applied:
+    sku, name, brand, upc, cost, msrp (None if absent), shipping_cost, base_cost.
+    """
+    with cfg.input_file.open("r", encoding="utf-8-sig", newline="") as f_in:
+        reader = csv.DictReader(f_in)
+        col = cfg.columns
+
+        for src in reader:
+            cost = _to_float(src.get(col["cost"]))
+            length = _to_float(src.get(col["length"]))
+            width = _to_float(src.get(col["width"]))
+            height = _to_float(src.get(col["height"]))
+            weight = _to_float(src.get(col["weight"]))
+
+            shipping_cost = estimate_shipping(weight, length, width, height, cfg.shipping_rules)
+
+            yield {
+                "sku": str(src.get(col["sku"], "")).strip(),
+                "name": str(src.get(col["name"], "")).strip(),
+                "brand": str(src.get(col["brand"], "")).strip(),
+                "upc": str(src.get(col["upc"], "")).strip(),
+                "cost": cost,
+                "msrp": parse_number(src.get(col.get("msrp", "MSRP"))),
+                "shipping_cost": shipping_cost,
+                "base_cost": cost + cfg.dropship_fee + cfg.handling_fee + cfg.misc_fee + shipping_cost,
+            }
+
+
+def channel_price(base_cost: float, fee_rate: float, margin: float) -> Optional[float]:
+    """Unrounded base_cost / (1 - fee_rate - margin); None if fee + margin >= 100%."""
+    denom = 1.0 - fee_rate - margin
+    if denom <= 0:
+        return None
+    return base_cost / denom
+
+
+# Column kinds for typed (Parquet/Arrow) output
+OUTPUT_COLUMN_TYPES = {
+    "cost": "float", "dropship_fee": "float", "handling_fee": "float", "misc_fee": "float",
+    "shipping_cost": "float", "base_cost": "float", "marketplace_fee_percent": "float",
+    "margin_target": "float", "price": "float", "fee_amount": "float", "profit": "float", "roi": "float",
+}
+
+
+def compute_prices(output_format: Optional[str] = None) -> None:
     """
     Core logic:
 
@@ -120,8 +176,13 @@ def compute_prices() -> None:
 
     This matches your "total cost includes marketplace fee, then add margin" logic
     without having to iterate.
+
+    output_format (csv, csv.gz, parquet, arrow) overrides csv.output_format
+    from the config; the output file's extension follows the format.
     """
     cfg = load_config()
+    output_format = output_format or cfg.output_format
+    output_file = Path(output_path_for(str(cfg.output_file), output_format))
 
     if not cfg.input_file.exists():
         raise FileNotFoundError(f"Input CSV not found: {cfg.input_file}")
@@ -130,67 +191,51 @@ def compute_prices() -> None:
 
     rows_out: List[Dict[str, Any]] = []
 
-    with cfg.input_file.open("r", encoding="utf-8-sig", newline="") as f_in:
-        reader = csv.DictReader(f_in)
-        col = cfg.columns
-
-        for src in reader:
-            sku = str(src.get(col["sku"], "")).strip()
-            name = str(src.get(col["name"], "")).strip()
-            brand = str(src.get(col["brand"], "")).strip()
-            upc = str(src.get(col["upc"], "")).strip()
-
-            cost = _to_float(src.get(col["cost"]))
-            length = _to_float(src.get(col["length"]))
-            width = _to_float(src.get(col["width"]))
-            height = _to_float(src.get(col["height"]))
-            weight = _to_float(src.get(col["weight"]))
-
-            shipping_cost = estimate_shipping(weight, length, width, height, cfg.shipping_rules)
-
-            base_cost = cost + cfg.dropship_fee + cfg.handling_fee + cfg.misc_fee + shipping_cost
-
-            for mp in cfg.marketplaces:
-                mp_name = str(mp.get("name", "")).strip() or "unknown"
-                fee_rate = _to_float(mp.get("fee_percent", 0.0))
-
-                for margin in (cfg.min_gross_margin, cfg.max_gross_margin):
-                    if margin <= 0:
-                        continue
-
-                    denom = 1.0 - fee_rate - margin
-                    if denom <= 0:
-                        # skip impossible combinations (fee + margin >= 100%)
-                        continue
-
-                    price = base_cost / denom
-
-                    fee_amount = price * fee_rate
-                    profit = price - base_cost - fee_amount
-                    roi = (profit / base_cost) if base_cost > 0 else 0.0
-
-                    rows_out.append(
-                        {
-                            "supplier": cfg.supplier_code,
-                            "sku": sku,
-                            "name": name,
-                            "brand": brand,
-                            "upc": upc,
-                            "cost": round(cost, 4),
-                            "dropship_fee": round(cfg.dropship_fee, 4),
-                            "handling_fee": round(cfg.handling_fee, 4),
-                            "misc_fee": round(cfg.misc_fee, 4),
-                            "shipping_cost": round(shipping_cost, 4),
-                            "base_cost": round(base_cost, 4),
-                            "marketplace": mp_name,
-                            "marketplace_fee_percent": fee_rate,
-                            "margin_target": margin,
-                            "price": round(price, 2),
-                            "fee_amount": round(fee_amount, 4),
-                            "profit": round(profit, 4),
-                            "roi": round(roi, 4),
-                        }
-                    )
+    for item in iter_source_rows(cfg):
+        sku, name, brand, upc = item["sku"], item["name"], item["brand"], item["upc"]
+        cost = item["cost"]
+        shipping_cost = item["shipping_cost"]
+        base_cost = item["base_cost"]
+
+        for mp in cfg.marketplaces:
+            mp_name = str(mp.get("name", "")).strip() or "unknown"
+            fee_rate = _to_float(mp.get("fee_percent", 0.0))
+
+            for margin in (cfg.min_gross_margin, cfg.max_gross_margin):
+                if margin <= 0:
+                    continue
+
+                price = channel_price(base_cost, fee_rate, margin)
+                if price is None:
+                    # skip impossible combinations (fee + margin >= 100%)
+                    continue
+
+                fee_amount = price * fee_rate
+                profit = price - base_cost - fee_amount
+                roi = (profit / base_cost) if base_cost > 0 else 0.0
+
+                rows_out.append(
+                    {
+                        "supplier": cfg.supplier_code,
+                        "sku": sku,
+                        "name": name,
+                        "brand": brand,
+                        "upc": upc,
+                        "cost": round(cost, 4),
+                        "dropship_fee": round(cfg.dropship_fee, 4),
+                        "handling_fee": round(cfg.handling_fee, 4),
+                        "misc_fee": round(cfg.misc_fee, 4),
+                        "shipping_cost": round(shipping_cost, 4),
+                        "base_cost": round(base_cost, 4),
+                        "marketplace": mp_name,
+                        "marketplace_fee_percent": fee_rate,
+                        "margin_target": margin,
+                        "price": round(price, 2),
+                        "fee_amount": round(fee_amount, 4),
+                        "profit": round(profit, 4),
+                        "roi": round(roi, 4),
+                    }
+                )
 
     if not rows_out:
         print("No rows produced. Check config margins and marketplaces.")
@@ -217,16 +262,17 @@ def compute_prices() -> None:
         "roi",
     ]
 
-    with cfg.output_file.open("w", encoding="utf-8", newline="") as f_out:
-        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows_out:
-            writer.writerow(row)
+    with open_output_writer(str(output_file), fieldnames, output_format, OUTPUT_COLUMN_TYPES) as writer:
+        write_rows_chunked(writer, rows_out)
 
-    print(f"Wrote {len(rows_out)} repriced rows to: {cfg.output_file}")
+    print(f"Wrote {len(rows_out)} repriced rows to: {output_file}")
     print("Done.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KMC pricing engine v1")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS,
+                        help="output file format (default: csv.output_format in the config, else csv)")
+    args = parser.parse_args()
     print(f"[{datetime.now().isoformat(timespec='seconds')}] KMC pricing engine v1")
-    compute_prices()
+    compute_prices(args.output_format)
@@ -0,0 +1,139 @@
+# numeric_parse.py
+# Shared number parsing for supplier feeds (cost, MAP, MSRP, qty, dims).
+#
+# Accepts what distributors actually send:
+#   "12.50"  "$1,234.56"  "1.234,56" (European)  "12,5"  "(4.20)"  "4.20-"
+#   "USD 9.99"  "1 234,56"  "1'234.50"  ""
+#
+# Column parsers never raise: they return values plus a validity mask.
+# Parsed strings are memoized, since cost/price columns repeat a lot.
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Memo of raw string -> parsed float (None = invalid). Cleared when it
+# grows past MEMO_MAX_ENTRIES so memory stays bounded on unique-heavy feeds.
+MEMO_MAX_ENTRIES = 1 << 16
+_memo: Dict[str, Optional[float]] = {}
+
+_MISS: Any = object()
+
+# Currency symbols, and whitespace/apostrophes used as thousands separators
+_SYMBOLS_RE = re.compile("[$\u20ac\u00a3\u00a5\u20b9\\s\u00a0\u202f']")
+# ISO currency code before or after the amount ("USD 9.99", "9,99 EUR")
+_CODE_RE = re.compile(r"^[A-Za-z]{3}|[A-Za-z]{3}$")
+_THOUSANDS_COMMA_RE = re.compile(r"^\d{1,3}(,\d{3})+(\.\d*)?$")
+_THOUSANDS_DOT_RE = re.compile(r"^\d{1,3}(\.\d{3})+(,\d*)?$")
+
+
+def _parse_str(s: str) -> Optional[float]:
+    s = s.strip()
+    if not s:
+        return None
+    try:
+        v = float(s)
+    except ValueError:
+        pass
+    else:
+        # float() also accepts "nan", "inf", "-Infinity" and overflows "1e999"
+        return v if math.isfinite(v) else None
+
+    neg = False
+    if s.startswith("(") and s.endswith(")"):
+        neg, s = True, s[1:-1]
+    s = _SYMBOLS_RE.sub("", _CODE_RE.sub("", s.strip()))
+    if s.startswith("-"):
+        neg, s = not neg, s[1:]
+    elif s.endswith("-"):
+        neg, s = not neg, s[:-1]
+    elif s.startswith("+"):
+        s = s[1:]
+    if not s:
+        return None
+
+    if "," in s and "." in s:
+        # Whichever separator comes last is the decimal point
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    elif "," in s:
+        if _THOUSANDS_COMMA_RE.match(s):
+            s = s.replace(",", "")
+        elif s.count(",") == 1:
+            s = s.replace(",", ".")
+        else:
+            return None
+    elif s.count(".") > 1:
+        if not _THOUSANDS_DOT_RE.match(s):
+            return None
+        s = s.replace(".", "")
+
+    try:
+        v = float(s)
+    except ValueError:
+        return None
+    if not math.isfinite(v):
+        return None
+    return -v if neg else v
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Parse one cell to float, or None when blank/invalid/not finite."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        v = float(value)
+        return v if math.isfinite(v) else None
+    s = value if isinstance(value, str) else str(value)
+    try:
+        return _memo[s]
+    except KeyError:
+        pass
+    v = _parse_str(s)
+    if len(_memo) >= MEMO_MAX_ENTRIES:
+        _memo.clear()
+    _memo[s] = v
+    return v
+
+
+def parse_int(value: Any) -> Optional[int]:
+    """Parse one cell to int (truncating, like int(float(s))), or None."""
+    v = parse_number(value)
+    if v is None or not math.isfinite(v):
+        return None
+    return int(v)
+
+
+def parse_float_column(values: Iterable[Any]) -> Tuple[List[Optional[float]], List[bool]]:
+    """
+    Parse a whole column.
+
+    Returns (numbers, valid): numbers[i] is None wherever valid[i] is False.
+    """
+    memo = _memo
+    out: List[Optional[float]] = []
+    append = out.append
+    for value in values:
+        if value.__class__ is str:
+            v = memo.get(value, _MISS)
+            if v is _MISS:
+                v = parse_number(value)
+        else:
+            v = parse_number(value)
+        append(v)
+    return out, [v is not None for v in out]
+
+
+def parse_int_column(values: Iterable[Any]) -> Tuple[List[Optional[int]], List[bool]]:
+    floats, _ = parse_float_column(values)
+    out = [int(v) if v is not None and math.isfinite(v) else None for v in floats]
+    return out, [v is not None for v in out]
+
+
+def memo_clear() -> None:
+    _memo.clear()
+
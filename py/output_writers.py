@@ -0,0 +1,312 @@
+# output_writers.py
+# Pluggable writers for pricing outputs.
+#
+#   csv      plain CSV, formatted a column at a time from row chunks
+#            (byte-identical to csv.DictWriter with the default dialect)
+#   csv.gz   the same CSV, gzip-compressed while streaming
+#   parquet  Parquet, one row group per ROW_GROUP_ROWS rows (needs pyarrow)
+#   arrow    Arrow IPC file, one record batch per ROW_GROUP_ROWS rows (needs pyarrow)
+#
+# Writers take chunks of row dicts (write_rows) and only keep one chunk /
+# row group in memory.
+
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+OUTPUT_FORMATS = ("csv", "csv.gz", "parquet", "arrow")
+DEFAULT_OUTPUT_FORMAT = "csv"
+
+_ALIASES = {"gz": "csv.gz", "gzip": "csv.gz", "csv_gz": "csv.gz", "feather": "arrow", "ipc": "arrow"}
+
+EXTENSIONS = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet", "arrow": ".arrow"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_ROWS = 64 * 1024
+
+_CSV_SPECIALS = (",", '"', "\r", "\n")
+
+
+def normalize_format(output_format: Optional[str]) -> str:
+    fmt = (output_format or DEFAULT_OUTPUT_FORMAT).strip().lower().lstrip(".")
+    fmt = _ALIASES.get(fmt, fmt)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r} (expected one of {', '.join(OUTPUT_FORMATS)})")
+    return fmt
+
+
+def format_of_path(path: str) -> str:
+    for fmt in ("csv.gz", "parquet", "arrow", "csv"):
+        if path.endswith(EXTENSIONS[fmt]):
+            return fmt
+    return DEFAULT_OUTPUT_FORMAT
+
+
+def strip_output_extension(path: str) -> str:
+    fmt = format_of_path(path)
+    ext = EXTENSIONS[fmt]
+    return path[: -len(ext)] if path.endswith(ext) else path
+
+
+def output_path_for(path: str, output_format: Optional[str]) -> str:
+    """path with its output extension replaced to match output_format."""
+    return strip_output_extension(path) + EXTENSIONS[normalize_format(output_format)]
+
+
+def _csv_field(value: str) -> str:
+    if any(c in value for c in _CSV_SPECIALS):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def format_csv_column(values: Sequence[Any]) -> List[str]:
+    """Format one column the way csv.writer (QUOTE_MINIMAL) formats fields."""
+    out = ["" if v is None else (v if v.__class__ is str else str(v)) for v in values]
+    # One containment scan for the whole column; quote per field only if needed
+    joined = "".join(out)
+    if any(c in joined for c in _CSV_SPECIALS):
+        out = [_csv_field(v) for v in out]
+    return out
+
+
+def format_csv_chunk(columns: Sequence[Sequence[Any]]) -> str:
+    """CSV text (\\r\\n line endings) for column-major data."""
+    cols = [format_csv_column(c) for c in columns]
+    if not cols or not cols[0]:
+        return ""
+    if len(cols) == 1:
+        # csv.writer quotes a lone empty field so the row isn't blank
+        return "".join((v or '""') + "\r\n" for v in cols[0])
+    return "\r\n".join(map(",".join, zip(*cols))) + "\r\n"
+
+
+class OutputWriter:
+    """Base writer: context manager, chunked write_rows, rows_written counter."""
+
+    output_format = DEFAULT_OUTPUT_FORMAT
+
+    def __init__(self, path: str, fieldnames: Sequence[str], types: Optional[Mapping[str, str]] = None):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        # Column kinds ("str", "float", "int"); only the columnar formats use them
+        self.types = {f: (types or {}).get(f, "str") for f in self.fieldnames}
+        self.rows_written = 0
+
+    def columns_of(self, rows: Sequence[Mapping[str, Any]]) -> List[List[Any]]:
+        return [[r.get(f) for r in rows] for f in self.fieldnames]
+
+    def write_rows(self, rows: Sequence[Mapping[str, Any]]) -> None:
+        if rows:
+            self.write_columns(self.columns_of(rows))
+
+    def write_columns(self, columns: Sequence[Sequence[Any]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class CsvWriter(OutputWriter):
+    output_format = "csv"
+
+    def __init__(self, path: str, fieldnames: Sequence[str], types: Optional[Mapping[str, str]] = None,
+                 header: bool = True, append: bool = False):
+        super().__init__(path, fieldnames, types)
+        self._mode = "ab" if append else "wb"
+        self._f = self._open()
+        if header:
+            self._f.write(format_csv_chunk([[f] for f in self.fieldnames]).encode("utf-8"))
+
+    def _open(self) -> BinaryIO:
+        return open(self.path, self._mode)
+
+    def write_columns(self, columns: Sequence[Sequence[Any]]) -> None:
+        text = format_csv_chunk(columns)
+        if text:
+            self._f.write(text.encode("utf-8"))
+            self.rows_written += len(columns[0])
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+
+class GzipCsvWriter(CsvWriter):
+    output_format = "csv.gz"
+
+    # Fixed header mtime so identical data gives identical files
+    def _open(self) -> BinaryIO:
+        # Appending adds a new gzip member; readers see one continuous stream
+        self._raw = open(self.path, self._mode)
+        return gzip.GzipFile(filename="", mode="wb", fileobj=self._raw, compresslevel=6, mtime=0)  # type: ignore[return-value]
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+            self._raw.close()
+
+
+def _require_pyarrow() -> Any:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Parquet/Arrow output needs pyarrow (pip install pyarrow)") from None
+    return pa
+
+
+def _coerce(values: Sequence[Any], kind: str) -> List[Any]:
+    if kind == "str":
+        return [None if v is None else (v if v.__class__ is str else str(v)) for v in values]
+    conv = float if kind == "float" else int
+    out: List[Any] = []
+    for v in values:
+        if v is None or v == "":
+            out.append(None)
+            continue
+        try:
+            out.append(conv(v))
+        except (TypeError, ValueError):
+            out.append(None)
+    return out
+
+
+class _ColumnarWriter(OutputWriter):
+    """Buffers columns up to ROW_GROUP_ROWS rows, then flushes a row group."""
+
+    def __init__(self, path: str, fieldnames: Sequence[str], types: Optional[Mapping[str, str]] = None,
+                 row_group_rows: int = ROW_GROUP_ROWS):
+        super().__init__(path, fieldnames, types)
+        pa = self._pa = _require_pyarrow()
+        pa_types = {"str": pa.string(), "float": pa.float64(), "int": pa.int64()}
+        self.schema = pa.schema([(f, pa_types.get(self.types[f], pa.string())) for f in self.fieldnames])
+        self.row_group_rows = max(1, int(row_group_rows))
+        self._buf: List[List[Any]] = [[] for _ in self.fieldnames]
+        self._buffered = 0
+        self._sink = self._open_sink()
+
+    def _open_sink(self) -> Any:
+        raise NotImplementedError
+
+    def _write_batch(self, batch: Any) -> None:
+        raise NotImplementedError
+
+    def write_columns(self, columns: Sequence[Sequence[Any]]) -> None:
+        for buf, col in zip(self._buf, columns):
+            buf.extend(col)
+        n = len(columns[0]) if columns else 0
+        self._buffered += n
+        self.rows_written += n
+        while self._buffered >= self.row_group_rows:
+            self._flush(self.row_group_rows)
+
+    def _flush(self, n: int) -> None:
+        pa = self._pa
+        arrays = [
+            pa.array(_coerce(buf[:n], self.types[f]), type=self.schema.field(f).type)
+            for f, buf in zip(self.fieldnames, self._buf)
+        ]
+        self._write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        for buf in self._buf:
+            del buf[:n]
+        self._buffered -= n
+
+    def close(self) -> None:
+        if self._sink is None:
+            return
+        if self._buffered:
+            self._flush(self._buffered)
+        self._sink.close()
+        self._sink = None
+
+
+class ParquetWriter(_ColumnarWriter):
+    output_format = "parquet"
+
+    def _open_sink(self) -> Any:
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.schema, compression="zstd")
+
+    def _write_batch(self, batch: Any) -> None:
+        self._sink.write_table(self._pa.Table.from_batches([batch]), row_group_size=self.row_group_rows)
+
+
+class ArrowWriter(_ColumnarWriter):
+    output_format = "arrow"
+
+    def _open_sink(self) -> Any:
+        return self._pa.ipc.new_file(self.path, self.schema)
+
+    def _write_batch(self, batch: Any) -> None:
+        self._sink.write_batch(batch)
+
+
+_WRITERS = {"csv": CsvWriter, "csv.gz": GzipCsvWriter, "parquet": ParquetWriter, "arrow": ArrowWriter}
+
+
+def open_output_writer(
+    path: str,
+    fieldnames: Sequence[str],
+    output_format: Optional[str] = None,
+    types: Optional[Mapping[str, str]] = None
+) -> OutputWriter:
+    """Writer for output_format (default: from the path's extension)."""
+    fmt = normalize_format(output_format) if output_format else format_of_path(path)
+    return _WRITERS[fmt](path, fieldnames, types)
+
+
+def write_rows_chunked(writer: OutputWriter, rows: Iterable[Mapping[str, Any]], chunk_rows: int = 8192) -> int:
+    """Feed a row iterator to a writer in chunks; returns rows written."""
+    chunk: List[Mapping[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            writer.write_rows(chunk)
+            chunk = []
+    if chunk:
+        writer.write_rows(chunk)
+    return writer.rows_written
+
+
+def iter_csv_bytes(
+    row_chunks: Iterable[Sequence[Mapping[str, Any]]],
+    fieldnames: Sequence[str],
+    compress: bool = False
+) -> Iterator[bytes]:
+    """
+    Encode chunks of row dicts as CSV bytes (same bytes as CsvWriter), one
+    piece per chunk, for streaming responses. compress=True yields a gzip
+    stream instead, sync-flushed after every chunk so the client can
+    decompress each piece as it arrives.
+    """
+    fields = list(fieldnames)
+    co = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(text: str, last: bool = False) -> bytes:
+        data = text.encode("utf-8")
+        if co is None:
+            return data
+        return co.compress(data) + co.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    yield emit(format_csv_chunk([[f] for f in fields]))
+    for rows in row_chunks:
+        if rows:
+            piece = emit(format_csv_chunk([[r.get(f) for r in rows] for f in fields]))
+            if piece:
+                yield piece
+    if co is not None:
+        yield emit("", last=True)
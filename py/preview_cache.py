@@ -0,0 +1,99 @@
+# preview_cache.py
+# In-process LRU cache with a byte budget, used by the pricing preview
+# endpoints so slider/rounding changes don't re-read and re-price uploads.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable hash of JSON-able parts (dict key order does not matter)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def approx_size(value: Any) -> int:
+    """Rough deep size in bytes of lists/tuples/dicts of scalars."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += approx_size(k) + approx_size(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            size += approx_size(v)
+    return size
+
+
+def approx_rows_size(rows: Any, sample: int = 64) -> int:
+    """approx_size of a list of similar rows, extrapolated from a sample (O(sample))."""
+    n = len(rows)
+    if n <= sample:
+        return approx_size(rows)
+    step = n // sample
+    sampled = sum(approx_size(rows[i]) for i in range(0, step * sample, step))
+    return sys.getsizeof(rows) + sampled * n // sample
+
+
+class ByteLRUCache:
+    """
+    Least-recently-used cache bounded by total (approximate) value size.
+
+    Thread-safe; FastAPI runs sync endpoints in a thread pool.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, int(max_bytes))
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        size = approx_size(value) if size is None else int(size)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                # Too big to ever fit; don't flush everything else for it
+                return
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
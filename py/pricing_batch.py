@@ -0,0 +1,143 @@
+# pricing_batch.py
+# Column-at-a-time version of pricing_mapping_engine.compute_prices.
+#
+# Inputs are arrays (one element per row); missing values are NaN.
+# Results match the scalar path exactly, including Python's round() and the
+# string-based "ends_in_99" rounding, so the two can be mixed freely.
+#
+# numpy is optional: callers check BATCH_AVAILABLE and fall back to the
+# scalar path when it is not installed.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+    BATCH_AVAILABLE = True
+except ImportError:  # pragma: no cover - numpy is an optional speedup
+    np = None  # type: ignore[assignment]
+    BATCH_AVAILABLE = False
+
+try:
+    from py.fee_schedule import fees_for, price_for_margin_batch
+except ImportError:
+    from fee_schedule import fees_for, price_for_margin_batch
+
+# Warning flags (bitmask per row), in the order compute_prices reports them
+WARN_MAP_MIN = 1
+WARN_MAP_MAX = 2
+WARN_MAX_LT_MIN = 4
+WARN_FEE_APPROX = 8
+
+_WARNING_TEXT = (
+    (WARN_FEE_APPROX, "No exact price for fee schedule (approximated)"),
+    (WARN_MAP_MIN, "MAP clamp applied to min_price"),
+    (WARN_MAP_MAX, "MAP clamp applied to max_price"),
+    (WARN_MAX_LT_MIN, "max_price < min_price (adjusted)"),
+)
+
+# Above this magnitude round(x, 2) cannot be reproduced via x * 100
+_ROUND2_EXACT_LIMIT = 1e13
+
+ArrayLike = Union[Sequence[float], "np.ndarray", float]
+
+
+@dataclass
+class PriceBatch:
+    priced: "np.ndarray"           # bool: False where supplier_cost is missing
+    dropship_fee: "np.ndarray"
+    shipping_estimate: "np.ndarray"
+    base_total_cost: "np.ndarray"
+    min_price: "np.ndarray"
+    max_price: "np.ndarray"
+    flags: "np.ndarray"            # int: WARN_* bitmask
+
+    def warning_lists(self) -> List[List[str]]:
+        out: List[List[str]] = []
+        for f in self.flags.tolist():
+            out.append([text for bit, text in _WARNING_TEXT if f & bit] if f else [])
+        return out
+
+
+def warning_text(flags: int) -> str:
+    return "; ".join(text for bit, text in _WARNING_TEXT if flags & bit)
+
+
+def round2(x: "np.ndarray") -> "np.ndarray":
+    """Elementwise round(x, 2) with Python's exact (correctly rounded) semantics."""
+    x = np.asarray(x, dtype=np.float64)
+    scaled = x * 100.0
+    out = np.round(scaled) / 100.0
+    # np.round works on x*100, which can land on (or near) a .5 tie that the
+    # exact decimal value of x does not have; defer those to Python.
+    frac = np.abs(scaled - np.trunc(scaled))
+    suspect = (np.abs(frac - 0.5) < 1e-6) | ~(np.abs(x) < _ROUND2_EXACT_LIMIT)
+    if suspect.any():
+        idx = np.flatnonzero(suspect)
+        out[idx] = [round(float(v), 2) for v in x[idx]]
+    return out
+
+
+def apply_rounding(price: "np.ndarray", rounding_mode: str) -> "np.ndarray":
+    if rounding_mode == "ends_in_99":
+        # Same as float(f"{whole}.99") with whole = int(price) (truncation)
+        whole = np.trunc(price)
+        n = np.where(price <= whole + 0.99, whole, whole + 1.0)
+        return np.where(n >= 0, (n * 100.0 + 99.0) / 100.0, (n * 100.0 - 99.0) / 100.0)
+    return round2(price)
+
+
+def compute_prices_batch(
+    cost: ArrayLike,
+    map_price: ArrayLike,
+    dropship_fee: ArrayLike,
+    shipping_estimate: ArrayLike,
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99",
+    category: Optional[Sequence[Any]] = None
+) -> PriceBatch:
+    cost = np.asarray(cost, dtype=np.float64)
+    n = cost.shape[0]
+    map_price = np.broadcast_to(np.asarray(map_price, dtype=np.float64), (n,))
+    dropship = np.broadcast_to(np.asarray(dropship_fee, dtype=np.float64), (n,))
+    shipping = np.broadcast_to(np.asarray(shipping_estimate, dtype=np.float64), (n,))
+
+    priced = ~np.isnan(cost)
+    total_cost = cost + dropship + shipping
+
+    # Fee-inclusive prices from the compiled schedule (per-category overrides)
+    fees = fees_for(fee_table, marketplace)
+    min_price, min_ok = price_for_margin_batch(fees, total_cost, min_margin, category)
+    max_price, max_ok = price_for_margin_batch(fees, total_cost, max_margin, category)
+
+    flags = np.zeros(n, dtype=np.int64)
+    flags[~(min_ok & max_ok)] |= WARN_FEE_APPROX
+    has_map = map_price > 0  # False for NaN
+    clamp = has_map & (min_price < map_price)
+    flags[clamp] |= WARN_MAP_MIN
+    min_price = np.where(clamp, map_price, min_price)
+    clamp = has_map & (max_price < map_price)
+    flags[clamp] |= WARN_MAP_MAX
+    max_price = np.where(clamp, map_price, max_price)
+
+    min_price = apply_rounding(min_price, rounding_mode)
+    max_price = apply_rounding(max_price, rounding_mode)
+    adjust = max_price < min_price
+    flags[adjust] |= WARN_MAX_LT_MIN
+    max_price = np.where(adjust, min_price, max_price)
+
+    flags[~priced] = 0
+    return PriceBatch(
+        priced=priced,
+        dropship_fee=round2(dropship),
+        shipping_estimate=round2(shipping),
+        base_total_cost=round2(total_cost),
+        min_price=min_price,
+        max_price=max_price,
+        flags=flags,
+    )
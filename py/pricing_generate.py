@@ -1,18 +1,13 @@
 import csv, json, os, sys, argparse
 from datetime import datetime
 
+try:
+    from py.numeric_parse import parse_number
+except ImportError:
+    from numeric_parse import parse_number
+
 def to_float(v):
-    if v is None:
-        return None
-    s = str(v).strip()
-    if s == "":
-        return None
-    # Remove currency symbols and commas
-    s = s.replace("$","").replace(",","")
-    try:
-        return float(s)
-    except:
-        return None
+    return parse_number(v)
 
 def load_config(path):
     with open(path, "r", encoding="utf-8") as f:
@@ -0,0 +1,255 @@
+# pricing_jobs.py
+# Background jobs for long pricing runs.
+#
+# submit() returns a job id immediately and runs the work in a small thread
+# pool. The work function receives a progress callback (the run_full_pricing
+# `progress` hook); the job records rows and bytes done from it, derives
+# rows/s and an ETA, and raises PricingCancelled from it once the job is
+# cancelled.
+#
+#   data/jobs/<job_id>.json   job metadata, written on every state change
+#
+# Jobs that were queued or running when the API stopped are marked failed
+# ("interrupted") on the next start; checkpointed runs resume when the same
+# run is submitted again.
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from py.pricing_mapping_engine import DATA_DIR, PricingCancelled
+except ImportError:
+    from pricing_mapping_engine import DATA_DIR, PricingCancelled
+
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+# Concurrent pricing jobs; each run is itself streaming and single-threaded
+DEFAULT_JOB_WORKERS = max(1, int(os.environ.get("ECOM_PRICING_JOB_WORKERS", "2") or 2))
+
+# Finished jobs kept on disk (oldest are dropped first)
+MAX_FINISHED_JOBS = 200
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+PROGRESS_EVENT_FIELDS = (
+    "job_id", "state", "rows", "rows_priced", "warnings", "bytes_done", "total_bytes",
+    "progress", "rows_per_sec", "elapsed_seconds", "eta_seconds",
+)
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _downloads(result: Any) -> List[Dict[str, Any]]:
+    # [{"marketplace", "out_id", "download_url"}] for a single run's result
+    # ({"out_id", "download_url"}) or a multi-marketplace one ({"outputs": [...]})
+    if not isinstance(result, dict):
+        return []
+    outputs = result.get("outputs") if "outputs" in result else [result]
+    return [
+        {"marketplace": o.get("marketplace"), "out_id": o.get("out_id"), "download_url": o["download_url"]}
+        for o in outputs or [] if isinstance(o, dict) and o.get("download_url")
+    ]
+
+
+class JobManager:
+    """Thread-pool job runner with per-job JSON metadata that survives restarts."""
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = DEFAULT_JOB_WORKERS):
+        self.jobs_dir = jobs_dir
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="pricing-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._futures: Dict[str, Future] = {}
+        self._started: Dict[str, float] = {}   # monotonic start time of running jobs
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._load()
+
+    # --- persistence --------------------------------------------------------
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{os.path.basename(job_id)}.json")
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        path = self._path(job["job_id"])
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def _load(self) -> None:
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(job, dict) or not job.get("job_id"):
+                continue
+            if job.get("state") not in FINISHED_STATES:
+                job["state"] = "failed"
+                job["error"] = "Interrupted by an API restart; submit the run again to resume it"
+                job["finished_at"] = _now_iso()
+                self._save(job)
+            self._jobs[job["job_id"]] = job
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (j for j in self._jobs.values() if j["state"] in FINISHED_STATES),
+            key=lambda j: j.get("created_at") or ""
+        )
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self._jobs.pop(job["job_id"], None)
+            try:
+                os.remove(self._path(job["job_id"]))
+            except OSError:
+                pass
+
+    # --- running ------------------------------------------------------------
+
+    def submit(self, kind: str, params: Dict[str, Any], fn: Callable[[ProgressCallback], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Queue fn(progress) and return the job status. fn returns the result
+        dict ({"ok": False, "error": ...} marks the job failed).
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "params": params,
+            "state": "queued",
+            "created_at": _now_iso(),
+            "started_at": None,
+            "finished_at": None,
+            "rows": 0,
+            "rows_priced": 0,
+            "warnings": 0,
+            "bytes_done": 0,
+            "total_bytes": None,
+            "elapsed_seconds": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+            self._save(job)
+            self._prune()
+            self._futures[job_id] = self._pool.submit(self._run, job_id, fn)
+        return self.status(job_id)  # type: ignore[return-value]
+
+    def _run(self, job_id: str, fn: Callable[[ProgressCallback], Dict[str, Any]]) -> None:
+        cancel = self._cancel[job_id]
+        with self._lock:
+            job = self._jobs[job_id]
+            if cancel.is_set():
+                # Cancelled between being picked up and starting
+                job["state"] = "cancelled"
+                job["finished_at"] = _now_iso()
+                self._futures.pop(job_id, None)
+                self._cancel.pop(job_id, None)
+                self._save(job)
+                return
+            job["state"] = "running"
+            job["started_at"] = _now_iso()
+            self._started[job_id] = time.monotonic()
+            self._save(job)
+
+        def progress(p: Dict[str, Any]) -> None:
+            # Called once per priced chunk: plain assignments only, status()
+            # and the event stream sample them without the lock
+            job.update(p)
+            if cancel.is_set():
+                raise PricingCancelled()
+
+        state, result, error = "succeeded", None, None
+        try:
+            result = fn(progress)
+            if isinstance(result, dict) and result.get("ok") is False:
+                state, error = "failed", result.get("error") or "Pricing failed"
+        except PricingCancelled:
+            state = "cancelled"
+        except Exception as e:  # surfaced through the job status
+            state, error = "failed", f"{type(e).__name__}: {e}"
+
+        with self._lock:
+            job["state"] = "cancelled" if cancel.is_set() and state != "succeeded" else state
+            job["result"] = result
+            job["error"] = error
+            job["finished_at"] = _now_iso()
+            job["elapsed_seconds"] = round(time.monotonic() - self._started.pop(job_id, time.monotonic()), 3)
+            self._futures.pop(job_id, None)
+            self._cancel.pop(job_id, None)
+            self._save(job)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; returns its status (None if unknown)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            event = self._cancel.get(job_id)
+            if event is not None:
+                event.set()
+                future = self._futures.get(job_id)
+                if job["state"] == "queued" and future is not None and future.cancel():
+                    job["state"] = "cancelled"
+                    job["finished_at"] = _now_iso()
+                    self._futures.pop(job_id, None)
+                    self._cancel.pop(job_id, None)
+                    self._save(job)
+        return self.status(job_id)
+
+    # --- status -------------------------------------------------------------
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        out = dict(job)
+        rows, done, total = job.get("rows", 0), job.get("bytes_done", 0), job.get("total_bytes")
+        if job["state"] == "running":
+            started = self._started.get(job_id)
+            elapsed = time.monotonic() - started if started is not None else 0.0
+        else:
+            elapsed = job.get("elapsed_seconds") or 0.0
+        out["elapsed_seconds"] = round(elapsed, 3)
+        out["rows_per_sec"] = round(rows / elapsed, 1) if elapsed > 0 and rows else 0.0
+        out["progress"] = round(done / total, 4) if total else (1.0 if job["state"] == "succeeded" else 0.0)
+        if job["state"] == "running" and done and total:
+            # Input bytes are a steadier measure of what's left than rows
+            out["eta_seconds"] = round(elapsed * (total - done) / done, 1)
+        else:
+            out["eta_seconds"] = 0.0 if job["state"] == "succeeded" else None
+        downloads = _downloads(job.get("result")) if job["state"] == "succeeded" else []
+        out["downloads"] = downloads
+        # The single output's link; multi-marketplace runs list theirs in downloads
+        out["download_url"] = downloads[0]["download_url"] if len(downloads) == 1 else None
+        return out
+
+    def progress_event(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Compact status for progress streams (no params or result)."""
+        status = self.status(job_id)
+        if status is None:
+            return None
+        return {k: status.get(k) for k in PROGRESS_EVENT_FIELDS}
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = sorted(self._jobs, key=lambda j: self._jobs[j].get("created_at") or "", reverse=True)
+        return [s for s in (self.status(j) for j in ids[: max(0, int(limit))]) if s is not None]
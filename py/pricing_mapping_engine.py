@@ -9,14 +9,41 @@
 
 from __future__ import annotations
 
+import codecs
 import csv
 import io
 import json
 import os
-import uuid
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import islice
+from operator import itemgetter
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from py.numeric_parse import parse_float_column, parse_int, parse_int_column, parse_number
+    from py.pricing_batch import BATCH_AVAILABLE, compute_prices_batch
+    from py.fee_schedule import compile_marketplace_fees, fees_for
+    from py.output_writers import (
+        CsvWriter, GzipCsvWriter, normalize_format, open_output_writer, output_path_for, write_rows_chunked
+    )
+    from py.config_cache import CONFIG_CACHE, read_json
+    from py.preview_cache import cache_key
+    from py.upload_store import open_upload, put_bytes, upload_size
+except ImportError:
+    from numeric_parse import parse_float_column, parse_int, parse_int_column, parse_number
+    from pricing_batch import BATCH_AVAILABLE, compute_prices_batch
+    from fee_schedule import compile_marketplace_fees, fees_for
+    from output_writers import (
+        CsvWriter, GzipCsvWriter, normalize_format, open_output_writer, output_path_for, write_rows_chunked
+    )
+    from config_cache import CONFIG_CACHE, read_json
+    from preview_cache import cache_key
+    from upload_store import open_upload, put_bytes, upload_size
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_DIR = os.path.join(ROOT, "data")
@@ -24,9 +51,13 @@ UPLOADS_DIR = os.path.join(DATA_DIR, "uploads")
 MAPPINGS_DIR = os.path.join(DATA_DIR, "mappings")
 CONFIG_DIR = os.path.join(ROOT, "config")
 OUTPUT_DIR = os.path.join(ROOT, "output", "pricing")
+CHECKPOINT_DIR = os.path.join(OUTPUT_DIR, ".checkpoints")
+
+# Rows priced per batch-kernel call
+PRICING_CHUNK_ROWS = 8192
 
 REQUIRED_FIELDS = ["supplier_sku", "supplier_cost", "qty_available"]
-OPTIONAL_FIELDS = ["upc", "title", "brand", "map_price", "msrp", "weight_oz", "length_in", "width_in", "height_in"]
+OPTIONAL_FIELDS = ["upc", "title", "brand", "map_price", "msrp", "weight_oz", "length_in", "width_in", "height_in", "category"]
 
 def _ensure_dirs() -> None:
     os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -41,79 +72,140 @@ def _read_json(path: str, default: Any) -> Any:
         return default
 
 def _safe_float(v: Any) -> Optional[float]:
-    if v is None:
-        return None
-    s = str(v).strip()
-    if s == "":
-        return None
-    # Remove currency symbols/commas
-    s = s.replace("$", "").replace(",", "")
-    try:
-        return float(s)
-    except Exception:
-        return None
+    return parse_number(v)
 
 def _safe_int(v: Any) -> Optional[int]:
-    if v is None:
-        return None
-    s = str(v).strip()
-    if s == "":
-        return None
-    try:
-        return int(float(s))
-    except Exception:
-        return None
+    return parse_int(v)
 
-def decode_bytes_guess(data: bytes) -> str:
-    # Try UTF-8 with BOM first, then plain UTF-8, then latin-1 fallback
-    for enc in ("utf-8-sig", "utf-8", "cp1252", "latin-1"):
+# Codec candidates, most specific first. latin-1 never fails, so it ends the chain.
+ENCODING_CANDIDATES = ("utf-8-sig", "cp1252", "latin-1")
+
+# Bytes inspected when sniffing an upload's encoding
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+def sniff_encoding(prefix: bytes) -> str:
+    # final=False so a multi-byte sequence cut off at the end of the prefix
+    # does not disprove UTF-8.
+    for enc in ENCODING_CANDIDATES:
         try:
-            return data.decode(enc)
-        except Exception:
+            codecs.getincrementaldecoder(enc)().decode(prefix, final=False)
+            return enc
+        except UnicodeDecodeError:
             pass
-    # last resort
-    return data.decode("latin-1", errors="replace")
+    return "latin-1"
+
+def iter_decoded_text(
+    f: BinaryIO,
+    encoding: str,
+    chunk_size: int = 1 << 20,
+    on_switch: Optional[Callable[[str], None]] = None
+) -> Iterator[str]:
+    """
+    Incrementally decode a binary stream.
+
+    If a later chunk disproves the sniffed codec, decoding continues from that
+    chunk with the next candidate in ENCODING_CANDIDATES; text already yielded
+    is kept as-is. on_switch, if given, is called with each new codec name.
+    """
+    chain = list(ENCODING_CANDIDATES)
+    chain = chain[chain.index(encoding):] if encoding in chain else [encoding] + chain[1:]
+    pos = 0
+    decoder = codecs.getincrementaldecoder(chain[pos])()
+
+    def decode(data: bytes, final: bool) -> str:
+        nonlocal pos, decoder
+        while True:
+            try:
+                return decoder.decode(data, final=final)
+            except UnicodeDecodeError:
+                # Bytes buffered from the previous chunk belong to this one
+                data = decoder.getstate()[0] + data
+                pos += 1
+                decoder = codecs.getincrementaldecoder(chain[pos])()
+                if on_switch is not None:
+                    on_switch(chain[pos])
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        text = decode(chunk, False)
+        if text:
+            yield text
+    tail = decode(b"", True)
+    if tail:
+        yield tail
+
+def iter_text_lines(chunks: Iterable[str]) -> Iterator[str]:
+    # Split on \r\n, \r and \n only (what csv expects with newline=""),
+    # keeping line endings. A trailing \r is held back in case the next chunk
+    # starts with \n.
+    pending = ""
+    for chunk in chunks:
+        lines = io.StringIO(pending + chunk, newline="").readlines()
+        pending = ""
+        if lines and not lines[-1].endswith("\n"):
+            pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
 
-def save_upload_bytes(csv_bytes: bytes) -> Tuple[str, str]:
+def decode_bytes_guess(data: bytes) -> str:
+    enc = sniff_encoding(data[:ENCODING_SNIFF_BYTES])
+    return "".join(iter_decoded_text(io.BytesIO(data), enc))
+
+def open_upload_lines(f: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Sniff the encoding from a bounded prefix, then stream decoded lines."""
+    start = f.tell()
+    enc = sniff_encoding(f.read(ENCODING_SNIFF_BYTES))
+    f.seek(start)
+    return iter_text_lines(iter_decoded_text(f, enc, chunk_size))
+
+def save_upload_bytes(csv_bytes: bytes, filename: str = "") -> Tuple[str, str]:
+    # Content-addressed and compressed (see upload_store.py); identical bytes
+    # share one blob. Returns (upload_id, blob path); open it with open_upload.
     _ensure_dirs()
-    upload_id = str(uuid.uuid4())
-    path = os.path.join(UPLOADS_DIR, f"{upload_id}.csv")
-    with open(path, "wb") as f:
-        f.write(csv_bytes)
-    return upload_id, path
+    return put_bytes(csv_bytes, filename)
 
 def preview_upload(upload_path: str, max_rows: int = 25) -> Tuple[List[str], List[Dict[str, str]]]:
-    with open(upload_path, "rb") as f:
-        text = decode_bytes_guess(f.read())
-
-    # Use csv.DictReader so headers are preserved
-    buf = io.StringIO(text)
-    reader = csv.DictReader(buf)
-    headers = reader.fieldnames or []
-    rows: List[Dict[str, str]] = []
-    for i, r in enumerate(reader):
-        if i >= max_rows:
-            break
-        # normalize None -> ""
-        rows.append({k: ("" if r.get(k) is None else str(r.get(k))) for k in headers})
+    # Only the bytes needed for max_rows are read and decoded
+    with open_upload(upload_path) as f:
+        # Use csv.DictReader so headers are preserved
+        reader = csv.DictReader(open_upload_lines(f, chunk_size=ENCODING_SNIFF_BYTES))
+        headers = reader.fieldnames or []
+        rows: List[Dict[str, str]] = []
+        if max_rows > 0:
+            for r in reader:
+                # normalize None -> ""
+                rows.append({k: ("" if r.get(k) is None else str(r.get(k))) for k in headers})
+                if len(rows) >= max_rows:
+                    break
     return headers, rows
 
+def _parse_mapping(path: str) -> Optional[Dict[str, Any]]:
+    return read_json(path, None)
+
+def _write_mapping(path: str, payload: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+def mapping_path_for(supplier_code: str) -> str:
+    return os.path.join(MAPPINGS_DIR, f"{supplier_code}.json")
+
 def load_mapping(supplier_code: str) -> Optional[Dict[str, str]]:
-    path = os.path.join(MAPPINGS_DIR, f"{supplier_code}.json")
-    if not os.path.exists(path):
-        return None
-    return _read_json(path, None)
+    path = mapping_path_for(supplier_code)
+    # supplier_code comes from requests; a missing file is not cached
+    return CONFIG_CACHE.load(path, _parse_mapping, copy=True)
 
 def save_mapping(supplier_code: str, mapping: Dict[str, str]) -> str:
     _ensure_dirs()
-    path = os.path.join(MAPPINGS_DIR, f"{supplier_code}.json")
+    path = mapping_path_for(supplier_code)
     payload = {
         "supplier_code": supplier_code,
         "saved_at_utc": datetime.utcnow().isoformat() + "Z",
         "mapping": mapping
     }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+    CONFIG_CACHE.write_through(path, payload, _write_mapping, _parse_mapping)
     return path
 
 def _normalize_row(row: Dict[str, str], mapping: Dict[str, str]) -> Tuple[Dict[str, Any], List[str]]:
@@ -149,17 +241,135 @@ def _normalize_row(row: Dict[str, str], mapping: Dict[str, str]) -> Tuple[Dict[s
         "length_in": _safe_float(pick("length_in")),
         "width_in": _safe_float(pick("width_in")),
         "height_in": _safe_float(pick("height_in")),
+        "category": pick("category").strip(),
     }
     return rec, warnings
 
-def _marketplace_fee(price: float, fee_cfg: Dict[str, Any]) -> float:
-    # Simple fee models; extend later (category-based, tiered, etc.)
-    typ = fee_cfg.get("type", "percent_of_price")
-    if typ == "percent_of_price":
-        pct = float(fee_cfg.get("percent", 0.0))
-        per_item = float(fee_cfg.get("per_item", 0.0))
-        return price * pct + per_item
-    return 0.0
+# Normalized record layout: field -> kind ("str" fields are stripped text,
+# "float"/"int" fields parse to numbers or None)
+NORMALIZED_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("supplier_sku", "str"),
+    ("supplier_cost", "float"),
+    ("qty_available", "int"),
+    ("upc", "str"),
+    ("title", "str"),
+    ("brand", "str"),
+    ("map_price", "float"),
+    ("msrp", "float"),
+    ("weight_oz", "float"),
+    ("length_in", "float"),
+    ("width_in", "float"),
+    ("height_in", "float"),
+    ("category", "str"),
+)
+
+_FIELD_NAMES = [f for f, _ in NORMALIZED_FIELDS]
+_SKU_POS = _FIELD_NAMES.index("supplier_sku")
+_COST_POS = _FIELD_NAMES.index("supplier_cost")
+_QTY_POS = _FIELD_NAMES.index("qty_available")
+
+# (missing sku, invalid cost, invalid qty) -> row warnings, in _normalize_row order
+_ROW_WARNINGS = {
+    (sku, cost, qty): tuple(
+        msg for bad, msg in (
+            (sku, "Missing supplier_sku"),
+            (cost, "Invalid supplier_cost"),
+            (qty, "Invalid qty_available"),
+        ) if bad
+    )
+    for sku in (False, True) for cost in (False, True) for qty in (False, True)
+}
+
+def _strip_column(values: Tuple[str, ...]) -> List[str]:
+    return [v.strip() for v in values]
+
+def _float_column(values: Tuple[str, ...]) -> List[Optional[float]]:
+    return parse_float_column(values)[0]
+
+def _int_column(values: Tuple[str, ...]) -> List[Optional[int]]:
+    return parse_int_column(values)[0]
+
+_COLUMN_PARSERS = {"str": _strip_column, "float": _float_column, "int": _int_column}
+
+class RowExtractor:
+    """
+    A supplier mapping compiled against one feed's header row.
+
+    Works on csv.reader lists, only touches the mapped column indexes and
+    parses each mapped column for a whole chunk at once. Produces the same
+    records and warnings as _normalize_row on csv.DictReader rows.
+    """
+
+    def __init__(self, mapping: Dict[str, str], headers: List[str]):
+        # Last occurrence wins for duplicate headers, as with csv.DictReader
+        index = {h: i for i, h in enumerate(headers)}
+        self.template: Dict[str, Any] = {f: ("" if kind == "str" else None) for f, kind in NORMALIZED_FIELDS}
+
+        fields: List[str] = []
+        parsers: List[Any] = []
+        indexes: List[int] = []
+        for field, kind in NORMALIZED_FIELDS:
+            col = mapping.get(field) or ""
+            i = index.get(col) if col else None
+            if i is None:
+                continue
+            fields.append(field)
+            parsers.append(_COLUMN_PARSERS[kind])
+            indexes.append(i)
+
+        self.fields = tuple(fields)
+        self.indexes = tuple(indexes)
+        self._parsers = tuple(parsers)
+        self._width = (max(indexes) + 1) if indexes else 0
+        self._pad = [""] * self._width
+        if len(indexes) == 1:
+            only = indexes[0]
+            self._getter = lambda r: (r[only],)
+        elif indexes:
+            self._getter = itemgetter(*indexes)
+        else:
+            self._getter = lambda r: ()
+
+    def project(self, row: List[str]) -> Tuple[str, ...]:
+        """Raw values of the mapped columns, in self.fields order."""
+        if len(row) < self._width:
+            row = row + self._pad[len(row):]
+        return self._getter(row)
+
+    def normalize_chunk(self, rows: List[List[str]]) -> List[Tuple[Dict[str, Any], List[str]]]:
+        n = len(rows)
+        projected = [self.project(r) for r in rows]
+        parsed = dict(zip(self.fields, (parse(col) for parse, col in zip(self._parsers, zip(*projected)))))
+        # Unmapped fields repeat their default
+        columns = [parsed.get(f) or [default] * n for f, default in self.template.items()]
+
+        names = tuple(self.template)
+        records = [dict(zip(names, values)) for values in zip(*columns)]
+        flags = zip(
+            [v == "" for v in columns[_SKU_POS]],
+            [v is None for v in columns[_COST_POS]],
+            [v is None for v in columns[_QTY_POS]],
+        )
+        return [(rec, list(_ROW_WARNINGS[f])) for rec, f in zip(records, flags)]
+
+    def __call__(self, row: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        return self.normalize_chunk([row])[0]
+
+def compile_mapping(mapping: Dict[str, str], headers: List[str]) -> RowExtractor:
+    return RowExtractor(mapping, headers)
+
+def iter_normalized(records: Iterable[List[str]], extractor: RowExtractor) -> Iterator[Tuple[Dict[str, Any], List[str]]]:
+    # csv.DictReader skips blank lines; keep that behaviour
+    it = (row for row in records if row)
+    while True:
+        chunk = list(islice(it, PRICING_CHUNK_ROWS))
+        if not chunk:
+            break
+        yield from extractor.normalize_chunk(chunk)
+
+def _marketplace_fee(price: float, fee_cfg: Dict[str, Any], category: str = "") -> float:
+    # Percent, tiered, minimum-fee and per-category models (see fee_schedule.py)
+    return compile_marketplace_fees(fee_cfg).for_category(category).fee(price)
 
 def _apply_rounding(price: float, rounding_mode: str) -> float:
     if rounding_mode == "ends_in_99":
@@ -186,26 +396,13 @@ def compute_prices(
 
     total_cost = float(cost) + float(dropship_fee) + float(shipping_estimate)
 
-    # Solve price for margin: price = total_cost / (1 - margin)
-    def solve(m: float) -> float:
-        if m >= 0.999:
-            return 0.0
-        return total_cost / (1.0 - m)
-
-    # Initial min/max price BEFORE fee inclusion:
-    min_price_pre = solve(float(min_margin))
-    max_price_pre = solve(float(max_margin))
-
-    # Marketplace fee depends on price, so we approximate with 1-pass:
-    fee_cfg = fee_table.get(marketplace, {"type": "percent_of_price", "percent": 0.0, "per_item": 0.0})
-    min_fee = _marketplace_fee(min_price_pre, fee_cfg)
-    max_fee = _marketplace_fee(max_price_pre, fee_cfg)
-
-    min_total_cost = total_cost + min_fee
-    max_total_cost = total_cost + max_fee
-
-    min_price = solve(float(min_margin)) + min_fee  # rough
-    max_price = solve(float(max_margin)) + max_fee  # rough
+    # Marketplace fee depends on price: solved per the compiled fee schedule
+    # ("approx" = one pass at the pre-fee price, "exact" = closed form per tier)
+    schedule = fees_for(fee_table, marketplace).for_category(normalized.get("category"))
+    min_price, min_ok = schedule.price_for_margin(total_cost, float(min_margin))
+    max_price, max_ok = schedule.price_for_margin(total_cost, float(max_margin))
+    if not (min_ok and max_ok):
+        warnings.append("No exact price for fee schedule (approximated)")
 
     # Clamp MAP if present
     map_price = normalized.get("map_price")
@@ -235,6 +432,108 @@ def compute_prices(
     })
     return out, warnings
 
+def price_normalized_rows(
+    normalized_rows: List[Dict[str, Any]],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99",
+    shipping_estimate: float = 0.0
+) -> List[Tuple[Dict[str, Any], List[str]]]:
+    """
+    Price a chunk of normalized rows; same results as calling compute_prices per row.
+
+    Uses the numpy batch kernel when available, else the scalar path.
+    """
+    if not BATCH_AVAILABLE or not normalized_rows:
+        return [
+            compute_prices(
+                n,
+                marketplace=marketplace,
+                min_margin=min_margin,
+                max_margin=max_margin,
+                dropship_fee=dropship_fee,
+                shipping_estimate=shipping_estimate,
+                fee_table=fee_table,
+                rounding_mode=rounding_mode
+            )
+            for n in normalized_rows
+        ]
+
+    nan = float("nan")
+    cost = [nan if n.get("supplier_cost") is None else n["supplier_cost"] for n in normalized_rows]
+    map_price = [nan if n.get("map_price") is None else n["map_price"] for n in normalized_rows]
+    batch = compute_prices_batch(
+        cost, map_price, float(dropship_fee), float(shipping_estimate),
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode,
+        category=[n.get("category") for n in normalized_rows]
+    )
+
+    priced = batch.priced.tolist()
+    dropship = batch.dropship_fee.tolist()
+    shipping = batch.shipping_estimate.tolist()
+    base = batch.base_total_cost.tolist()
+    min_price = batch.min_price.tolist()
+    max_price = batch.max_price.tolist()
+    warning_lists = batch.warning_lists()
+
+    out: List[Tuple[Dict[str, Any], List[str]]] = []
+    for i, n in enumerate(normalized_rows):
+        if not priced[i]:
+            out.append(({**n}, ["Cannot price: missing supplier_cost"]))
+            continue
+        warnings = warning_lists[i]
+        row = {**n}
+        row.update({
+            "marketplace": marketplace,
+            "dropship_fee": dropship[i],
+            "shipping_estimate": shipping[i],
+            "base_total_cost": base[i],
+            "min_price": min_price[i],
+            "max_price": max_price[i],
+            "warnings": "; ".join(warnings)
+        })
+        out.append((row, warnings))
+    return out
+
+def normalize_preview_rows(
+    preview_rows: List[Dict[str, str]],
+    mapping: Dict[str, str]
+) -> List[Tuple[Dict[str, Any], List[str]]]:
+    headers = list(preview_rows[0].keys()) if preview_rows else []
+    extractor = compile_mapping(mapping, headers)
+    return extractor.normalize_chunk([[r.get(h, "") for h in headers] for r in preview_rows])
+
+def price_preview_normalized(
+    normalized: List[Tuple[Dict[str, Any], List[str]]],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99"
+) -> List[Dict[str, Any]]:
+    priced_rows = price_normalized_rows(
+        [n for n, _ in normalized],
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+    out: List[Dict[str, Any]] = []
+    for (_, warn1), (priced, _) in zip(normalized, priced_rows):
+        priced["_row_warnings"] = "; ".join(warn1)
+        out.append(priced)
+    return out
+
 def price_preview_rows(
     preview_rows: List[Dict[str, str]],
     mapping: Dict[str, str],
@@ -246,25 +545,92 @@ def price_preview_rows(
     rounding_mode: str = "ends_in_99"
 ) -> List[Dict[str, Any]]:
 
+    return price_preview_normalized(
+        normalize_preview_rows(preview_rows, mapping),
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+
+# Stable output columns for full pricing runs
+OUTPUT_COLUMNS = [
+    "supplier_sku", "upc", "title", "brand",
+    "supplier_cost", "qty_available",
+    "dropship_fee", "shipping_estimate", "base_total_cost",
+    "min_price", "max_price", "marketplace",
+    "map_price", "msrp",
+    "_row_warnings", "warnings"
+]
+
+# Column kinds for typed (Parquet/Arrow) outputs; everything else is text
+OUTPUT_COLUMN_TYPES = {
+    **{f: kind for f, kind in NORMALIZED_FIELDS},
+    "dropship_fee": "float", "shipping_estimate": "float", "base_total_cost": "float",
+    "min_price": "float", "max_price": "float",
+}
+
+# Bytes per read when streaming uploads; bounds peak memory per stage
+STREAM_CHUNK_BYTES = 1 << 20
+
+def iter_normalized_chunks(
+    normalized_rows: Iterable[Tuple[Dict[str, Any], List[str]]]
+) -> Iterator[List[Tuple[Dict[str, Any], List[str]]]]:
+    it = iter(normalized_rows)
+    while True:
+        chunk = list(islice(it, PRICING_CHUNK_ROWS))
+        if not chunk:
+            break
+        yield chunk
+
+def price_chunk(
+    normalized: List[Tuple[Dict[str, Any], List[str]]],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99"
+) -> List[Dict[str, Any]]:
+    priced_rows = price_normalized_rows(
+        [n for n, _ in normalized],
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
     out: List[Dict[str, Any]] = []
-    for r in preview_rows:
-        normalized, warn1 = _normalize_row(r, mapping)
-        shipping_estimate = 0.0  # placeholder until carrier feeds
-        priced, warn2 = compute_prices(
+    for (_, warn1), (priced, _) in zip(normalized, priced_rows):
+        if warn1:
+            priced["_row_warnings"] = "; ".join(warn1)
+        out.append(priced)
+    return out
+
+def iter_priced_rows(
+    normalized_rows: Iterable[Tuple[Dict[str, Any], List[str]]],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99"
+) -> Iterator[Dict[str, Any]]:
+    for normalized in iter_normalized_chunks(normalized_rows):
+        yield from price_chunk(
             normalized,
             marketplace=marketplace,
             min_margin=min_margin,
             max_margin=max_margin,
             dropship_fee=dropship_fee,
-            shipping_estimate=shipping_estimate,
             fee_table=fee_table,
             rounding_mode=rounding_mode
         )
-        priced["_row_warnings"] = "; ".join(warn1)
-        out.append(priced)
-    return out
 
-def run_full_pricing(
+def iter_upload_priced_chunks(
     upload_path: str,
     mapping: Dict[str, str],
     marketplace: str,
@@ -273,52 +639,615 @@ def run_full_pricing(
     dropship_fee: float,
     fee_table: Dict[str, Any],
     rounding_mode: str = "ends_in_99"
+) -> Iterator[List[Dict[str, Any]]]:
+    """Priced rows of an upload, PRICING_CHUNK_ROWS at a time, read as they are yielded."""
+    pricing = dict(
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+    with open_upload(upload_path) as f:
+        reader = csv.reader(open_upload_lines(f, chunk_size=STREAM_CHUNK_BYTES))
+        extractor = compile_mapping(mapping, next(reader, []))
+        for normalized in iter_normalized_chunks(iter_normalized(reader, extractor)):
+            yield price_chunk(normalized, **pricing)
+
+def write_pricing_csv(out_path: str, rows: Iterable[Dict[str, Any]]) -> int:
+    with CsvWriter(out_path, OUTPUT_COLUMNS) as w:
+        return write_rows_chunked(w, rows, PRICING_CHUNK_ROWS)
+
+# Worker processes for run_full_pricing when not passed explicitly
+DEFAULT_PRICING_WORKERS = max(1, int(os.environ.get("ECOM_PRICING_WORKERS", "1") or 1))
+
+# Uploads smaller than this are priced in-process even when workers > 1
+PARALLEL_MIN_BYTES = 8 << 20
+
+# Byte ranges per worker, so uneven ranges still keep every core busy
+PARALLEL_RANGES_PER_WORKER = 4
+
+class ByteRangeReader:
+    """Binary reader limited to [f.tell(), end)."""
+
+    def __init__(self, f: BinaryIO, end: int):
+        self._f = f
+        self._remaining = max(0, end - f.tell())
+
+    def read(self, n: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        if n < 0 or n > self._remaining:
+            n = self._remaining
+        data = self._f.read(n)
+        self._remaining -= len(data)
+        return data
+
+# Record terminators, as iter_text_lines splits lines: \r\n, a bare \r
+# (classic Mac / Excel "CSV (Macintosh)") or \n
+RECORD_END_RE = re.compile(rb"\r\n?|\n")
+
+def record_starts_after(f: BinaryIO, targets: List[int], start: int = 0) -> List[int]:
+    """
+    For each (sorted) byte offset in targets, the first CSV record start at or
+    after it. A record starts after a \\r\\n, \\r or \\n that is outside quotes,
+    i.e. preceded by an even number of '"' bytes; the byte values of '"', '\\r'
+    and '\\n' never occur inside multi-byte characters of the supported
+    encodings. Targets past the last record map to the file size.
+
+    Scanning begins at `start`, which must itself be a record start.
+    """
+    out: List[int] = []
+    ti = 0
+    pos = start
+    parity = 0
+    f.seek(start)
+    while ti < len(targets):
+        block = f.read(STREAM_CHUNK_BYTES)
+        if not block:
+            break
+        end = pos + len(block)
+        q_pos, q_par = 0, parity
+        while ti < len(targets) and targets[ti] <= end:
+            found = None
+            m = RECORD_END_RE.search(block, max(targets[ti] - pos - 1, q_pos, 0))
+            while m is not None:
+                j = m.start()
+                q_par = (q_par + block.count(b'"', q_pos, j)) & 1
+                q_pos = j
+                if q_par == 0:
+                    found = pos + m.end()
+                    if m.end() == len(block) and block[j] == 13:
+                        # \r\n split across two blocks: the record starts after the \n
+                        if f.read(1) == b"\n":
+                            found += 1
+                        f.seek(end)
+                    break
+                m = RECORD_END_RE.search(block, m.end())
+            if found is None:
+                break
+            out.append(found)
+            ti += 1
+        parity = (parity + block.count(b'"')) & 1
+        pos = end
+    out.extend([pos] * (len(targets) - ti))
+    return out
+
+def split_upload(upload_path: str, parts: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """Split the data rows into up to `parts` byte ranges on record boundaries.
+
+    Returns (header_end, ranges).
+    """
+    size = upload_size(upload_path)
+    targets = [1] + [size * k // parts for k in range(1, parts)]
+    with open_upload(upload_path) as f:
+        starts = record_starts_after(f, sorted(targets))
+    header_end = starts[0]
+    bounds = sorted(set([header_end, size] + [b for b in starts[1:] if b > header_end]))
+    return header_end, [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+class PricingCancelled(Exception):
+    """Raised from a progress callback to stop a pricing run."""
+
+def chunk_stats(priced_rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """(rows that got a price, rows carrying warnings) of a priced chunk."""
+    priced = warned = 0
+    for r in priced_rows:
+        if "min_price" in r:
+            priced += 1
+        if r.get("warnings") or r.get("_row_warnings"):
+            warned += 1
+    return priced, warned
+
+class PricingProgress:
+    """
+    Running totals of a pricing run, passed to a progress callback as a dict
+    after every priced chunk:
+
+        {"rows": rows parsed, "rows_priced": rows that got a price,
+         "warnings": rows with warnings, "bytes_done": input bytes consumed,
+         "total_bytes": upload size}
+
+    The callback may raise (e.g. PricingCancelled) to stop the run. It is
+    called once per chunk (PRICING_CHUNK_ROWS rows), so it can be cheap but
+    should not do I/O itself; see pricing_jobs for rate-limited consumers.
+    """
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None], total_bytes: int):
+        self.callback = callback
+        self.total_bytes = total_bytes
+        self.rows = 0
+        self.rows_priced = 0
+        self.warnings = 0
+        self.bytes_done = 0
+
+    def reset(self) -> None:
+        self.rows = self.rows_priced = self.warnings = self.bytes_done = 0
+
+    def __call__(self, rows: int, priced: int, warned: int, bytes_done: int) -> None:
+        self.rows += rows
+        self.rows_priced += priced
+        self.warnings += warned
+        self.bytes_done = max(self.bytes_done, min(bytes_done, self.total_bytes))
+        self.callback({
+            "rows": self.rows,
+            "rows_priced": self.rows_priced,
+            "warnings": self.warnings,
+            "bytes_done": self.bytes_done,
+            "total_bytes": self.total_bytes,
+        })
+
+def _price_range(
+    f: BinaryIO,
+    start: int,
+    end: int,
+    encoding: str,
+    extractor: RowExtractor,
+    pricing: Dict[str, Any],
+    out: Any,
+    on_switch: Optional[Callable[[str], None]] = None,
+    progress: Optional[PricingProgress] = None
+) -> Tuple[int, int, int]:
+    # Price the records in [start, end) of an upload into an output writer;
+    # returns (rows, rows priced, rows with warnings)
+    if encoding == "utf-8-sig":
+        # A BOM can only appear at offset 0, which belongs to the header
+        encoding = "utf-8"
+    f.seek(start)
+    chunks = iter_decoded_text(ByteRangeReader(f, end), encoding, STREAM_CHUNK_BYTES, on_switch)
+    reader = csv.reader(iter_text_lines(chunks))
+    rows = priced = warned = 0
+    for normalized in iter_normalized_chunks(iter_normalized(reader, extractor)):
+        priced_rows = price_chunk(normalized, **pricing)
+        out.write_rows(priced_rows)
+        n_priced, n_warned = chunk_stats(priced_rows)
+        rows += len(normalized)
+        priced += n_priced
+        warned += n_warned
+        if progress is not None:
+            # f.tell() runs up to one read ahead of the rows priced so far
+            progress(len(normalized), n_priced, n_warned, f.tell())
+    return rows, priced, warned
+
+class _CodecSwitched(Exception):
+    """A byte range disproved the sniffed codec (see _run_parallel_pricing)."""
+
+def _price_byte_range(task: Tuple[Any, ...]) -> Tuple[str, Tuple[int, int, int], bool]:
+    # Process-pool worker: price one byte range into a header-less CSV part;
+    # also reports whether the range had to switch codecs
+    upload_path, start, end, encoding, headers, mapping, pricing, part_path, output_format = task
+    switched: List[str] = []
+    # gzip parts are complete gzip members; concatenated they form one valid .gz
+    writer_cls = GzipCsvWriter if output_format == "csv.gz" else CsvWriter
+    with open_upload(upload_path) as f, writer_cls(part_path, OUTPUT_COLUMNS, header=False) as out:
+        stats = _price_range(f, start, end, encoding, compile_mapping(mapping, headers), pricing, out, switched.append)
+    return part_path, stats, bool(switched)
+
+def _run_parallel_pricing(
+    upload_path: str,
+    out_path: str,
+    mapping: Dict[str, str],
+    pricing: Dict[str, Any],
+    workers: int,
+    output_format: str = "csv",
+    progress: Optional[PricingProgress] = None
+) -> None:
+    # Every range is decoded with the codec sniffed from the head of the file.
+    # A serial run that meets bytes disproving it switches codecs from that
+    # read on, at a point the ranges can't reproduce; so if any range had to
+    # switch, this raises _CodecSwitched and the caller prices serially.
+    with open_upload(upload_path) as f:
+        encoding = sniff_encoding(f.read(ENCODING_SNIFF_BYTES))
+        f.seek(0)
+        headers = next(csv.reader(open_upload_lines(f, chunk_size=ENCODING_SNIFF_BYTES)), [])
+    _, ranges = split_upload(upload_path, workers * PARALLEL_RANGES_PER_WORKER)
+
+    tasks = [
+        (upload_path, start, end, encoding, headers, mapping, pricing, f"{out_path}.part{i:04d}", output_format)
+        for i, (start, end) in enumerate(ranges)
+    ]
+    writer_cls = GzipCsvWriter if output_format == "csv.gz" else CsvWriter
+    try:
+        # Header first (its own gzip member for csv.gz), then the parts
+        writer_cls(out_path, OUTPUT_COLUMNS).close()
+        with ProcessPoolExecutor(max_workers=workers) as pool, open(out_path, "ab") as out:
+            try:
+                # map() yields in submission order, so parts are merged in file order
+                for task, (part_path, stats, switched) in zip(tasks, pool.map(_price_byte_range, tasks)):
+                    if switched:
+                        raise _CodecSwitched()
+                    with open(part_path, "rb") as part:
+                        shutil.copyfileobj(part, out, STREAM_CHUNK_BYTES)
+                    os.remove(part_path)
+                    if progress is not None:
+                        progress(*stats, task[2])
+            except BaseException:
+                # Don't start the remaining ranges (e.g. after PricingCancelled)
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+    finally:
+        for task in tasks:
+            if os.path.exists(task[-1]):
+                os.remove(task[-1])
+
+# Input bytes priced between checkpoints of a resumable run
+CHECKPOINT_BYTES = max(1, int(float(os.environ.get("ECOM_PRICING_CHECKPOINT_MB", "32")) * (1 << 20)))
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def pricing_run_key(upload_path: str, mapping: Dict[str, str], pricing: Dict[str, Any], output_format: str) -> str:
+    """Identifies a run: same upload (path, mtime, size) and same parameters."""
+    st = os.stat(upload_path)
+    return cache_key("pricing_run", os.path.abspath(upload_path), st.st_mtime_ns, st.st_size, mapping, pricing, output_format)
+
+def checkpoint_path_for(run_key: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{run_key}.json")
+
+def load_checkpoint(run_key: str) -> Optional[Dict[str, Any]]:
+    """The saved state of an interrupted run, or None if there is none usable."""
+    state = _read_json(checkpoint_path_for(run_key), None)
+    if not isinstance(state, dict) or state.get("run_key") != run_key:
+        return None
+    partial = state.get("partial_path") or ""
+    if not os.path.exists(partial) or os.path.getsize(partial) < int(state.get("out_bytes", 0)):
+        return None
+    return state
+
+class PricingRunInProgress(ValueError):
+    """Another checkpointed run with the same upload and parameters is active."""
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+else:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+def _lock_run(run_key: str) -> int:
+    # An OS lock, not just an O_EXCL marker file: it is released when the
+    # process dies, so a run killed mid-way can still be resumed. The lock
+    # file itself is left in place (removing it would race a new locker).
+    fd = os.open(checkpoint_path_for(run_key) + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    if not _try_lock(fd):
+        os.close(fd)
+        raise PricingRunInProgress("This pricing run is already in progress; wait for it to finish.")
+    return fd
+
+def _run_checkpointed_pricing(
+    upload_path: str,
+    mapping: Dict[str, str],
+    pricing: Dict[str, Any],
+    output_format: str,
+    progress: Optional[PricingProgress] = None
 ) -> str:
+    # Prices the upload in segments of about CHECKPOINT_BYTES, split on record
+    # boundaries. After each segment the partial output is fsynced and the
+    # checkpoint records where the next segment starts, how many rows and
+    # bytes were written and which codec was active. A later call with the
+    # same upload and parameters truncates the partial output back to the
+    # checkpoint and carries on, so the result is byte-identical to an
+    # uninterrupted run.
+    # Only one run per run key at a time: two would truncate and append to
+    # the same partial output. A duplicate raises PricingRunInProgress.
+    run_key = pricing_run_key(upload_path, mapping, pricing, output_format)
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    lock_fd = _lock_run(run_key)
+    try:
+        return _price_with_checkpoints(upload_path, mapping, pricing, output_format, run_key, progress)
+    finally:
+        os.close(lock_fd)
 
-    headers, _ = preview_upload(upload_path, max_rows=0)  # just headers
-    with open(upload_path, "rb") as f:
-        text = decode_bytes_guess(f.read())
+def _price_with_checkpoints(
+    upload_path: str,
+    mapping: Dict[str, str],
+    pricing: Dict[str, Any],
+    output_format: str,
+    run_key: str,
+    progress: Optional[PricingProgress] = None
+) -> str:
+    ckpt_path = checkpoint_path_for(run_key)
+    writer_cls = GzipCsvWriter if output_format == "csv.gz" else CsvWriter
+    size = upload_size(upload_path)
 
-    buf = io.StringIO(text)
-    reader = csv.DictReader(buf)
-    rows_out: List[Dict[str, Any]] = []
+    with open_upload(upload_path) as f:
+        headers = next(csv.reader(open_upload_lines(f, chunk_size=ENCODING_SNIFF_BYTES)), [])
+        extractor = compile_mapping(mapping, headers)
 
-    for r in reader:
-        normalized, warn1 = _normalize_row(r, mapping)
-        shipping_estimate = 0.0
-        priced, warn2 = compute_prices(
-            normalized,
-            marketplace=marketplace,
-            min_margin=min_margin,
-            max_margin=max_margin,
-            dropship_fee=dropship_fee,
-            shipping_estimate=shipping_estimate,
-            fee_table=fee_table,
-            rounding_mode=rounding_mode
-        )
-        if warn1:
-            priced["_row_warnings"] = "; ".join(warn1)
-        rows_out.append(priced)
+        state = load_checkpoint(run_key)
+        if state is not None:
+            with open(state["partial_path"], "r+b") as part:
+                part.truncate(int(state["out_bytes"]))
+        else:
+            ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            out_path = output_path_for(os.path.join(OUTPUT_DIR, f"pricing_{pricing['marketplace']}_{ts}.csv"), output_format)
+            f.seek(0)
+            state = {
+                "run_key": run_key,
+                "upload_path": os.path.abspath(upload_path),
+                "out_path": out_path,
+                "partial_path": out_path + ".partial",
+                "output_format": output_format,
+                "segment_bytes": CHECKPOINT_BYTES,
+                "encoding": sniff_encoding(f.read(ENCODING_SNIFF_BYTES)),
+                "next_offset": record_starts_after(f, [1])[0],
+                "rows_written": 0,
+                "rows_priced": 0,
+                "warnings": 0,
+                "out_bytes": 0,
+            }
+            writer_cls(state["partial_path"], OUTPUT_COLUMNS).close()
+            state["out_bytes"] = os.path.getsize(state["partial_path"])
+            _write_checkpoint(ckpt_path, state)
 
-    # Output CSV
+        if progress is not None:
+            # A resumed run reports the rows priced before the interruption too
+            progress.rows = int(state["rows_written"])
+            progress.rows_priced = int(state.get("rows_priced", 0))
+            progress.warnings = int(state.get("warnings", 0))
+
+        def switched(enc: str) -> None:
+            state["encoding"] = enc
+
+        while state["next_offset"] < size:
+            start = int(state["next_offset"])
+            end = record_starts_after(f, [start + int(state["segment_bytes"])], start=start)[0]
+            with writer_cls(state["partial_path"], OUTPUT_COLUMNS, header=False, append=True) as out:
+                _, priced, warned = _price_range(f, start, end, state["encoding"], extractor, pricing, out, switched, progress)
+            _fsync_path(state["partial_path"])
+            state["next_offset"] = end
+            state["rows_written"] += out.rows_written
+            state["rows_priced"] = state.get("rows_priced", 0) + priced
+            state["warnings"] = state.get("warnings", 0) + warned
+            state["out_bytes"] = os.path.getsize(state["partial_path"])
+            state["updated_at"] = datetime.utcnow().isoformat() + "Z"
+            _write_checkpoint(ckpt_path, state)
+
+    os.replace(state["partial_path"], state["out_path"])
+    os.remove(ckpt_path)
+    return state["out_path"]
+
+def run_full_pricing(
+    upload_path: str,
+    mapping: Dict[str, str],
+    marketplace: str,
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99",
+    workers: Optional[int] = None,
+    output_format: Optional[str] = None,
+    checkpoint: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> str:
+
+    # Streaming pipeline: read -> decode -> parse -> normalize -> price -> write.
+    # Every stage is a generator, so memory stays flat regardless of feed size.
+    # With workers > 1, large uploads are split on record boundaries and the
+    # ranges are priced in a process pool, then merged in order (CSV formats
+    # only; Parquet/Arrow are written in-process, one row group at a time).
+    # An upload that turns out to switch codecs part-way (UTF-8 head, cp1252
+    # further on) is re-priced in-process so the output matches a serial run.
+    # checkpoint=True makes in-process CSV runs resumable: calling again with
+    # the same upload and parameters after an interruption continues from the
+    # last checkpoint. Parallel runs are not checkpointed, so checkpoint=True
+    # with workers > 1 on an upload large enough to be split is a ValueError.
+    # progress, if given, is called with PricingProgress totals after every
+    # priced chunk (after every merged range for parallel runs).
+    output_format = normalize_format(output_format)
     _ensure_dirs()
     ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    out_path = os.path.join(OUTPUT_DIR, f"pricing_{marketplace}_{ts}.csv")
-
-    # Stable columns
-    cols = [
-        "supplier_sku", "upc", "title", "brand",
-        "supplier_cost", "qty_available",
-        "dropship_fee", "shipping_estimate", "base_total_cost",
-        "min_price", "max_price", "marketplace",
-        "map_price", "msrp",
-        "_row_warnings", "warnings"
-    ]
+    out_path = output_path_for(os.path.join(OUTPUT_DIR, f"pricing_{marketplace}_{ts}.csv"), output_format)
 
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-        w.writeheader()
-        for row in rows_out:
-            w.writerow(row)
+    pricing = dict(
+        marketplace=marketplace,
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+    workers = DEFAULT_PRICING_WORKERS if workers is None else max(1, int(workers))
+    csv_output = output_format in ("csv", "csv.gz")
+    size = upload_size(upload_path)
+    tracker = PricingProgress(progress, size) if progress is not None else None
+    if workers > 1 and csv_output and size >= PARALLEL_MIN_BYTES:
+        if checkpoint:
+            raise ValueError("checkpoint=True cannot be combined with workers > 1: parallel runs are not resumable.")
+        try:
+            _run_parallel_pricing(upload_path, out_path, mapping, pricing, workers, output_format, tracker)
+            return out_path
+        except _CodecSwitched:
+            # Mixed-encoding upload: start over in-process (progress restarts too)
+            _remove_quietly(out_path)
+            if tracker is not None:
+                tracker.reset()
+        except BaseException:
+            _remove_quietly(out_path)
+            raise
+    if checkpoint and csv_output:
+        # Interrupted (or cancelled) checkpointed runs keep their partial output
+        return _run_checkpointed_pricing(upload_path, mapping, pricing, output_format, tracker)
 
+    try:
+        with open_upload(upload_path) as f, \
+                open_output_writer(out_path, OUTPUT_COLUMNS, output_format, OUTPUT_COLUMN_TYPES) as out:
+            reader = csv.reader(open_upload_lines(f, chunk_size=STREAM_CHUNK_BYTES))
+            headers = next(reader, [])
+            extractor = compile_mapping(mapping, headers)
+            for normalized in iter_normalized_chunks(iter_normalized(reader, extractor)):
+                priced_rows = price_chunk(normalized, **pricing)
+                out.write_rows(priced_rows)
+                if tracker is not None:
+                    tracker(len(normalized), *chunk_stats(priced_rows), f.tell())
+    except BaseException:
+        _remove_quietly(out_path)
+        raise
     return out_path
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Shared (marketplace-independent) columns of the wide multi-marketplace output
+WIDE_BASE_COLUMNS = [
+    "supplier_sku", "upc", "title", "brand",
+    "supplier_cost", "qty_available",
+    "dropship_fee", "shipping_estimate", "base_total_cost",
+    "map_price", "msrp",
+    "_row_warnings"
+]
+
+# Per-marketplace columns of the wide output, prefixed with "<marketplace>_"
+WIDE_MARKETPLACE_COLUMNS = ["min_price", "max_price", "warnings"]
+
+def wide_columns(marketplaces: List[str]) -> List[str]:
+    cols = list(WIDE_BASE_COLUMNS)
+    for mp in marketplaces:
+        cols.extend(f"{mp}_{c}" for c in WIDE_MARKETPLACE_COLUMNS)
+    return cols
+
+def run_multi_marketplace_pricing(
+    upload_path: str,
+    mapping: Dict[str, str],
+    marketplaces: Optional[List[str]],
+    min_margin: float,
+    max_margin: float,
+    dropship_fee: float,
+    fee_table: Dict[str, Any],
+    rounding_mode: str = "ends_in_99",
+    layout: str = "per_marketplace",
+    output_format: Optional[str] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, str]:
+    """
+    Price every row for several marketplaces in one pass over the upload.
+
+    Each row is parsed and normalized once, then priced per marketplace.
+    marketplaces=None means every marketplace in fee_table; otherwise every
+    name must be a fee_table key (repeats are priced once).
+
+    layout="per_marketplace" writes one CSV per marketplace, identical to
+    run_full_pricing for that marketplace; returns {marketplace: path}.
+    layout="wide" writes a single CSV with <marketplace>_min_price /
+    _max_price / _warnings columns; returns {"wide": path}.
+
+    output_format picks csv (default), csv.gz, parquet or arrow.
+    progress works as in run_full_pricing (rows count each input row once).
+    """
+    if layout not in ("per_marketplace", "wide"):
+        raise ValueError(f"Unknown layout: {layout}")
+    if isinstance(marketplaces, str):
+        raise ValueError("marketplaces must be a list of marketplace names")
+    mps = list(dict.fromkeys(marketplaces)) if marketplaces else list(fee_table.keys())
+    if not mps:
+        raise ValueError("No marketplaces selected")
+    unknown = [mp for mp in mps if mp not in fee_table]
+    if unknown:
+        raise ValueError(f"Unknown marketplace(s): {', '.join(map(str, unknown))} (expected one of {', '.join(fee_table)})")
+
+    output_format = normalize_format(output_format)
+    _ensure_dirs()
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    if layout == "wide":
+        paths = {"wide": os.path.join(OUTPUT_DIR, f"pricing_multi_{ts}.csv")}
+    else:
+        paths = {mp: os.path.join(OUTPUT_DIR, f"pricing_{mp}_{ts}.csv") for mp in mps}
+    paths = {key: output_path_for(path, output_format) for key, path in paths.items()}
+
+    pricing = dict(
+        min_margin=min_margin,
+        max_margin=max_margin,
+        dropship_fee=dropship_fee,
+        fee_table=fee_table,
+        rounding_mode=rounding_mode
+    )
+    tracker = PricingProgress(progress, upload_size(upload_path)) if progress is not None else None
+    writers: Dict[str, Any] = {}
+    done = False
+    try:
+        if layout == "wide":
+            wide_types = {**OUTPUT_COLUMN_TYPES, **{f"{mp}_{c}": "float" for mp in mps for c in ("min_price", "max_price")}}
+            writers["wide"] = open_output_writer(paths["wide"], wide_columns(mps), output_format, wide_types)
+        else:
+            for mp in mps:
+                writers[mp] = open_output_writer(paths[mp], OUTPUT_COLUMNS, output_format, OUTPUT_COLUMN_TYPES)
+
+        with open_upload(upload_path) as f:
+            reader = csv.reader(open_upload_lines(f, chunk_size=STREAM_CHUNK_BYTES))
+            extractor = compile_mapping(mapping, next(reader, []))
+            for normalized in iter_normalized_chunks(iter_normalized(reader, extractor)):
+                per_mp = {mp: price_chunk(normalized, marketplace=mp, **pricing) for mp in mps}
+                if layout == "wide":
+                    writers["wide"].write_rows(list(_widen(per_mp, mps)))
+                else:
+                    for mp in mps:
+                        writers[mp].write_rows(per_mp[mp])
+                if tracker is not None:
+                    # Priced / warning counts are taken from the first marketplace
+                    tracker(len(normalized), *chunk_stats(per_mp[mps[0]]), f.tell())
+        done = True
+    finally:
+        for w in writers.values():
+            w.close()
+        if not done:
+            for path in paths.values():
+                _remove_quietly(path)
+    return paths
+
+def _widen(per_mp: Dict[str, List[Dict[str, Any]]], mps: List[str]) -> Iterator[Dict[str, Any]]:
+    for rows in zip(*(per_mp[mp] for mp in mps)):
+        # Shared columns do not depend on the marketplace
+        wide = dict(rows[0])
+        for mp, row in zip(mps, rows):
+            for c in WIDE_MARKETPLACE_COLUMNS:
+                wide[f"{mp}_{c}"] = row.get(c, "")
+        yield wide
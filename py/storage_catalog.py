@@ -0,0 +1,386 @@
+# storage_catalog.py
+# Persistent catalog of pricing outputs and uploaded feeds, with retention.
+#
+#   data/catalog.sqlite
+#     entries(id, kind, path, size, created_at, last_access, compressed)
+#       kind "output": id = out_id (output file name without extension)
+#       kind "upload": id = blob digest (or the upload_id of a legacy .csv)
+#     aliases(upload_id, digest)   upload aliases of each blob
+#
+# Downloads resolve out_id -> path with one primary-key lookup, so links keep
+# working across restarts. maintain() applies the retention policy:
+#
+#   1. CSV outputs not accessed for COMPRESS_AFTER_HOURS are gzipped in place
+#      (out_id is unchanged; downloads are served gzip-encoded)
+#   2. entries not accessed for RETENTION_DAYS are deleted
+#   3. while the total size is over STORAGE_BUDGET_MB, the least recently
+#      accessed entries are deleted
+#
+# Entries accessed in the last MIN_IDLE_SECONDS are never deleted, so an
+# output just produced stays put. Uploads are never deleted while pinned:
+# pin_upload() holds them for the length of a pricing run, and an upload with
+# a checkpoint on disk stays until the run is resumed or the checkpoint goes.
+# Files found on disk without an entry are adopted by sync().
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from py.pricing_mapping_engine import CHECKPOINT_DIR, DATA_DIR, OUTPUT_DIR, STREAM_CHUNK_BYTES
+    from py.feed_index import index_path_for
+    from py.output_writers import format_of_path, strip_output_extension
+    from py.upload_store import (
+        ALIASES_DIR, BLOBS_DIR, CODEC_EXTENSIONS, UPLOADS_DIR, alias_info, codec_of, digest_of, frames_path_for
+    )
+except ImportError:
+    from pricing_mapping_engine import CHECKPOINT_DIR, DATA_DIR, OUTPUT_DIR, STREAM_CHUNK_BYTES
+    from feed_index import index_path_for
+    from output_writers import format_of_path, strip_output_extension
+    from upload_store import (
+        ALIASES_DIR, BLOBS_DIR, CODEC_EXTENSIONS, UPLOADS_DIR, alias_info, codec_of, digest_of, frames_path_for
+    )
+
+CATALOG_PATH = os.path.join(DATA_DIR, "catalog.sqlite")
+
+STORAGE_BUDGET_BYTES = int(float(os.environ.get("ECOM_STORAGE_BUDGET_MB", "10240")) * 1024 * 1024)
+RETENTION_DAYS = float(os.environ.get("ECOM_RETENTION_DAYS", "30"))
+COMPRESS_AFTER_HOURS = float(os.environ.get("ECOM_COMPRESS_AFTER_HOURS", "24"))
+MIN_IDLE_SECONDS = 15 * 60
+
+# maintain() runs at most this often when triggered by new entries
+MAINTENANCE_INTERVAL = 60.0
+
+# last_access is only rewritten when older than this (reads are frequent)
+TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS aliases (
+    upload_id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS aliases_digest ON aliases (digest);
+"""
+
+
+def output_id_for(path: str) -> str:
+    return os.path.basename(strip_output_extension(path))
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _upload_files(path: str) -> List[str]:
+    # The upload itself plus its sidecars (frame table, row index)
+    files = [path, index_path_for(path)]
+    if codec_of(path) is not None:
+        files.append(frames_path_for(path))
+    return files
+
+
+def _upload_id_of(path: str) -> str:
+    # Blobs are keyed by digest; legacy plain uploads by their upload_id
+    return digest_of(path) or os.path.splitext(os.path.basename(path))[0]
+
+
+class StorageCatalog:
+    def __init__(self, path: str = CATALOG_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._touched: Dict[str, float] = {}
+        # entry id -> number of active runs using it
+        self._pins: Dict[str, int] = {}
+        self._last_maintenance = 0.0
+        self._maintaining = threading.Lock()
+
+    # --- registration -------------------------------------------------------
+
+    def _upsert(self, entry_id: str, kind: str, path: str, size: int) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO entries (id, kind, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET path = excluded.path, size = excluded.size, "
+                "last_access = excluded.last_access, compressed = 0",
+                (entry_id, kind, os.path.abspath(path), size, now, now)
+            )
+        self._touched[entry_id] = now
+
+    def register_output(self, path: str) -> str:
+        """Catalog a finished output file; returns its out_id."""
+        out_id = output_id_for(path)
+        self._upsert(out_id, "output", path, _size(path))
+        self.maintain_soon()
+        return out_id
+
+    def register_upload(self, upload_id: str, path: str) -> None:
+        """Catalog an upload (blob + sidecars) and the alias it was stored under."""
+        entry_id = _upload_id_of(path)
+        self._upsert(entry_id, "upload", path, sum(_size(p) for p in _upload_files(path)))
+        if entry_id != upload_id:
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (upload_id, entry_id))
+        self.maintain_soon()
+
+    # --- lookups ------------------------------------------------------------
+
+    def _get(self, entry_id: str) -> Optional[Tuple[str, str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT kind, path, size, compressed FROM entries WHERE id = ?", (entry_id,)
+            ).fetchone()
+
+    def touch(self, entry_id: str) -> None:
+        now = time.time()
+        if now - self._touched.get(entry_id, 0.0) < TOUCH_INTERVAL:
+            return
+        self._touched[entry_id] = now
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE id = ?", (now, entry_id))
+
+    def resolve_output(self, out_id: str) -> Optional[Tuple[str, bool]]:
+        """(path, compressed_in_place) of an output, or None; counts as an access."""
+        row = self._get(out_id)
+        if row is None or row[0] != "output" or not os.path.exists(row[1]):
+            return None
+        self.touch(out_id)
+        return row[1], bool(row[3])
+
+    def touch_upload(self, path: str) -> None:
+        self.touch(_upload_id_of(path))
+
+    @contextmanager
+    def pin_upload(self, path: str) -> Iterator[None]:
+        """Keep the upload out of maintain() while the block runs (e.g. a pricing run)."""
+        entry_id = _upload_id_of(path)
+        with self._lock:
+            self._pins[entry_id] = self._pins.get(entry_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._pins[entry_id] > 1:
+                    self._pins[entry_id] -= 1
+                else:
+                    del self._pins[entry_id]
+            # The idle window starts when the run ends, not when it started
+            self._touched.pop(entry_id, None)
+            self.touch(entry_id)
+
+    def _pinned(self) -> Set[str]:
+        # Uploads of active runs, plus uploads an interrupted checkpointed run
+        # still needs in order to resume
+        with self._lock:
+            pinned = set(self._pins)
+        if os.path.isdir(CHECKPOINT_DIR):
+            for name in os.listdir(CHECKPOINT_DIR):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(CHECKPOINT_DIR, name), "r", encoding="utf-8") as f:
+                        upload_path = json.load(f).get("upload_path")
+                except (OSError, ValueError, AttributeError):
+                    continue
+                if upload_path:
+                    pinned.add(_upload_id_of(upload_path))
+        return pinned
+
+    # --- retention ----------------------------------------------------------
+
+    def _delete(self, entry_id: str, kind: str, path: str) -> bool:
+        # False (entry kept for the next pass) when the file can't be removed,
+        # e.g. on Windows while it is open
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        for p in (_upload_files(path)[1:] if kind == "upload" else []):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        with self._lock, self._conn:
+            if kind == "upload":
+                for (upload_id,) in self._conn.execute("SELECT upload_id FROM aliases WHERE digest = ?", (entry_id,)).fetchall():
+                    try:
+                        os.remove(os.path.join(ALIASES_DIR, f"{upload_id}.json"))
+                    except OSError:
+                        pass
+                self._conn.execute("DELETE FROM aliases WHERE digest = ?", (entry_id,))
+            self._conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        self._touched.pop(entry_id, None)
+        return True
+
+    def _compress(self, entry_id: str, path: str) -> None:
+        gz_path = path + ".gz"
+        tmp = gz_path + ".tmp"
+        with open(path, "rb") as src, open(tmp, "wb") as raw, \
+                gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=6, mtime=0) as dst:
+            shutil.copyfileobj(src, dst, STREAM_CHUNK_BYTES)
+        os.replace(tmp, gz_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE entries SET path = ?, size = ?, compressed = 1 WHERE id = ?",
+                (gz_path, _size(gz_path), entry_id)
+            )
+        os.remove(path)
+
+    def _iter_entries(self, where: str, params: Tuple[Any, ...]) -> Iterator[Tuple[str, str, str, int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, kind, path, size FROM entries WHERE {where} ORDER BY last_access", params
+            ).fetchall()
+        yield from rows
+
+    def maintain(
+        self,
+        budget_bytes: int = STORAGE_BUDGET_BYTES,
+        retention_days: float = RETENTION_DAYS,
+        compress_after_hours: float = COMPRESS_AFTER_HOURS
+    ) -> Dict[str, int]:
+        """Apply compression, age and disk-budget policies; returns counts."""
+        with self._maintaining:
+            self._last_maintenance = time.monotonic()
+            self.sync()
+            now = time.time()
+            idle_cutoff = now - MIN_IDLE_SECONDS
+            pinned = self._pinned()
+            done = {"compressed": 0, "expired": 0, "evicted": 0, "freed_bytes": 0}
+
+            if compress_after_hours > 0:
+                cutoff = min(idle_cutoff, now - compress_after_hours * 3600)
+                for entry_id, _, path, _ in self._iter_entries("kind = 'output' AND compressed = 0 AND last_access < ?", (cutoff,)):
+                    if format_of_path(path) == "csv" and os.path.exists(path):
+                        before = _size(path)
+                        self._compress(entry_id, path)
+                        done["compressed"] += 1
+                        done["freed_bytes"] += before - _size(path + ".gz")
+
+            if retention_days > 0:
+                cutoff = min(idle_cutoff, now - retention_days * 86400)
+                for entry_id, kind, path, size in self._iter_entries("last_access < ?", (cutoff,)):
+                    if entry_id in pinned or not self._delete(entry_id, kind, path):
+                        continue
+                    done["expired"] += 1
+                    done["freed_bytes"] += size
+
+            total = self.total_bytes()
+            if total > budget_bytes:
+                for entry_id, kind, path, size in self._iter_entries("last_access < ?", (idle_cutoff,)):
+                    if total <= budget_bytes:
+                        break
+                    if entry_id in pinned or not self._delete(entry_id, kind, path):
+                        continue
+                    total -= size
+                    done["evicted"] += 1
+                    done["freed_bytes"] += size
+            return done
+
+    def maintain_soon(self) -> None:
+        """Run maintain() in the background unless it ran recently."""
+        if time.monotonic() - self._last_maintenance < MAINTENANCE_INTERVAL or self._maintaining.locked():
+            return
+        self._last_maintenance = time.monotonic()
+        threading.Thread(target=self.maintain, name="storage-maintenance", daemon=True).start()
+
+    # --- bookkeeping --------------------------------------------------------
+
+    def sync(self) -> None:
+        """Adopt files on disk without an entry; drop entries whose files are gone."""
+        with self._lock:
+            known = {path for (path,) in self._conn.execute("SELECT path FROM entries")}
+            stale = [(i, p) for i, p in self._conn.execute("SELECT id, path FROM entries") if not os.path.exists(p)]
+        if stale:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM entries WHERE id = ?", [(i,) for i, _ in stale])
+                self._conn.executemany("DELETE FROM aliases WHERE digest = ?", [(i,) for i, _ in stale])
+
+        now = time.time()
+        found: List[Tuple[str, str, str, int, float]] = []
+        if os.path.isdir(OUTPUT_DIR):
+            for name in os.listdir(OUTPUT_DIR):
+                path = os.path.join(OUTPUT_DIR, name)
+                if not os.path.isfile(path) or path in known or name.endswith((".tmp", ".partial")) or ".part" in name:
+                    continue
+                mtime = os.path.getmtime(path)
+                if now - mtime < MIN_IDLE_SECONDS:
+                    continue  # probably still being written; registered when the run ends
+                found.append((output_id_for(path), "output", path, _size(path), mtime))
+        upload_files = []
+        if os.path.isdir(BLOBS_DIR):
+            upload_files += [os.path.join(BLOBS_DIR, n) for n in os.listdir(BLOBS_DIR)
+                             if n.endswith(tuple(CODEC_EXTENSIONS.values()))]
+        if os.path.isdir(UPLOADS_DIR):
+            upload_files += [os.path.join(UPLOADS_DIR, n) for n in os.listdir(UPLOADS_DIR) if n.endswith(".csv")]
+        for path in upload_files:
+            if path not in known and (codec_of(path) is None or os.path.exists(frames_path_for(path))):
+                size = sum(_size(p) for p in _upload_files(path))
+                found.append((_upload_id_of(path), "upload", path, size, os.path.getmtime(path)))
+
+        aliases = []
+        if os.path.isdir(ALIASES_DIR):
+            with self._lock:
+                known_aliases = {u for (u,) in self._conn.execute("SELECT upload_id FROM aliases")}
+            for name in os.listdir(ALIASES_DIR):
+                upload_id = name[: -len(".json")] if name.endswith(".json") else None
+                if upload_id and upload_id not in known_aliases:
+                    info = alias_info(upload_id)
+                    if info and info.get("digest"):
+                        aliases.append((upload_id, info["digest"]))
+
+        if found or aliases:
+            with self._lock, self._conn:
+                # Adopted files count as accessed when they were last modified
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO entries (id, kind, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(i, k, os.path.abspath(p), s, min(m, now), min(m, now)) for i, k, p, s, m in found]
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO aliases VALUES (?, ?)", aliases)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(compressed), 0) FROM entries GROUP BY kind"
+            ).fetchall()
+        out: Dict[str, Any] = {
+            "budget_bytes": STORAGE_BUDGET_BYTES,
+            "retention_days": RETENTION_DAYS,
+            "compress_after_hours": COMPRESS_AFTER_HOURS,
+        }
+        for kind, count, size, compressed in rows:
+            out[f"{kind}s"] = {"count": count, "bytes": size, "compressed": compressed}
+        out["total_bytes"] = sum(size for _, _, size, _ in rows)
+        return out
@@ -0,0 +1,105 @@
+# supplier_import.py
+# Parse bulk supplier imports (JSON lines or CSV) into supplier records.
+#
+# CSV follows config/suppliers.csv:
+#   supplier_code, supplier_name, origin_zip, default_handling_days,
+#   amazon_min_margin_pct, amazon_max_margin_pct
+# Columns named after Supplier fields (code, name, active, ...) are accepted
+# as-is in both formats. Empty CSV cells are left out, so an import only
+# overwrites the fields it actually carries.
+#
+# parse_supplier_import() returns (line, record, error) per input record;
+# exactly one of record / error is set.
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+# config/suppliers.csv column -> Supplier field
+CSV_COLUMN_ALIASES = {
+    "supplier_code": "code",
+    "supplier_name": "name",
+    "origin_zip": "return_postal_code",
+    "default_handling_days": "handling_time_days",
+    "amazon_min_margin_pct": "min_gross_margin",
+    "amazon_max_margin_pct": "max_gross_margin",
+}
+
+# primary_marketplaces in a CSV cell: "Amazon|Reverb" or "Amazon; Reverb"
+_LIST_SPLIT_RE = re.compile(r"\s*[|;]\s*")
+
+ImportRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def decode_import(data: bytes) -> str:
+    # ERP exports are UTF-8 (often with a BOM) or Windows-1252
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def detect_import_format(text: str, content_type: str = "") -> str:
+    ct = (content_type or "").lower()
+    if "csv" in ct:
+        return "csv"
+    if "json" in ct:
+        return "jsonl"
+    return "jsonl" if text.lstrip().startswith("{") else "csv"
+
+
+def _normalize(record: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        field = CSV_COLUMN_ALIASES.get(key.strip(), key.strip())
+        if isinstance(value, str):
+            value = value.strip()
+            if field == "primary_marketplaces":
+                value = [v for v in _LIST_SPLIT_RE.split(value) if v]
+        out[field] = value
+    if "code" in out:
+        out["code"] = str(out["code"] or "").strip()
+    return out
+
+
+def _parse_jsonl(text: str) -> List[ImportRow]:
+    rows: List[ImportRow] = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            rows.append((line_no, None, f"Invalid JSON: {exc}"))
+            continue
+        if not isinstance(record, dict):
+            rows.append((line_no, None, "Expected a JSON object"))
+            continue
+        rows.append((line_no, _normalize(record), None))
+    return rows
+
+
+def _parse_csv(text: str) -> List[ImportRow]:
+    rows: List[ImportRow] = []
+    reader = csv.DictReader(io.StringIO(text, newline=""))
+    for record in reader:
+        # Header is line 1; reader.line_num is the last physical line read
+        cells = {k: v for k, v in record.items() if v not in (None, "")}
+        if not cells:
+            continue
+        rows.append((reader.line_num, _normalize(cells), None))
+    return rows
+
+
+def parse_supplier_import(text: str, fmt: str) -> List[ImportRow]:
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt!r} (expected one of {', '.join(IMPORT_FORMATS)})")
+    return _parse_jsonl(text) if fmt == "jsonl" else _parse_csv(text)
@@ -30,11 +30,19 @@ We use supplier-specific min/max margins and compute:
 
 from __future__ import annotations
 
+import argparse
 import csv
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
 
+try:
+    from py.numeric_parse import parse_int, parse_number
+    from py.output_writers import OUTPUT_FORMATS, open_output_writer, output_path_for, write_rows_chunked
+except ImportError:
+    from numeric_parse import parse_int, parse_number
+    from output_writers import OUTPUT_FORMATS, open_output_writer, output_path_for, write_rows_chunked
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 CONFIG_SUPPLIERS = BASE_DIR / "config" / "suppliers.csv"
@@ -56,23 +64,13 @@ class Supplier:
 
 
 def _parse_float(v: str, default: float = 0.0) -> float:
-    try:
-        v = v.strip()
-        if not v:
-            return default
-        return float(v)
-    except Exception:
-        return default
+    parsed = parse_number(v)
+    return default if parsed is None else parsed
 
 
 def _parse_int(v: str, default: int = 0) -> int:
-    try:
-        v = v.strip()
-        if not v:
-            return default
-        return int(float(v))
-    except Exception:
-        return default
+    parsed = parse_int(v)
+    return default if parsed is None else parsed
 
 
 def load_suppliers(path: Path) -> Dict[str, Supplier]:
@@ -159,7 +157,7 @@ def compute_margin_for_price(
     return gross / price
 
 
-def main() -> None:
+def main(output_format: Optional[str] = None) -> None:
     print("=== Ecom Copilot Supplier Pricing (Amazon) ===")
     print(f"Root: {BASE_DIR}")
     print("")
@@ -243,17 +241,19 @@ def main() -> None:
         return
 
     fieldnames = list(rows_out[0].keys())
-    with OUTPUT_AMAZON.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows_out)
+    output_path = output_path_for(str(OUTPUT_AMAZON), output_format)
+    with open_output_writer(output_path, fieldnames, output_format) as writer:
+        write_rows_chunked(writer, rows_out)
 
     print("")
-    print(f"Wrote Amazon supplier pricing CSV:")
-    print(f"  {OUTPUT_AMAZON}")
+    print(f"Wrote Amazon supplier pricing output:")
+    print(f"  {output_path}")
     print("Open this in Excel or feed into your seller tools as needed.")
     print("Done.")
     
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Ecom Copilot supplier pricing (Amazon)")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="csv",
+                        help="output file format (default: csv)")
+    main(parser.parse_args().output_format)
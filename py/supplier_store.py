@@ -0,0 +1,279 @@
+# supplier_store.py
+# Supplier repository backed by SQLite (WAL mode).
+#
+#   data/suppliers.sqlite
+#     suppliers(code, id, data, updated_at)
+#       code: unique, case-insensitive (suppliers_code index)
+#       id:   the supplier's numeric id (assigned on first insert)
+#       data: the full supplier record as JSON
+#     meta(key, value)
+#       version / modified_at: bumped by every write (ETags, Last-Modified)
+#
+# Lookups by code are one index probe; an upsert writes a single row in its
+# own transaction. Listing follows insertion order (rowid), which is the order
+# the old data/suppliers.json kept. On first open the JSON file is imported
+# once (first record wins for a code, like the old linear scan); the file is
+# left in place as a backup and never read again.
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from py.config_cache import read_json
+except ImportError:
+    from config_cache import read_json
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(ROOT, "data")
+SUPPLIERS_DB = os.path.join(DATA_DIR, "suppliers.sqlite")
+SUPPLIERS_JSON = os.path.join(DATA_DIR, "suppliers.json")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppliers (
+    code TEXT NOT NULL,
+    id INTEGER,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS suppliers_code ON suppliers (code COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_MIGRATED_KEY = "migrated_from_json"
+
+# query() sort keys -> SQL expression
+SORT_FIELDS = {
+    "id": "id",
+    "code": "code COLLATE NOCASE",
+    "name": "json_extract(data, '$.name') COLLATE NOCASE",
+    "products": "json_extract(data, '$.products')",
+    "last_import": "json_extract(data, '$.last_import')",
+    "active": "COALESCE(json_extract(data, '$.active'), 1)",
+    "min_gross_margin": "json_extract(data, '$.min_gross_margin')",
+    "max_gross_margin": "json_extract(data, '$.max_gross_margin')",
+}
+
+
+def _code_of(supplier: Dict[str, Any]) -> str:
+    return str(supplier.get("code") or "")
+
+
+class SupplierStore:
+    def __init__(self, path: str = SUPPLIERS_DB, json_path: Optional[str] = SUPPLIERS_JSON):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: another process holding the write lock is waited for, not an error
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if json_path:
+            self._migrate_json(json_path)
+
+    def _migrate_json(self, json_path: str) -> None:
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (_MIGRATED_KEY,)).fetchone():
+                return
+            payload = read_json(json_path, {})
+            suppliers = payload.get("suppliers", []) if isinstance(payload, dict) else []
+            if isinstance(suppliers, list):
+                self._write(s for s in suppliers if isinstance(s, dict) and not self._exists(_code_of(s)))
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?)", (_MIGRATED_KEY, os.path.abspath(json_path))
+            )
+
+    # --- reads ---------------------------------------------------------------
+
+    # The connection is shared between threads; reads take the lock too so
+    # they never see a batch that is half written.
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM suppliers ORDER BY rowid").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM suppliers WHERE code = ? COLLATE NOCASE", (code,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM suppliers").fetchone()[0]
+
+    def query(
+        self,
+        active: Optional[bool] = None,
+        marketplace: Optional[str] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        (total matching, one page of suppliers).
+
+        marketplace matches primary_marketplaces entries case-insensitively by
+        substring ("amazon" matches "Amazon Bwaaack"). sort is a SORT_FIELDS
+        key, "-" prefixed for descending; default is insertion order.
+        """
+        where, params = [], []  # type: List[str], List[Any]
+        if active is not None:
+            where.append("COALESCE(json_extract(data, '$.active'), 1) = ?")
+            params.append(1 if active else 0)
+        if marketplace:
+            where.append(
+                "EXISTS (SELECT 1 FROM json_each(data, '$.primary_marketplaces') "
+                "WHERE json_each.value LIKE '%' || ? || '%' ESCAPE '\\')"
+            )
+            params.append(marketplace.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+        order = "rowid"
+        if sort:
+            field = sort.lstrip("+-")
+            if field not in SORT_FIELDS:
+                raise ValueError(f"Unknown sort field: {field!r} (expected one of {', '.join(SORT_FIELDS)})")
+            order = f"{SORT_FIELDS[field]} {'DESC' if sort.startswith('-') else 'ASC'}, rowid"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM suppliers{clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT data FROM suppliers{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else max(0, limit), max(0, offset)]
+            ).fetchall()
+        return total, [json.loads(r[0]) for r in rows]
+
+    def version(self) -> Tuple[int, float]:
+        """(write counter, time of the last write); changes whenever any supplier does."""
+        with self._lock:
+            meta = dict(self._conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('version', 'modified_at')"
+            ).fetchall())
+        return int(meta.get("version", 0)), float(meta.get("modified_at", 0.0))
+
+    # --- writes --------------------------------------------------------------
+
+    def _exists(self, code: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM suppliers WHERE code = ? COLLATE NOCASE", (code,)
+        ).fetchone() is not None
+
+    def _write(self, suppliers: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Caller holds self._lock inside a transaction. A record without an id
+        # keeps the id of the row it replaces, or gets max(id) + 1.
+        written = []
+        next_id = None
+        now = time.time()
+        for supplier in suppliers:
+            record = dict(supplier)
+            code = _code_of(record)
+            if not isinstance(record.get("id"), int):
+                row = self._conn.execute(
+                    "SELECT id FROM suppliers WHERE code = ? COLLATE NOCASE", (code,)
+                ).fetchone()
+                if row and row[0] is not None:
+                    record["id"] = row[0]
+                else:
+                    if next_id is None:
+                        next_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM suppliers").fetchone()[0] + 1
+                    record["id"] = next_id
+                    next_id += 1
+            self._conn.execute(
+                "INSERT INTO suppliers (code, id, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(code COLLATE NOCASE) DO UPDATE SET code = excluded.code, id = excluded.id, "
+                "data = excluded.data, updated_at = excluded.updated_at",
+                (code, record["id"], json.dumps(record), now)
+            )
+            if next_id is not None and record["id"] >= next_id:
+                next_id = record["id"] + 1
+            written.append(record)
+        if written:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('version', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('modified_at', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (str(now),)
+            )
+        return written
+
+    def upsert(self, supplier: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert or replace the supplier with this code (case-insensitive); returns the stored record."""
+        with self._lock, self._conn:
+            return self._write([supplier])[0]
+
+    def upsert_many(self, suppliers: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """upsert() for a batch, in a single transaction."""
+        with self._lock, self._conn:
+            return self._write(suppliers)
+
+    def merge_many(
+        self,
+        records: Iterable[Tuple[int, Dict[str, Any]]],
+        validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        all_or_nothing: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Bulk import: each (line, fields) is merged onto the stored supplier
+        with that code (or a new one), validated and written, all in one
+        transaction. A code repeated in the batch merges onto its earlier
+        occurrence.
+
+        validate(merged) returns the record to store or raises ValueError.
+        Returns one result per record:
+          {"line", "code", "status": created|updated|error|skipped, "id"?, "error"?}
+        With all_or_nothing, any error writes nothing (valid records: "skipped").
+        """
+        results: List[Dict[str, Any]] = []
+        pending: Dict[str, Dict[str, Any]] = {}
+        with self._lock, self._conn:
+            for line, fields in records:
+                code = _code_of(fields)
+                result: Dict[str, Any] = {"line": line, "code": code}
+                results.append(result)
+                key = code.lower()
+                base = pending.get(key)
+                if base is None:
+                    row = self._conn.execute(
+                        "SELECT data FROM suppliers WHERE code = ? COLLATE NOCASE", (code,)
+                    ).fetchone()
+                    base = json.loads(row[0]) if row else None
+                merged = {**(base or {}), **fields}
+                if base is not None:
+                    # The stored spelling of the code is kept (lookups ignore case)
+                    merged["code"] = base.get("code", code)
+                try:
+                    if not code:
+                        raise ValueError("code is required")
+                    merged = validate(merged) if validate else merged
+                except ValueError as exc:
+                    result.update(status="error", error=str(exc))
+                    continue
+                result["status"] = "updated" if base is not None else "created"
+                pending[key] = merged
+
+            failed = any(r["status"] == "error" for r in results)
+            if failed and all_or_nothing:
+                for r in results:
+                    if r["status"] != "error":
+                        r["status"] = "skipped"
+                return results
+
+            ids = {_code_of(rec).lower(): rec["id"] for rec in self._write(pending.values())}
+        for r in results:
+            if r["status"] in ("created", "updated"):
+                r["id"] = ids[r["code"].lower()]
+        return results
@@ -0,0 +1,353 @@
+# upload_store.py
+# Content-addressed, compressed store for uploaded supplier feeds.
+#
+#   data/uploads/blobs/<sha256>.csv.zst|.csv.gz   compressed feed (stored once)
+#   data/uploads/blobs/<sha256>.frames            frame table (see below)
+#   data/uploads/aliases/<upload_id>.json         upload_id -> digest
+#
+# Blobs are written as independent frames (gzip members / zstd frames) of
+# FRAME_BYTES uncompressed bytes each. The frame table records where every
+# frame starts in both the uncompressed and the compressed stream, so
+# FramedReader can seek to any uncompressed offset by decompressing at most
+# one frame. Row indexes, parallel byte ranges and checkpoints keep working
+# on uncompressed offsets.
+#
+# Re-uploading identical bytes only adds an alias; the blob, its row index
+# and any cached previews (keyed by digest) are reused.
+#
+# zstd is used when the zstandard package is installed, gzip otherwise.
+# Plain files (legacy data/uploads/<uuid>.csv) are read as-is.
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import uuid
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - gzip is always available
+    zstandard = None  # type: ignore[assignment]
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+UPLOADS_DIR = os.path.join(ROOT, "data", "uploads")
+BLOBS_DIR = os.path.join(UPLOADS_DIR, "blobs")
+ALIASES_DIR = os.path.join(UPLOADS_DIR, "aliases")
+
+# Uncompressed bytes per frame; bounds the cost of a seek
+FRAME_BYTES = 1 << 20
+
+CODECS = ("zstd", "gzip")
+CODEC_EXTENSIONS = {"zstd": ".csv.zst", "gzip": ".csv.gz"}
+FRAMES_SUFFIX = ".frames"
+
+DEFAULT_CODEC = os.environ.get("ECOM_UPLOAD_CODEC") or ("zstd" if zstandard is not None else "gzip")
+
+
+def _check_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown upload codec {codec!r} (expected one of {', '.join(CODECS)})")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("zstd upload compression needs the zstandard package (pip install zstandard)")
+    return codec
+
+
+def _compressor(codec: str) -> Any:
+    if codec == "zstd":
+        cctx = zstandard.ZstdCompressor(level=3, write_content_size=True)
+        return cctx.compress
+    return _gzip_member
+
+
+def _gzip_member(data: bytes) -> bytes:
+    # One gzip member per frame (zlib writes a zero mtime, so blobs are reproducible)
+    co = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return co.compress(data) + co.flush()
+
+
+def _decompress(codec: str, frame: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return zlib.decompress(frame, 31)
+
+
+def codec_of(path: str) -> Optional[str]:
+    for codec, ext in CODEC_EXTENSIONS.items():
+        if path.endswith(ext):
+            return codec
+    return None
+
+
+def blob_path(digest: str, codec: str) -> str:
+    return os.path.join(BLOBS_DIR, digest + CODEC_EXTENSIONS[codec])
+
+
+def frames_path_for(path: str) -> str:
+    codec = codec_of(path)
+    base = path[: -len(CODEC_EXTENSIONS[codec])] if codec else os.path.splitext(path)[0]
+    return base + FRAMES_SUFFIX
+
+
+def find_blob(digest: str) -> Optional[str]:
+    for codec in CODECS:
+        path = blob_path(digest, codec)
+        if os.path.exists(path) and os.path.exists(frames_path_for(path)):
+            return path
+    return None
+
+
+def digest_of(path: str) -> Optional[str]:
+    """The content digest of a blob path (None for legacy plain uploads)."""
+    if codec_of(path) is None:
+        return None
+    return os.path.basename(frames_path_for(path))[: -len(FRAMES_SUFFIX)]
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class _BlobWriter:
+    """Hashes, frames and compresses a byte stream into a temp file."""
+
+    def __init__(self, codec: str, max_bytes: Optional[int] = None):
+        os.makedirs(BLOBS_DIR, exist_ok=True)
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self.tmp_path = os.path.join(BLOBS_DIR, f".{uuid.uuid4().hex}.tmp")
+        self._f = open(self.tmp_path, "wb")
+        self._compress = _compressor(codec)
+        self._sha = hashlib.sha256()
+        self._pending = bytearray()
+        self.frames = array("Q", [0, 0])  # (uncompressed, compressed) frame starts
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        if self.max_bytes is not None and self.size + len(data) > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit")
+        self._sha.update(data)
+        self.size += len(data)
+        self._pending += data
+        while len(self._pending) >= FRAME_BYTES:
+            self._emit(bytes(self._pending[:FRAME_BYTES]))
+            del self._pending[:FRAME_BYTES]
+
+    def _emit(self, data: bytes) -> None:
+        self._f.write(self._compress(data))
+        self.frames.extend((self.frames[-2] + len(data), self._f.tell()))
+
+    def finish(self) -> Tuple[str, str]:
+        """Returns (digest, blob path); the blob is only written if new."""
+        if self._pending:
+            self._emit(bytes(self._pending))
+            self._pending.clear()
+        self._f.close()
+        digest = self._sha.hexdigest()
+
+        existing = find_blob(digest)
+        if existing is not None:
+            os.remove(self.tmp_path)
+            return digest, existing
+
+        path = blob_path(digest, self.codec)
+        frames_tmp = self.tmp_path + FRAMES_SUFFIX
+        with open(frames_tmp, "wb") as f:
+            self.frames.tofile(f)
+        # Frame table first: a blob is only visible once its table exists
+        os.replace(frames_tmp, frames_path_for(path))
+        os.replace(self.tmp_path, path)
+        return digest, path
+
+    def abort(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _write_alias(upload_id: str, digest: str, size: int, filename: str) -> None:
+    os.makedirs(ALIASES_DIR, exist_ok=True)
+    path = os.path.join(ALIASES_DIR, f"{upload_id}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "upload_id": upload_id,
+            "digest": digest,
+            "size": size,
+            "filename": filename,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+        }, f)
+    os.replace(tmp, path)
+
+
+class UploadWriter:
+    """
+    Incremental upload: write() chunks as they arrive, then finish() to get
+    (upload_id, blob path), or abort() to discard. Raises UploadTooLarge once
+    more than max_bytes have been written.
+    """
+
+    def __init__(self, filename: str = "", codec: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.filename = filename
+        self._blob = _BlobWriter(_check_codec(codec or DEFAULT_CODEC), max_bytes)
+
+    @property
+    def size(self) -> int:
+        return self._blob.size
+
+    def write(self, data: bytes) -> None:
+        self._blob.write(data)
+
+    def finish(self) -> Tuple[str, str]:
+        digest, path = self._blob.finish()
+        upload_id = str(uuid.uuid4())
+        _write_alias(upload_id, digest, self._blob.size, self.filename)
+        return upload_id, path
+
+    def abort(self) -> None:
+        self._blob.abort()
+
+
+def put_stream(
+    chunks: Iterable[bytes],
+    filename: str = "",
+    codec: Optional[str] = None,
+    max_bytes: Optional[int] = None
+) -> Tuple[str, str]:
+    """
+    Store a feed from an iterable of byte chunks. Returns (upload_id, blob path);
+    identical content maps to the same blob.
+    """
+    writer = UploadWriter(filename, codec, max_bytes)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+        return writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def put_bytes(data: bytes, filename: str = "", codec: Optional[str] = None) -> Tuple[str, str]:
+    view = memoryview(data)
+    return put_stream((view[i:i + FRAME_BYTES] for i in range(0, len(data), FRAME_BYTES)), filename, codec)
+
+
+def alias_info(upload_id: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(ALIASES_DIR, f"{os.path.basename(upload_id)}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def resolve_upload(upload_id: str) -> Optional[str]:
+    """Blob path for an upload_id (or the legacy plain .csv), None if unknown."""
+    info = alias_info(upload_id)
+    if info and info.get("digest"):
+        return find_blob(info["digest"])
+    legacy = os.path.join(UPLOADS_DIR, f"{os.path.basename(upload_id)}.csv")
+    return legacy if os.path.exists(legacy) else None
+
+
+def _load_frames(path: str) -> array:
+    frames = array("Q")
+    with open(frames_path_for(path), "rb") as f:
+        frames.frombytes(f.read())
+    return frames
+
+
+class FramedReader(io.RawIOBase):
+    """Seekable binary reader over a framed compressed blob."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.codec = codec_of(path) or "gzip"
+        frames = _load_frames(path)
+        self._ustarts = frames[0::2]
+        self._cstarts = frames[1::2]
+        self.size = self._ustarts[-1]
+        self._f = open(path, "rb")
+        self._pos = 0
+        self._frame = -1
+        self._data = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _load(self, k: int) -> None:
+        if k != self._frame:
+            self._f.seek(self._cstarts[k])
+            self._data = _decompress(self.codec, self._f.read(self._cstarts[k + 1] - self._cstarts[k]))
+            self._frame = k
+
+    def _frame_of(self, pos: int) -> int:
+        # Usually the current or the next frame (sequential reads)
+        k = self._frame
+        if 0 <= k < len(self._ustarts) - 1 and self._ustarts[k] <= pos < self._ustarts[k + 1]:
+            return k
+        lo, hi = 0, len(self._ustarts) - 2
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._ustarts[mid] <= pos:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def read(self, n: int = -1) -> bytes:
+        end = self.size if n is None or n < 0 else min(self.size, self._pos + n)
+        parts = []
+        while self._pos < end:
+            k = self._frame_of(self._pos)
+            self._load(k)
+            start = self._pos - self._ustarts[k]
+            take = min(end, self._ustarts[k + 1]) - self._pos
+            parts.append(self._data[start:start + take])
+            self._pos += take
+        return b"".join(parts)
+
+    def readinto(self, b: Any) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+def open_upload(path: str) -> BinaryIO:
+    """Seekable binary stream of an upload's (uncompressed) bytes."""
+    if codec_of(path) is not None and os.path.exists(frames_path_for(path)):
+        return FramedReader(path)  # type: ignore[return-value]
+    return open(path, "rb")
+
+
+def upload_size(path: str) -> int:
+    """Uncompressed size of an upload."""
+    if codec_of(path) is not None and os.path.exists(frames_path_for(path)):
+        return int(_load_frames(path)[-2])
+    return os.path.getsize(path)
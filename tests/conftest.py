@@ -0,0 +1,6 @@
+# Modules in py/ import each other as top-level modules (the "py." prefix
+# clashes with pytest's own `py` package), so put py/ on the path.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "py"))
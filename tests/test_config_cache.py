@@ -0,0 +1,60 @@
+import json
+import threading
+
+from config_cache import ConfigCache, read_json, write_json
+
+
+def test_counts_every_lookup_across_threads(tmp_path):
+    path = str(tmp_path / "cfg.json")
+    write_json(path, {"version": 1})
+    cache = ConfigCache()
+    calls_per_thread, threads = 500, 8
+
+    def worker():
+        for _ in range(calls_per_thread):
+            cache.load(path, read_json)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == calls_per_thread * threads
+    assert stats["entries"] == 1
+
+
+def test_reparses_when_the_file_changes(tmp_path):
+    path = tmp_path / "cfg.json"
+    path.write_text(json.dumps({"v": 1}))
+    cache = ConfigCache()
+    assert cache.load(str(path), read_json) == {"v": 1}
+    assert cache.load(str(path), read_json) == {"v": 1}
+    path.write_text(json.dumps({"v": 22}))
+    assert cache.load(str(path), read_json) == {"v": 22}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_write_through_is_a_hit_and_copies(tmp_path):
+    path = str(tmp_path / "cfg.json")
+    cache = ConfigCache()
+    cfg = {"suppliers": {}}
+    cache.write_through(path, cfg, write_json, read_json)
+    cfg["suppliers"]["KMC"] = {}
+    loaded = cache.load(path, read_json, copy=True)
+    assert loaded == {"suppliers": {}}
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_missing_files_are_not_cached(tmp_path):
+    cache = ConfigCache()
+    for i in range(100):
+        assert cache.load(str(tmp_path / f"nope{i}.json"), read_json) is None
+    assert cache.stats()["entries"] == 0
+
+    path = tmp_path / "cfg.json"
+    write_json(str(path), {"v": 1})
+    assert cache.load(str(path), read_json) == {"v": 1}
+    path.unlink()
+    assert cache.load(str(path), read_json) is None
+    assert cache.stats()["entries"] == 0
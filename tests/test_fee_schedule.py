@@ -0,0 +1,35 @@
+import pytest
+
+from fee_schedule import compile_fee_schedule
+
+np = pytest.importorskip("numpy")
+
+JEWELRY = {
+    "type": "tiered",
+    "tier_mode": "marginal",
+    "tiers": [{"up_to": 250, "percent": 0.20}, {"up_to": None, "percent": 0.05}],
+}
+
+
+@pytest.mark.parametrize("cfg, margin", [
+    # 1 - 0.85 - 0.15 and 1 - 0.95 - 0.05 are ~1e-17, not 0
+    ({"type": "percent_of_price", "percent": 0.15, "solve": "exact"}, 0.85),
+    (JEWELRY, 0.95),
+])
+def test_near_zero_denominator_is_unsolved(cfg, margin):
+    schedule = compile_fee_schedule(cfg)
+
+    price, solved = schedule.price_for_margin(10.0, margin)
+    assert not solved
+    assert price < 1e6
+
+    prices, solved_mask = schedule.price_for_margin_array(np.array([10.0, 99.0]), margin)
+    assert not solved_mask.any()
+    assert (prices < 1e6).all()
+
+
+def test_regular_margin_still_solves():
+    schedule = compile_fee_schedule({"type": "percent_of_price", "percent": 0.15, "solve": "exact"})
+    price, solved = schedule.price_for_margin(10.0, 0.25)
+    assert solved
+    assert price == pytest.approx(10.0 / 0.60)
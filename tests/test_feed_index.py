@@ -0,0 +1,58 @@
+import csv
+import io
+
+import pytest
+
+import feed_index
+from feed_index import RowOffsetScanner, build_row_index, read_upload_page, scan_row_offsets
+
+
+def _feed(eol, rows=2000):
+    lines = ["Item,Cost,Desc"]
+    for i in range(rows):
+        desc = ['plain', '"multi\nline"', '"carriage\rreturn"', '"both\r\nends"'][i % 4]
+        lines.append(f"SKU{i},{i % 90 + 1}.25,{desc}")
+        if i % 500 == 0:
+            lines.append("")  # blank lines are not rows
+    return (eol.join(lines) + eol).encode("utf-8")
+
+
+def _csv_rows(data):
+    # Data rows according to csv itself
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    return sum(1 for r in reader if r) - 1
+
+
+@pytest.fixture(params=["numpy", "python"])
+def scanner_impl(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(feed_index, "np", None)
+    elif feed_index.np is None:
+        pytest.skip("numpy not installed")
+    return request.param
+
+
+@pytest.mark.parametrize("eol", ["\r", "\r\n", "\n"])
+def test_offsets_follow_csv_records(eol, scanner_impl):
+    data = _feed(eol)
+    offsets = scan_row_offsets(io.BytesIO(data))
+    assert len(offsets) - 1 == _csv_rows(data) == 2000
+    assert offsets[-1] == len(data)
+    # Feeding tiny blocks (splitting every \r\n) gives the same offsets
+    scanner = RowOffsetScanner()
+    for i in range(0, len(data), 3):
+        scanner.feed(data[i:i + 3])
+    assert list(scanner.finish()) == list(offsets)
+    for start in offsets[:-1]:
+        assert data[start:start + 3] == b"SKU"
+
+
+@pytest.mark.parametrize("eol", ["\r", "\r\n", "\n"])
+def test_indexed_page_matches_sequential_page(eol, tmp_path):
+    upload = tmp_path / "feed.csv"
+    upload.write_bytes(_feed(eol))
+    headers, sequential, total = read_upload_page(str(upload), 10, 5)
+    assert total is None and len(sequential) == 5
+    build_row_index(str(upload))
+    assert read_upload_page(str(upload), 10, 5) == (headers, sequential, 2000)
+    assert sequential[0]["Item"] == "SKU10"
@@ -0,0 +1,48 @@
+import pytest
+from starlette.requests import Request
+
+import fast_response
+from fast_response import json_response
+from http_cache import cache_validators, check_not_modified
+
+
+def _request(**headers):
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+BODY = {"rows": [{"sku": f"SKU{i}", "price": i + 0.99} for i in range(500)]}
+
+
+def test_compressed_body_gets_its_own_etag():
+    validators = cache_validators(("rows", 1), None)
+    plain = json_response(_request(), BODY, headers=validators)
+    gzipped = json_response(_request(accept_encoding="gzip"), BODY, headers=validators)
+    assert plain.headers["etag"] == validators["ETag"]
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == validators["ETag"][:-1] + '-gzip"'
+
+
+@pytest.mark.parametrize("suffix", ["", "-gzip", "-br"])
+def test_if_none_match_accepts_every_coding_of_the_tag(suffix):
+    validators = cache_validators(("rows", 1), None)
+    held = validators["ETag"][:-1] + suffix + '"'
+    for header in (held, "W/" + held, f'"other", {held}'):
+        response = check_not_modified(_request(if_none_match=header), validators)
+        assert response is not None and response.status_code == 304
+        # The 304 names the representation the client holds
+        assert response.headers["etag"] == held
+
+
+def test_if_none_match_rejects_other_tags():
+    validators = cache_validators(("rows", 1), None)
+    stale = cache_validators(("rows", 2), None)["ETag"]
+    assert check_not_modified(_request(if_none_match=stale[:-1] + '-gzip"'), validators) is None
+
+
+def test_small_bodies_keep_the_base_tag(monkeypatch):
+    monkeypatch.setattr(fast_response, "COMPRESS_MIN_BYTES", 1 << 30)
+    validators = cache_validators(("rows", 1), None)
+    response = json_response(_request(accept_encoding="gzip"), BODY, headers=validators)
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == validators["ETag"]
@@ -0,0 +1,66 @@
+import csv
+
+import pytest
+
+import incremental_pricing
+import pricing_mapping_engine as engine
+
+MAPPING = {"supplier_sku": "Item", "supplier_cost": "Cost", "qty_available": "Qty"}
+FEES = {"amazon": {"type": "percent_of_price", "percent": 0.15, "per_item": 0.3}}
+
+
+@pytest.fixture
+def price(tmp_path, monkeypatch):
+    for module in (engine, incremental_pricing):
+        monkeypatch.setattr(module, "OUTPUT_DIR", str(tmp_path / "out"))
+    monkeypatch.setattr(engine, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(engine, "MAPPINGS_DIR", str(tmp_path / "mappings"))
+    monkeypatch.setattr(incremental_pricing, "STATE_DIR", str(tmp_path / "state"))
+    upload = tmp_path / "feed.csv"
+
+    def price(rows, chunk_rows=None):
+        if chunk_rows:
+            monkeypatch.setattr(incremental_pricing, "PRICING_CHUNK_ROWS", chunk_rows)
+        upload.write_text("Item,Cost,Qty\n" + "".join(f"{sku},{cost},1\n" for sku, cost in rows))
+        result = incremental_pricing.run_incremental_pricing(
+            upload_path=str(upload), supplier_code="ACME", mapping=MAPPING, marketplace="amazon",
+            min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES,
+        )
+        with open(result["out_path"], newline="", encoding="utf-8") as f:
+            result["rows_out"] = list(csv.DictReader(f))
+        result["upload_path"] = str(upload)
+        return result
+    return price
+
+
+# A repeated SKU, both inside one chunk and across chunks (chunk_rows=2)
+FEED = [("A", "10.00"), ("B", "5.00"), ("A", "12.00"), ("C", "7.00"), ("B", "6.00"), ("A", "11.00")]
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 2])
+def test_unchanged_feed_with_repeated_skus_reports_no_changes(price, chunk_rows):
+    first = price(FEED, chunk_rows)
+    assert (first["added"], first["changed"], first["unchanged"]) == (3, 0, 0)
+    for _ in range(3):
+        again = price(FEED, chunk_rows)
+        assert (again["added"], again["changed"], again["removed"], again["unchanged"]) == (0, 0, 0, 3)
+        assert again["rows_out"] == first["rows_out"]
+    full = engine.run_full_pricing(
+        upload_path=again["upload_path"], mapping=MAPPING, marketplace="amazon",
+        min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES,
+    )
+    with open(full, newline="", encoding="utf-8") as f:
+        assert list(csv.DictReader(f)) == first["rows_out"]
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 2])
+def test_change_is_judged_by_the_last_row_of_a_sku(price, chunk_rows):
+    price(FEED, chunk_rows)
+    # Only A's first row differs: its last row (the one stored) is the same
+    edited = [("A", "99.00")] + FEED[1:]
+    result = price(edited, chunk_rows)
+    assert result["changed"] == 0
+    edited = FEED[:-1] + [("A", "99.00")]
+    result = price(edited, chunk_rows)
+    assert result["changed_skus"] == ["A"]
+    assert result["unchanged"] == 2
@@ -0,0 +1,48 @@
+import pytest
+
+import pricing_mapping_engine as engine
+
+MAPPING = {"supplier_sku": "Item", "supplier_cost": "Cost", "qty_available": "Qty"}
+FEES = {
+    "amazon": {"type": "percent_of_price", "percent": 0.15, "per_item": 0.3},
+    "ebay": {"type": "percent_of_price", "percent": 0.13},
+}
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(engine, "MAPPINGS_DIR", str(tmp_path / "mappings"))
+    monkeypatch.setattr(engine, "OUTPUT_DIR", str(tmp_path / "out"))
+    upload = tmp_path / "feed.csv"
+    upload.write_text("Item,Cost,Qty\n" + "".join(f"SKU{i},{i + 1}.50,2\n" for i in range(10)))
+
+    def run(marketplaces, **kwargs):
+        return engine.run_multi_marketplace_pricing(
+            upload_path=str(upload), mapping=MAPPING, marketplaces=marketplaces,
+            min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES, **kwargs
+        )
+    return run
+
+
+def test_repeated_marketplace_is_priced_once(run):
+    paths = run(["amazon", "ebay", "amazon"])
+    assert list(paths) == ["amazon", "ebay"]
+    with open(paths["amazon"], encoding="utf-8") as f:
+        assert sum(1 for line in f if line.startswith("SKU")) == 10
+
+
+def test_wide_layout_has_one_column_set_per_marketplace(run):
+    paths = run(["ebay", "ebay"], layout="wide")
+    with open(paths["wide"], encoding="utf-8") as f:
+        header = f.readline().strip().split(",")
+    assert header.count("ebay_min_price") == 1
+
+
+@pytest.mark.parametrize("marketplaces, message", [
+    ("amazon", "list"),
+    (["amazon", "walmart"], "walmart"),
+])
+def test_bad_marketplaces_are_rejected(run, marketplaces, message):
+    with pytest.raises(ValueError, match=message):
+        run(marketplaces)
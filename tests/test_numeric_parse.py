@@ -0,0 +1,43 @@
+import pytest
+
+from numeric_parse import memo_clear, parse_float_column, parse_int, parse_number
+
+
+@pytest.fixture(autouse=True)
+def _fresh_memo():
+    memo_clear()
+    yield
+    memo_clear()
+
+
+@pytest.mark.parametrize("raw", [
+    "nan", "NaN", "-nan", "inf", "+inf", "-inf", "Infinity", "-infinity",
+    " INF ", "$inf", "USD nan", "(inf)", "inf-", "1e999", "-1e999",
+])
+def test_non_finite_strings_are_invalid(raw):
+    assert parse_number(raw) is None
+    assert parse_int(raw) is None
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_floats_are_invalid(value):
+    assert parse_number(value) is None
+
+
+def test_column_marks_non_finite_invalid():
+    numbers, valid = parse_float_column(["12.50", "nan", "$1,234.56", "-Infinity"])
+    assert numbers == [12.5, None, 1234.56, None]
+    assert valid == [True, False, True, False]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("12.50", 12.5),
+    ("$1,234.56", 1234.56),
+    ("1.234,56", 1234.56),
+    ("(4.20)", -4.2),
+    ("4.20-", -4.2),
+    ("USD 9.99", 9.99),
+    ("1e3", 1000.0),
+])
+def test_regular_values_still_parse(raw, expected):
+    assert parse_number(raw) == pytest.approx(expected)
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+import pricing_mapping_engine as engine
+
+MAPPING = {"supplier_sku": "Item", "supplier_cost": "Cost", "qty_available": "Qty", "title": "Desc"}
+FEES = {"amazon": {"type": "percent_of_price", "percent": 0.15, "per_item": 0.3}}
+
+
+def _feed(eol, rows=3000):
+    # Quoted titles carry embedded line breaks of every kind
+    lines = ["Item,Cost,Qty,Desc"]
+    for i in range(rows):
+        desc = ['plain', '"multi\nline"', '"carriage\rreturn"', '"both\r\nends"'][i % 4]
+        lines.append(f"SKU{i},{i % 90 + 1}.25,{i % 7},{desc}")
+    return (eol.join(lines) + eol).encode("utf-8")
+
+
+@pytest.fixture
+def out_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(engine, "MAPPINGS_DIR", str(tmp_path / "mappings"))
+    monkeypatch.setattr(engine, "OUTPUT_DIR", str(tmp_path / "out"))
+    return tmp_path
+
+
+@pytest.mark.parametrize("eol", ["\r", "\r\n", "\n"])
+def test_record_starts_do_not_depend_on_block_size(eol, monkeypatch):
+    data = _feed(eol, rows=200)
+    targets = list(range(1, len(data), 37))
+    expected = engine.record_starts_after(io.BytesIO(data), targets)
+    monkeypatch.setattr(engine, "STREAM_CHUNK_BYTES", 5)
+    assert engine.record_starts_after(io.BytesIO(data), targets) == expected
+    # Every start follows a record end; none splits a \r\n pair
+    for s in expected:
+        assert s == len(data) or data[s - 1:s] in (b"\r", b"\n")
+        assert data[s - 1:s + 1] != b"\r\n"
+
+
+@pytest.mark.parametrize("eol", ["\r", "\r\n", "\n"])
+def test_parallel_output_matches_serial(eol, out_dir, monkeypatch):
+    upload = out_dir / "feed.csv"
+    upload.write_bytes(_feed(eol))
+    monkeypatch.setattr(engine, "PARALLEL_MIN_BYTES", 1)
+    args = dict(
+        upload_path=str(upload), mapping=MAPPING, marketplace="amazon",
+        min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES,
+    )
+    with open(engine.run_full_pricing(workers=1, **args), "rb") as f:
+        serial = f.read()
+    with open(engine.run_full_pricing(workers=3, **args), "rb") as f:
+        parallel = f.read()
+    assert serial.count(b"SKU") == 3000
+    assert parallel == serial
+
+
+def test_mixed_encoding_upload_matches_serial(out_dir, monkeypatch):
+    # Valid UTF-8 for the first ranges, cp1252 further on: serial decoding
+    # switches codecs at one point, which ranges can't reproduce
+    head = "Item,Cost,Qty,Desc\n" + "".join(f"SKU{i},{i % 90 + 1}.25,1,Café\n" for i in range(8000))
+    tail = "".join(f"SKU{i},{i % 90 + 1}.25,1,Café\n" for i in range(8000, 8500))
+    upload = out_dir / "feed.csv"
+    upload.write_bytes(head.encode("utf-8") + tail.encode("cp1252"))
+    monkeypatch.setattr(engine, "PARALLEL_MIN_BYTES", 1)
+    seen = []
+    args = dict(
+        upload_path=str(upload), mapping=MAPPING, marketplace="amazon",
+        min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES,
+    )
+    with open(engine.run_full_pricing(workers=1, **args), "rb") as f:
+        serial = f.read()
+    with open(engine.run_full_pricing(workers=3, progress=seen.append, **args), "rb") as f:
+        parallel = f.read()
+    assert parallel == serial
+    assert seen[-1]["rows"] == 8500
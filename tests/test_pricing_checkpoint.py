@@ -0,0 +1,45 @@
+import pytest
+
+import pricing_mapping_engine as engine
+
+MAPPING = {"supplier_sku": "Item", "supplier_cost": "Cost", "qty_available": "Qty"}
+FEES = {"amazon": {"type": "percent_of_price", "percent": 0.15, "per_item": 0.3}}
+
+
+@pytest.fixture
+def run_args(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(engine, "MAPPINGS_DIR", str(tmp_path / "mappings"))
+    monkeypatch.setattr(engine, "OUTPUT_DIR", str(tmp_path / "out"))
+    monkeypatch.setattr(engine, "CHECKPOINT_DIR", str(tmp_path / "out" / ".checkpoints"))
+    upload = tmp_path / "feed.csv"
+    upload.write_text("Item,Cost,Qty\n" + "".join(f"SKU{i},{i % 50 + 1}.25,3\n" for i in range(2000)))
+    return dict(
+        upload_path=str(upload), mapping=MAPPING, marketplace="amazon",
+        min_margin=0.2, max_margin=0.3, dropship_fee=0.0, fee_table=FEES, checkpoint=True,
+    )
+
+
+def test_duplicate_checkpointed_run_is_rejected(run_args):
+    attempts = []
+
+    def progress(_):
+        if not attempts:
+            with pytest.raises(engine.PricingRunInProgress):
+                engine.run_full_pricing(**run_args)
+            attempts.append(True)
+
+    with open(engine.run_full_pricing(progress=progress, **run_args), "rb") as f:
+        first = f.read()  # read now: a run in the same second reuses the path
+    assert attempts
+    # The lock is released with the run
+    with open(engine.run_full_pricing(**run_args), "rb") as f:
+        assert f.read() == first
+    with open(engine.run_full_pricing(**{**run_args, "checkpoint": False}), "rb") as f:
+        assert f.read() == first
+
+
+def test_checkpoint_with_parallel_workers_is_an_error(run_args, monkeypatch):
+    monkeypatch.setattr(engine, "PARALLEL_MIN_BYTES", 1)
+    with pytest.raises(ValueError, match="workers"):
+        engine.run_full_pricing(workers=2, **run_args)
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from pricing_jobs import JobManager
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1)
+
+
+def _finished(jobs, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = jobs.status(job_id)
+        if status["state"] in ("succeeded", "failed", "cancelled"):
+            return status
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def _output(marketplace, out_id):
+    return {"marketplace": marketplace, "out_id": out_id, "download_url": f"/api/pricing/download/{out_id}"}
+
+
+def test_multi_marketplace_job_lists_every_download(jobs):
+    outputs = [_output("amazon", "pricing_amazon_1"), _output("ebay", "pricing_ebay_1")]
+    job = jobs.submit("pricing_run", {}, lambda progress: {"ok": True, "outputs": outputs})
+    status = _finished(jobs, job["job_id"])
+    assert status["state"] == "succeeded"
+    assert status["downloads"] == outputs
+    assert status["download_url"] is None
+
+
+def test_single_output_job_keeps_download_url(jobs):
+    job = jobs.submit("pricing_run", {}, lambda progress: {"ok": True, **_output(None, "pricing_amazon_2")})
+    status = _finished(jobs, job["job_id"])
+    assert status["download_url"] == "/api/pricing/download/pricing_amazon_2"
+    assert [d["out_id"] for d in status["downloads"]] == ["pricing_amazon_2"]
+
+
+def test_failed_job_has_no_downloads(jobs):
+    job = jobs.submit("pricing_run", {}, lambda progress: {"ok": False, "error": "boom"})
+    status = _finished(jobs, job["job_id"])
+    assert status["state"] == "failed"
+    assert status["downloads"] == [] and status["download_url"] is None
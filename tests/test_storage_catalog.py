@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+import storage_catalog
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    for name in ("OUTPUT_DIR", "BLOBS_DIR", "UPLOADS_DIR", "ALIASES_DIR", "CHECKPOINT_DIR"):
+        path = tmp_path / name.lower()
+        path.mkdir()
+        monkeypatch.setattr(storage_catalog, name, str(path))
+    catalog = storage_catalog.StorageCatalog(str(tmp_path / "catalog.sqlite"))
+    # No background maintenance: the tests run maintain() themselves
+    monkeypatch.setattr(catalog, "maintain_soon", lambda: None)
+    return catalog
+
+
+def _upload(catalog, tmp_path, upload_id, age_days=60):
+    path = tmp_path / "uploads_dir" / f"{upload_id}.csv"
+    path.write_text("Item,Cost\nA,1.00\n")
+    catalog.register_upload(upload_id, str(path))
+    with catalog._conn:
+        catalog._conn.execute(
+            "UPDATE entries SET last_access = ? WHERE id = ?", (time.time() - age_days * 86400, upload_id)
+        )
+    return path
+
+
+def test_pinned_upload_survives_expiry_and_eviction(catalog, tmp_path):
+    pinned = _upload(catalog, tmp_path, "busy")
+    idle = _upload(catalog, tmp_path, "idle")
+    with catalog.pin_upload(str(pinned)):
+        done = catalog.maintain(budget_bytes=0, retention_days=30)
+        assert pinned.exists()
+        assert not idle.exists()
+        assert done["expired"] == 1
+        assert catalog.maintain(budget_bytes=0, retention_days=0)["evicted"] == 0
+    assert pinned.exists()
+
+
+def test_upload_with_checkpoint_is_pinned(catalog, tmp_path):
+    resumable = _upload(catalog, tmp_path, "resumable")
+    checkpoint = tmp_path / "checkpoint_dir" / "run.json"
+    checkpoint.write_text(json.dumps({"run_key": "run", "upload_path": str(resumable)}))
+    catalog.maintain(budget_bytes=0, retention_days=30)
+    assert resumable.exists()
+
+    checkpoint.unlink()
+    catalog.maintain(budget_bytes=0, retention_days=30)
+    assert not resumable.exists()
+
+
+def test_entry_is_kept_when_the_file_cannot_be_removed(catalog, tmp_path, monkeypatch):
+    locked = _upload(catalog, tmp_path, "locked")
+    real_remove = storage_catalog.os.remove
+
+    def remove(path):
+        if path == str(locked):
+            raise PermissionError("in use")  # what Windows does for an open file
+        real_remove(path)
+
+    monkeypatch.setattr(storage_catalog.os, "remove", remove)
+    done = catalog.maintain(budget_bytes=0, retention_days=30)
+    assert done["expired"] == 0 and done["evicted"] == 0
+    assert catalog._get("locked") is not None
+
+    monkeypatch.setattr(storage_catalog.os, "remove", real_remove)
+    assert catalog.maintain(budget_bytes=0, retention_days=30)["expired"] == 1
+    assert catalog._get("locked") is None and not locked.exists()